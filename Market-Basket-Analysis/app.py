@@ -1,17 +1,30 @@
+import functools
 import os
 import streamlit as st
+import numpy as np
 import pandas as pd
 import plotly.express as px
 
-from src.data_loader import load_transactions, get_unique_stats
-from src.preprocessing import to_one_hot
+from src.cache import cache_dir, load_dataset, load_periods, load_profile
+from src.cache import dataset_key as hash_dataset
+from src.data_loader import CodedTransactions, DatasetProfile, ProductHierarchy, load_hierarchy
+from src.instrumentation import Recorder, recording, stage
+from src.jobs import Job, JobRunner, LatestJob
 from src.association_rules import (
-    mine_frequent_itemsets,
+    MemoryBudgetError,
+    TOP_K_MEASURES,
     mine_association_rules,
-    filter_rules,
+    mine_generalized_itemsets,
+    mine_top_k_rules,
 )
-from src.recommender import recommend_products
-from src.visualization import top_n_products, build_rules_network, graph_to_plotly_figure
+from src.lattice import RuleLattice
+from src.periods import PeriodCounts
+from src.pipeline import DEFAULT_PRESET, PRESETS
+from src.preprocessing import codes_to_basket
+from src.recommender import RecommenderModel, compile_rules
+from src.rule_db import RuleDB
+from src.rule_store import RuleTable
+from src.visualization import LayoutCache, top_n_products, build_rules_network, graph_to_plotly_figure
 
 
 st.set_page_config(
@@ -203,6 +216,40 @@ st.markdown(
 
 
 
+RULE_DB_PATH = os.environ.get("MBA_RULE_DB", os.path.join(cache_dir(), "rules.sqlite"))
+# Keeps one careless slider setting from exhausting the server's memory.
+MEMORY_BUDGET_MB = int(os.environ.get("MBA_MEMORY_BUDGET_MB", "1024"))
+ON_BUDGET_CHOICES = {
+    "Raise min support to fit": "raise_support",
+    "Spill candidates to disk": "spill",
+    "Stop with a warning": "raise",
+}
+ITEMSET_KINDS = {
+    "All frequent itemsets": "all",
+    "Closed itemsets only": "closed",
+}
+GENERALIZED_LEVEL = "All levels (generalized)"
+# How long a rerun waits for mining before showing the previous results, and
+# how often the progress bar refreshes while a background job runs.
+MINING_WAIT_S = 0.3
+MINING_POLL_S = 0.5
+PERIOD_FREQUENCIES = {"Month": "month", "Week": "week", "Day": "day"}
+# Support floor the period partitions are mined at; the sidebar never goes lower.
+PERIOD_FLOOR = 0.01
+
+
+
+def upload_key(file) -> str:
+    # Hash each upload once: reruns with the same file reuse its cache key
+    # instead of reading and hashing all of its bytes again.
+    upload_id = (file.file_id, file.size)
+    if st.session_state.get("upload_key_id") != upload_id:
+        st.session_state["upload_key"] = hash_dataset(file, timestamps=True)
+        st.session_state["upload_key_id"] = upload_id
+    return st.session_state["upload_key"]
+
+
+
 def load_data_and_params():
     with st.sidebar:
         st.markdown("### 🧱 Data & Mining Setup")
@@ -222,7 +269,9 @@ def load_data_and_params():
                 )
                 if file is not None:
                     try:
-                        df = load_transactions(file)
+                        dataset_key, coded, basket = load_dataset(
+                            file, timestamps=True, key=upload_key(file)
+                        )
                     except ValueError:
                             st.markdown(
                                 """
@@ -246,37 +295,47 @@ def load_data_and_params():
                             st.stop()
 
                 else:
-                    df = None
+                    coded, basket, dataset_key = None, None, None
+                hierarchy_file = st.file_uploader(
+                    "Product hierarchy CSV (optional)",
+                    type=["csv"],
+                    help="Columns product, category, department (finest first) to mine "
+                    "category-level or multi-level rules.",
+                )
             else:
                  base_dir = os.path.dirname(os.path.abspath(__file__))
                  sample_path = os.path.join(base_dir, "data", "sample_transactions.csv")
-                 df = load_transactions(sample_path)
+                 dataset_key, coded, basket = load_dataset(sample_path, timestamps=True)
+                 hierarchy_file = os.path.join(base_dir, "data", "sample_hierarchy.csv")
+
+            hierarchy, level = None, "product"
+            if hierarchy_file is not None and coded is not None:
+                if hasattr(hierarchy_file, "seek"):
+                    hierarchy_file.seek(0)
+                try:
+                    hierarchy = load_hierarchy(hierarchy_file)
+                except ValueError as exc:
+                    st.warning(str(exc))
+            if hierarchy is not None:
+                level = st.selectbox(
+                    "Mining level",
+                    hierarchy.levels + [GENERALIZED_LEVEL],
+                    index=0,
+                    help="Coarser levels roll product codes up without re-reading the data; "
+                    "generalized mining finds rules mixing levels, e.g. category:Dairy → Bread.",
+                )
 
         st.markdown("---")
         st.markdown("#### 🎛 Mining Presets")
 
+        preset_names = list(PRESETS)
         preset = st.radio(
             "Choose preset",
-            ["Exploration (loose)", "Balanced (default)", "Strict (high precision)"],
-            index=1,
+            preset_names,
+            index=preset_names.index(DEFAULT_PRESET),
+            format_func=lambda name: PRESETS[name]["label"],
         )
-
-
-        if preset == "Exploration (loose)":
-            default_support = 0.02
-            default_conf = 0.25
-            default_lift = 1.05
-            default_max_len = 4
-        elif preset == "Strict (high precision)":
-            default_support = 0.08
-            default_conf = 0.6
-            default_lift = 1.5
-            default_max_len = 3
-        else:  
-            default_support = 0.05
-            default_conf = 0.4
-            default_lift = 1.2
-            default_max_len = 3
+        defaults = PRESETS[preset]
 
         st.caption("You can still fine-tune sliders after selecting a preset.")
 
@@ -286,14 +345,14 @@ def load_data_and_params():
                 "Min support",
                 min_value=0.01,
                 max_value=0.5,
-                value=default_support,
+                value=defaults["min_support"],
                 step=0.01,
             )
             min_confidence = st.slider(
                 "Min confidence",
                 min_value=0.1,
                 max_value=1.0,
-                value=default_conf,
+                value=defaults["min_confidence"],
                 step=0.05,
             )
         with col_b:
@@ -301,17 +360,96 @@ def load_data_and_params():
                 "Min lift",
                 min_value=1.0,
                 max_value=10.0,
-                value=default_lift,
+                value=defaults["min_lift"],
                 step=0.1,
             )
             max_len = st.slider(
                 "Max items in itemset",
                 min_value=2,
                 max_value=5,
-                value=default_max_len,
+                value=defaults["max_len"],
                 step=1,
             )
 
+        engine = st.selectbox(
+            "Mining engine",
+            ["apriori", "fpgrowth", "eclat"],
+            index=0,
+            help="FP-Growth and ECLAT avoid Apriori's candidate blow-up at low support.",
+        )
+        itemset_kind = st.selectbox(
+            "Itemsets",
+            list(ITEMSET_KINDS),
+            index=0,
+            help="Closed itemsets drop every itemset whose superset has the same support, "
+            "and rules are derived only from them: far fewer, non-redundant rules.",
+        )
+
+        mining_mode = st.radio(
+            "Mining mode",
+            ["Support threshold", "Top-K rules"],
+            horizontal=True,
+            help="Top-K finds the K best rules by lift, confidence or support that meet "
+            "the confidence/lift floors.",
+        )
+        top_k = None
+        top_k_by = "support"
+        if mining_mode == "Top-K rules":
+            top_k = st.slider(
+                "Rules to find (K)",
+                min_value=10,
+                max_value=500,
+                value=100,
+                step=10,
+            )
+            top_k_by = st.selectbox("Rank rules by", list(TOP_K_MEASURES), index=0)
+            if top_k_by == "support":
+                st.caption("Min support is ignored and discovered automatically.")
+            else:
+                st.caption(
+                    f"Min support is the floor: every itemset above it is searched for the "
+                    f"best {top_k_by}, since a rarer itemset can always hold a better rule."
+                )
+
+        accuracy = st.radio(
+            "Accuracy",
+            ["Exact", "Fast estimate (sample)"],
+            horizontal=True,
+            help="Estimate mines a random sample of invoices and reports confidence "
+            "intervals on support and lift.",
+        )
+        on_budget_label = st.selectbox(
+            "If mining would exceed the memory budget",
+            list(ON_BUDGET_CHOICES),
+            index=0,
+            help=f"Budget: {MEMORY_BUDGET_MB} MB (set MBA_MEMORY_BUDGET_MB). The cost is "
+            "estimated from item frequencies and basket sizes before mining starts.",
+        )
+        mine_options = {
+            "memory_budget": MEMORY_BUDGET_MB * 2**20,
+            "on_budget": ON_BUDGET_CHOICES[on_budget_label],
+            "kind": ITEMSET_KINDS[itemset_kind],
+        }
+        if accuracy == "Fast estimate (sample)":
+            sample_pct = st.slider(
+                "Sample size (% of invoices)",
+                min_value=1,
+                max_value=50,
+                value=10,
+                step=1,
+            )
+            verify = st.checkbox(
+                "Verify on full data",
+                value=False,
+                help="One extra counting pass turns the estimate into exact supports.",
+            )
+            mine_options = {
+                **mine_options,
+                "sample_fraction": sample_pct / 100,
+                "verify": verify,
+                "random_state": 0,
+            }
+
         top_rules_to_show = st.slider(
             "Top rules to display",
             min_value=10,
@@ -330,11 +468,64 @@ def load_data_and_params():
                 """
             )
 
-    return df, min_support, min_confidence, min_lift, max_len, top_rules_to_show
+    params = {
+        "min_support": min_support,
+        "min_confidence": min_confidence,
+        "min_lift": min_lift,
+        "max_len": max_len,
+        "engine": engine,
+        "top_k": top_k,
+        "top_k_by": top_k_by,
+        "mine_options": mine_options,
+        "top_rules_to_show": top_rules_to_show,
+        "level": level,
+    }
+    return coded, basket, dataset_key, hierarchy, params
 
 
 
-def overview_visuals(df: pd.DataFrame):
+def render_chart(fig, name: str):
+    with stage(f"render {name}", rows_in=len(fig.data)):
+        st.plotly_chart(fig, use_container_width=True)
+
+
+
+def _perf_table(recorder: Recorder) -> pd.DataFrame:
+    perf = recorder.to_frame()
+    mb = 1024 * 1024
+    return pd.DataFrame(
+        {
+            "stage": ["\u2003" * d + n for d, n in zip(perf["depth"], perf["name"])],
+            "ms": (perf["seconds"] * 1000).round(1),
+            "rows in": perf["rows_in"].astype("Int64"),
+            "rows out": perf["rows_out"].astype("Int64"),
+            "RSS (MB)": (perf["rss_bytes"] / mb).round(1),
+            "peak RSS in stage (MB)": (perf["peak_rss_bytes"] / mb).round(1),
+        }
+    )
+
+
+def performance_panel(recorder: Recorder, job: Job | None = None):
+    job_records = job is not None and job.recorder is not None and job.recorder.records
+    if not recorder.records and not job_records:
+        return
+    with st.expander("⏱️ Performance", expanded=False):
+        if recorder.records:
+            st.caption(
+                f"{len(recorder.records)} instrumented calls this run, {recorder.total_seconds * 1000:.0f} ms "
+                "in top-level stages. Set MBA_PERF_LOG to a file path to also write them as JSON lines."
+            )
+            st.dataframe(_perf_table(recorder), use_container_width=True, hide_index=True)
+        if job_records:
+            st.caption(
+                f"Background mining job for the results shown: {len(job.recorder.records)} calls, "
+                f"{job.elapsed * 1000:.0f} ms."
+            )
+            st.dataframe(_perf_table(job.recorder), use_container_width=True, hide_index=True)
+
+
+
+def overview_visuals(profile: DatasetProfile, coded: CodedTransactions):
     st.markdown("<div class='section-title'>📦 Product Landscape</div>", unsafe_allow_html=True)
     st.markdown(
         "<div class='section-subtitle'>Understand which products dominate baskets before diving into rules.</div>",
@@ -345,9 +536,7 @@ def overview_visuals(df: pd.DataFrame):
 
     
     with col1:
-        top_products = df["product"].value_counts().reset_index()
-        top_products.columns = ["product", "count"]
-        top_products = top_products.head(15)
+        top_products = profile.top_products(15).reset_index()
 
         if not top_products.empty:
             fig = px.bar(
@@ -364,16 +553,14 @@ def overview_visuals(df: pd.DataFrame):
                 margin=dict(l=10, r=10, t=40, b=80),
             )
             fig.update_xaxes(tickangle=-35)
-            st.plotly_chart(fig, use_container_width=True)
+            render_chart(fig, "top products")
         else:
             st.info("No products to display.")
 
     
     with col2:
-        if not df.empty:
-            share = df["product"].value_counts().reset_index()
-            share.columns = ["product", "count"]
-            share = share.head(8)
+        if profile.n_rows:
+            share = profile.top_products(8).reset_index()
             fig_donut = px.pie(
                 share,
                 names="product",
@@ -386,32 +573,37 @@ def overview_visuals(df: pd.DataFrame):
                 margin=dict(l=10, r=10, t=40, b=40),
                 title_x=0.1,
             )
-            st.plotly_chart(fig_donut, use_container_width=True)
+            render_chart(fig_donut, "product share")
         else:
             st.info("No data for donut chart.")
 
     
     with col3:
         st.markdown("**Sample Transactions**")
-        st.caption("Quick peek into raw transactional rows.")
-        st.dataframe(df.head(20), use_container_width=True, height=340)
+        basket_sizes = profile.invoice_stats()
+        st.caption(
+            "Quick peek into raw transactional rows. "
+            f"Baskets hold {basket_sizes['mean']:.1f} items on average "
+            f"(median {basket_sizes['median']:.0f}, max {basket_sizes['max']})."
+        )
+        st.dataframe(coded.to_frame(limit=20), use_container_width=True, height=340)
 
 
 
-def rules_scatter_and_lift(rules_filtered: pd.DataFrame):
+def rules_scatter_and_lift(rule_table: RuleTable, rows: np.ndarray):
     st.markdown("<div class='section-title'>📌 Rule Quality Landscape</div>", unsafe_allow_html=True)
     st.markdown(
         "<div class='section-subtitle'>Explore support, confidence and lift to balance recall vs precision.</div>",
         unsafe_allow_html=True,
     )
 
-    if rules_filtered.empty:
+    if len(rows) == 0:
         st.info("No rules to visualise. Try relaxing support/confidence/lift thresholds.")
         return
 
     col1, col2 = st.columns([1.5, 1.0])
 
-    df_plot = rules_filtered.copy().head(400)
+    df_plot = rule_table.to_frame(rows[:400])
     df_plot["rule"] = df_plot["antecedents_str"] + " → " + df_plot["consequents_str"]
 
     with col1:
@@ -431,7 +623,7 @@ def rules_scatter_and_lift(rules_filtered: pd.DataFrame):
             margin=dict(l=10, r=10, t=40, b=40),
             title_x=0.1,
         )
-        st.plotly_chart(fig, use_container_width=True)
+        render_chart(fig, "rule scatter")
 
     with col2:
         fig_hist = px.histogram(
@@ -447,15 +639,14 @@ def rules_scatter_and_lift(rules_filtered: pd.DataFrame):
             xaxis_title="Lift",
             yaxis_title="Rule count",
         )
-        st.plotly_chart(fig_hist, use_container_width=True)
+        render_chart(fig_hist, "lift histogram")
 
 
 
-def rules_product_filter_and_view(rules_filtered: pd.DataFrame):
-    all_products = sorted(
-        set(sum([a.split(", ") for a in rules_filtered["antecedents_str"]], []))
-        | set(sum([c.split(", ") for c in rules_filtered["consequents_str"]], []))
-    )
+def rules_product_filter_and_view(rule_table: RuleTable, rows: np.ndarray) -> np.ndarray:
+    # Works on rule_table row ids: product lookups go through the table's
+    # product index and the caller joins strings only for the rows it shows.
+    all_products = rule_table.items_in(rows)
 
     col1, col2 = st.columns([1.6, 1.2])
     with col1:
@@ -470,28 +661,18 @@ def rules_product_filter_and_view(rules_filtered: pd.DataFrame):
             index=0,
         )
 
-    df_view = rules_filtered.copy()
+    view_rows = rows
     if focus_product != "(All products)":
-        mask = df_view["antecedents_str"].str.contains(focus_product) | df_view[
-            "consequents_str"
-        ].str.contains(focus_product)
-        df_view = df_view[mask]
+        view_rows = rule_table.rules_with_item(focus_product, rows)
 
-    df_view = df_view.sort_values(sort_choice, ascending=False)
+    view_rows = rule_table.sort(view_rows, sort_choice)
 
     
     with st.expander("📊 Consequent product frequency in filtered rules", expanded=False):
-        if df_view.empty:
+        if len(view_rows) == 0:
             st.info("No rules for this filter.")
         else:
-            cons = (
-                df_view["consequents_str"]
-                .str.get_dummies(sep=", ")
-                .sum()
-                .sort_values(ascending=False)
-                .head(15)
-                .reset_index()
-            )
+            cons = rule_table.consequent_counts(view_rows).head(15).reset_index()
             cons.columns = ["product", "rule_count"]
             fig_c = px.bar(
                 cons,
@@ -506,14 +687,212 @@ def rules_product_filter_and_view(rules_filtered: pd.DataFrame):
                 margin=dict(l=10, r=10, t=40, b=80),
             )
             fig_c.update_xaxes(tickangle=-35)
-            st.plotly_chart(fig_c, use_container_width=True)
+            render_chart(fig_c, "consequent frequency")
+
+    return view_rows
+
+
+
+def save_rules_to_db(frequent_itemsets: pd.DataFrame, rules: pd.DataFrame, dataset_key: str, params: dict):
+    if st.button(
+        "💾 Save to rule database",
+        help=f"Store these itemsets and rules in {RULE_DB_PATH} (set MBA_RULE_DB) for "
+        "indexed queries with `python -m src.rule_db` or `server.py --db`.",
+    ):
+        settings = {k: v for k, v in params.items() if k not in ("mine_options", "top_rules_to_show")}
+        os.makedirs(os.path.dirname(RULE_DB_PATH) or ".", exist_ok=True)
+        with stage("save rules"), RuleDB(RULE_DB_PATH) as db:
+            run_id = db.write_run(frequent_itemsets, rules, settings, dataset_key=dataset_key)
+        st.success(f"Saved {len(rules)} rules as run {run_id} in {RULE_DB_PATH}.")
+
+
+def _join_items(rules: pd.DataFrame) -> pd.DataFrame:
+    rules = rules.copy()
+    for side in ("antecedents", "consequents"):
+        rules[side] = rules[side].map(lambda items: ", ".join(sorted(items)))
+    return rules
+
+
+
+def seasonality_view(partitions: PeriodCounts, min_support: float, min_confidence: float, min_lift: float):
+    labels = partitions.labels
+    if len(labels) < 2:
+        st.info("The date column spans a single period; pick a finer granularity.")
+        return
+
+    middle = len(labels) // 2
+    col1, col2 = st.columns(2)
+    with col1:
+        range_a = st.select_slider("Range A", options=labels, value=(labels[0], labels[middle - 1]))
+    with col2:
+        range_b = st.select_slider("Range B", options=labels, value=(labels[middle], labels[-1]))
+
+    with stage("range rules"):
+        rules = partitions.association_rules(*range_a, min_support=min_support, min_threshold=min_lift)
+    rules = rules[rules["confidence"] >= min_confidence].sort_values("lift", ascending=False)
+    st.markdown(f"**Rules for {range_a[0]} – {range_a[1]}** ({len(rules)})")
+    if rules.empty:
+        st.info("No rules in range A with the current thresholds.")
+    else:
+        st.dataframe(_join_items(rules.head(50)), use_container_width=True)
+
+    with stage("rule drift"):
+        drift = partitions.drift(range_a, range_b, min_support=min_support, min_lift=min_lift)
+    st.markdown(f"**Drift from A to B** ({len(drift)} rules, largest lift change first)")
+    if drift.empty:
+        st.info("No rules in either range with the current thresholds.")
+    else:
+        st.dataframe(_join_items(drift.head(50)), use_container_width=True)
+
+
+
+def get_period_counts(coded: CodedTransactions, dataset_key: str, freq: str, max_len: int) -> PeriodCounts:
+    # Partitions are mined once per dataset/granularity (and stored in the
+    # cache entry); range and drift queries only merge their counts.
+    period_key = (dataset_key, freq, max_len)
+    if st.session_state.get("period_counts_key") != period_key:
+        st.session_state["period_counts"] = load_periods(
+            dataset_key, coded, freq=freq, floor=PERIOD_FLOOR, max_len=max_len
+        )
+        st.session_state["period_counts_key"] = period_key
+    return st.session_state["period_counts"]
 
-    return df_view
+
+
+def hierarchy_key(hierarchy: ProductHierarchy) -> str:
+    return f"{pd.util.hash_pandas_object(hierarchy.table.reset_index()).sum():x}"
+
+
+
+def get_level_data(
+    coded: CodedTransactions, hierarchy: ProductHierarchy, dataset_key: str, level: str
+) -> tuple[CodedTransactions, pd.DataFrame, str]:
+    # Rolled up from the loaded codes with one lookup; switching levels never
+    # re-reads or re-pivots the CSV.
+    level_key = f"{dataset_key}:{hierarchy_key(hierarchy)}:{level}"
+    if st.session_state.get("level_data_key") != level_key:
+        rolled = hierarchy.roll_up(coded, level)
+        basket = codes_to_basket(
+            rolled.invoice_codes, rolled.product_codes, rolled.invoice_labels, rolled.product_labels
+        )
+        st.session_state["level_data"] = (rolled, basket)
+        st.session_state["level_data_key"] = level_key
+    return st.session_state["level_data"] + (level_key,)
+
+
+
+def generalized_rules(coded: CodedTransactions, hierarchy: ProductHierarchy, params: dict):
+    itemsets = mine_generalized_itemsets(
+        coded, hierarchy, min_support=params["min_support"], max_len=params["max_len"]
+    )
+    rules = mine_association_rules(itemsets, metric="lift", min_threshold=params["min_lift"])
+    return itemsets.sort_values("support", ascending=False), rules
+
+
+
+def get_dataset_profile(coded: CodedTransactions, dataset_key: str) -> DatasetProfile:
+    # Counted once per dataset (and stored in its cache entry); header cards
+    # and overview charts all read from it instead of rescanning the rows.
+    if st.session_state.get("dataset_profile_key") != dataset_key:
+        st.session_state["dataset_profile"] = load_profile(dataset_key, coded)
+        st.session_state["dataset_profile_key"] = dataset_key
+    return st.session_state["dataset_profile"]
+
+
+
+def get_rule_lattice(
+    basket: pd.DataFrame, dataset_key: str, engine: str, mine_options: dict
+) -> RuleLattice:
+    # One lattice per dataset/engine/accuracy, so slider moves filter instead of re-mining.
+    lattice_key = (dataset_key, engine, tuple(sorted(mine_options.items())))
+    if st.session_state.get("rule_lattice_key") != lattice_key:
+        st.session_state["rule_lattice"] = RuleLattice(basket, engine=engine, mine_options=mine_options)
+        st.session_state["rule_lattice_key"] = lattice_key
+    return st.session_state["rule_lattice"]
+
+
+
+def top_k_rules(basket: pd.DataFrame, params: dict):
+    rules = mine_top_k_rules(
+        basket,
+        k=params["top_k"],
+        min_confidence=params["min_confidence"],
+        min_lift=params["min_lift"],
+        max_len=params["max_len"],
+        sort_by=params["top_k_by"],
+        min_support=0.0 if params["top_k_by"] == "support" else params["min_support"],
+    )
+    # Itemsets behind the rules stand in for the frequent-itemset table.
+    itemsets = (
+        pd.DataFrame(
+            {
+                "support": rules["support"],
+                "itemsets": [a | c for a, c in zip(rules["antecedents"], rules["consequents"])],
+            }
+        )
+        .drop_duplicates("itemsets")
+        .sort_values("support", ascending=False)
+    )
+    return itemsets, rules
+
+
+
+@st.cache_resource
+def get_job_runner() -> JobRunner:
+    # One worker pool for the whole server, shared by every session.
+    return JobRunner()
+
+
+
+def mining_job(rules_key: tuple, mine) -> tuple[Job, tuple | None]:
+    # One background job per session. New settings cancel the running job;
+    # the last finished result stays on screen until the new one lands.
+    latest = st.session_state.setdefault("mining", LatestJob())
+    job = latest.switch(get_job_runner(), rules_key, mine)
+    # Quick runs finish within this wait and render without a progress pass.
+    return job, latest.poll(MINING_WAIT_S)
+
+
+
+@st.fragment(run_every=MINING_POLL_S)
+def mining_progress(job: Job):
+    if job.done:
+        # Full rerun to render the new results.
+        st.rerun()
+    st.progress(
+        job.progress or 0.0,
+        text=f"⛏️ {job.message.capitalize()} · {job.elapsed:.1f}s",
+    )
+
+
+
+def get_recommender(rules_raw: pd.DataFrame, rules_key: tuple) -> RecommenderModel:
+    # Compile once per rule set; reruns with the same thresholds reuse the index.
+    if st.session_state.get("recommender_key") != rules_key:
+        st.session_state["recommender"] = compile_rules(rules_raw)
+        st.session_state["recommender_key"] = rules_key
+    return st.session_state["recommender"]
+
+
+
+def get_rule_table(rules_raw: pd.DataFrame, rules_key: tuple) -> RuleTable:
+    # Compact rule store per rule set; display strings are memoised inside it.
+    if st.session_state.get("rule_table_key") != rules_key:
+        st.session_state["rule_table"] = RuleTable.from_frame(rules_raw)
+        st.session_state["rule_table_key"] = rules_key
+    return st.session_state["rule_table"]
 
 
 
 def main():
-    df, min_support, min_confidence, min_lift, max_len, top_rules_to_show = load_data_and_params()
+    coded, basket, dataset_key, hierarchy, params = load_data_and_params()
+    min_support = params["min_support"]
+    min_confidence = params["min_confidence"]
+    min_lift = params["min_lift"]
+    max_len = params["max_len"]
+    engine = params["engine"]
+    top_k = params["top_k"]
+    top_rules_to_show = params["top_rules_to_show"]
 
 
     st.markdown(
@@ -535,30 +914,62 @@ def main():
     )
     st.markdown("")
 
-    if df is None or df.empty:
+    if coded is None or len(coded) == 0:
         st.warning("Load a CSV from the sidebar to get started.")
         return
 
     
-    stats = get_unique_stats(df)
+    generalized = params["level"] == GENERALIZED_LEVEL
+    if hierarchy is not None and params["level"] not in ("product", GENERALIZED_LEVEL):
+        coded, basket, dataset_key = get_level_data(coded, hierarchy, dataset_key, params["level"])
+
+    profile = get_dataset_profile(coded, dataset_key)
+    stats = profile.stats()
 
     
-    basket = to_one_hot(df)
-    frequent_itemsets = mine_frequent_itemsets(
-        basket, min_support=min_support, max_len=max_len
-    )
-    rules_raw = mine_association_rules(
-        frequent_itemsets, metric="lift", min_threshold=min_lift
-    )
-    rules_filtered = filter_rules(
-        rules_raw, min_confidence=min_confidence, min_lift=min_lift
-    )
+    if generalized:
+        rules_key = (dataset_key, hierarchy_key(hierarchy), "generalized", min_support, max_len, min_lift)
+        mine = functools.partial(generalized_rules, coded, hierarchy, params)
+    elif top_k:
+        rules_key = (
+            dataset_key, "top-k", top_k, params["top_k_by"], min_confidence, min_lift, max_len,
+            None if params["top_k_by"] == "support" else min_support,
+        )
+        mine = functools.partial(top_k_rules, basket, params)
+    else:
+        rules_key = (
+            dataset_key,
+            engine,
+            tuple(sorted(params["mine_options"].items())),
+            min_support,
+            max_len,
+            min_lift,
+        )
+        lattice = get_rule_lattice(basket, dataset_key, engine, params["mine_options"])
+        mine = functools.partial(lattice.query, min_support, max_len=max_len, min_lift=min_lift)
+
+    job, shown = mining_job(rules_key, mine)
+    if job.done and job.error() is not None:
+        if isinstance(job.error(), MemoryBudgetError):
+            st.warning(f"⚠️ Mining skipped: {job.error()}")
+            st.stop()
+        raise job.error()
+    if not job.done:
+        mining_progress(job)
+        if shown is None:
+            st.stop()
+        st.caption("Showing results for the previous settings until mining finishes.")
+    # Derived views below are keyed by the result on screen, which may be stale.
+    rules_key, (frequent_itemsets, rules_raw) = shown
+
+    rule_table = get_rule_table(rules_raw, rules_key)
+    filtered_rows = rule_table.filter(min_confidence=min_confidence, min_lift=min_lift)
 
     n_itemsets = len(frequent_itemsets)
     n_rules_total = len(rules_raw)
-    n_rules_filtered = len(rules_filtered)
+    n_rules_filtered = len(filtered_rows)
 
-    top_items = top_n_products(df, n=5)
+    top_items = top_n_products(profile, n=5)
 
     col1, col2, col3, col4 = st.columns([1.1, 1.1, 1.1, 2.4])
     with col1:
@@ -616,22 +1027,56 @@ def main():
             unsafe_allow_html=True,
         )
 
+    requested_support = frequent_itemsets.attrs.get("requested_min_support")
+    if requested_support is not None:
+        st.caption(
+            f"Min support {requested_support:.3f} would exceed the {MEMORY_BUDGET_MB} MB memory "
+            f"budget, so itemsets were mined at {frequent_itemsets.attrs['min_support']:.3f}."
+        )
+
+    if generalized:
+        st.caption(
+            "Generalized rules: 'category:…' and 'department:…' items stand for any product of "
+            "that group; itemsets pairing an item with its own ancestor are skipped."
+            + (" Top-K is not available across levels." if top_k else "")
+        )
+
+    if frequent_itemsets.attrs.get("kind") == "closed":
+        st.caption(
+            "Showing closed itemsets and the rules derived from them; each rule stands for "
+            "every rule with the same support and confidence over its itemset."
+        )
+
+    sample_size = frequent_itemsets.attrs.get("sample_size")
+    if sample_size:
+        if frequent_itemsets.attrs.get("verified"):
+            st.caption(
+                f"Mined on a sample of {sample_size} invoices, supports verified on all "
+                f"{frequent_itemsets.attrs['n_rows']} invoices."
+            )
+        else:
+            st.caption(
+                f"Estimated from a sample of {sample_size} of {frequent_itemsets.attrs['n_rows']} "
+                "invoices; see support_low/high and lift_low/high for 95% intervals."
+            )
+
     st.markdown("---")
 
     
-    tab1, tab2, tab3, tab4, tab5 = st.tabs(
+    tab1, tab2, tab3, tab4, tab5, tab6 = st.tabs(
         [
             "📈 Overview",
             "📜 Rules Explorer",
             "📌 Rule Metrics",
             "🕸️ Network Graph",
             "🎯 Basket Recommender",
+            "🗓️ Seasonality",
         ]
     )
 
 
     with tab1:
-        overview_visuals(df)
+        overview_visuals(profile, coded)
 
         st.markdown("### 🔍 Frequent Itemsets")
         if frequent_itemsets.empty:
@@ -651,29 +1096,32 @@ def main():
             unsafe_allow_html=True,
         )
 
-        if rules_filtered.empty:
+        if n_rules_filtered == 0:
             st.info(
                 "No rules passed the filters. Try lowering the minimum support/confidence/lift."
             )
         else:
-            df_view = rules_product_filter_and_view(rules_filtered)
+            view_rows = rules_product_filter_and_view(rule_table, filtered_rows)
             st.dataframe(
-                df_view.head(top_rules_to_show),
+                rule_table.to_frame(view_rows[:top_rules_to_show]),
                 use_container_width=True,
                 height=480,
             )
 
-            csv_data = df_view.to_csv(index=False).encode("utf-8")
+            # Serialised only when the button is clicked, not on every rerun.
             st.download_button(
                 "⬇️ Download filtered rules as CSV",
-                csv_data,
+                lambda: rule_table.to_frame(view_rows).to_csv(index=False).encode("utf-8"),
                 file_name="association_rules_filtered.csv",
                 mime="text/csv",
             )
+            save_rules_to_db(
+                frequent_itemsets, rules_raw.iloc[filtered_rows], dataset_key, params
+            )
 
     
     with tab3:
-        rules_scatter_and_lift(rules_filtered)
+        rules_scatter_and_lift(rule_table, filtered_rows)
 
     
     with tab4:
@@ -683,13 +1131,23 @@ def main():
             unsafe_allow_html=True,
         )
 
-        if rules_filtered.empty:
+        if n_rules_filtered == 0:
             st.info("No rules to visualise.")
         else:
-            G = build_rules_network(rules_raw, top_k=40)
-            fig_net = graph_to_plotly_figure(G)
+            max_edges = int(min(len(rules_raw), 2000))
+            n_rules = st.slider(
+                "Rules in network",
+                min_value=1,
+                max_value=max_edges,
+                value=min(40, max_edges),
+                help="Larger networks use a faster layout and hide node labels (hover to see them).",
+            ) if max_edges > 1 else max_edges
+            G = build_rules_network(rules_raw, top_k=n_rules)
+            # Per session, so viewers don't warm-start from each other's layouts.
+            layout_cache = st.session_state.setdefault("layout_cache", LayoutCache())
+            fig_net = graph_to_plotly_figure(G, layout_cache=layout_cache)
             if fig_net.data:
-                st.plotly_chart(fig_net, use_container_width=True)
+                render_chart(fig_net, "network")
             else:
                 st.info("Network could not be built. Try relaxing thresholds.")
 
@@ -701,12 +1159,12 @@ def main():
             unsafe_allow_html=True,
         )
 
-        if rules_raw.empty or rules_filtered.empty:
+        if rules_raw.empty or n_rules_filtered == 0:
             st.info(
                 "No rules available for recommendation. Adjust the mining parameters."
             )
         else:
-            products_sorted = sorted(df["product"].unique())
+            products_sorted = sorted(coded.product_labels)
             preselected = products_sorted[:3] if len(products_sorted) > 0 else []
 
             selected_items = st.multiselect(
@@ -719,7 +1177,7 @@ def main():
                 if not selected_items:
                     st.warning("Please select at least one product.")
                 else:
-                    recs = recommend_products(rules_raw, selected_items, top_n=10)
+                    recs = get_recommender(rules_raw, rules_key).recommend(selected_items, top_n=10)
                     if recs.empty:
                         st.info(
                             "No strong recommendations for this combination. "
@@ -734,6 +1192,24 @@ def main():
                             "cart add-ons, or personalised email recommendations."
                         )
 
+    with tab6:
+        st.markdown("<div class='section-title'>🗓️ Seasonality &amp; Rule Drift</div>", unsafe_allow_html=True)
+        st.markdown(
+            "<div class='section-subtitle'>Rules for any date range, and how they shift between two ranges, merged from per-period counts.</div>",
+            unsafe_allow_html=True,
+        )
+
+        if coded.invoice_times is None:
+            st.info("No date/time column was found in this dataset (e.g. 'invoice_date').")
+        else:
+            freq = PERIOD_FREQUENCIES[
+                st.selectbox("Granularity", options=list(PERIOD_FREQUENCIES), index=0)
+            ]
+            partitions = get_period_counts(coded, dataset_key, freq, max_len)
+            if partitions.undated:
+                st.caption(f"{partitions.undated} invoices without a parseable date are left out.")
+            seasonality_view(partitions, min_support, min_confidence, min_lift)
+
     with st.expander("ℹ️ About this app"):
         st.markdown(
             """
@@ -747,4 +1223,7 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    with recording() as perf:
+        main()
+    latest = st.session_state.get("mining")
+    performance_panel(perf, latest.published if latest is not None else None)
@@ -0,0 +1,211 @@
+'''Per-stage time and peak memory of the market basket pipeline.
+
+Generates a seeded synthetic workload (see ``synthetic.py``), writes it to a
+temporary CSV and runs every stage the app runs, in order:
+
+    load_transactions -> to_one_hot -> mine_frequent_itemsets
+        -> mine_association_rules -> filter_rules -> recommend_products
+
+Each stage reports its best wall time over ``--repeat`` runs and its peak
+Python/numpy allocation (``tracemalloc``, measured in a separate run so
+tracing overhead does not skew the timings). Results are written as JSON;
+pass an earlier result as ``--baseline`` to print per-stage ratios and fail
+when a stage got slower than ``--tolerance``.
+
+    python benchmarks/pipeline.py --invoices 50000 --products 1000 -o bench.json
+    python benchmarks/pipeline.py --invoices 50000 --products 1000 --baseline bench.json
+'''
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from src.association_rules import filter_rules, mine_association_rules, mine_frequent_itemsets  # noqa: E402
+from src.data_loader import load_transactions  # noqa: E402
+from src.preprocessing import to_one_hot  # noqa: E402
+from src.recommender import recommend_products  # noqa: E402
+from synthetic import generate_transactions  # noqa: E402
+
+
+def _measure(fn, repeat: int) -> tuple[object, dict]:
+    '''Run ``fn`` and return its result with best time and peak traced bytes.'''
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return result, {'seconds': round(min(timings), 4), 'peak_bytes': int(peak)}
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args) -> dict:
+    workload = generate_transactions(
+        n_invoices=args.invoices,
+        n_products=args.products,
+        avg_basket_size=args.basket_size,
+        seed=args.seed,
+    )
+    # Query baskets: the first few items of randomly chosen invoices.
+    rng = np.random.default_rng(args.seed)
+    grouped = workload.groupby('invoice_id', sort=False)['product'].agg(list)
+    queries = [
+        items[:args.query_items]
+        for items in grouped.iloc[rng.choice(len(grouped), size=min(args.queries, len(grouped)), replace=False)]
+    ]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'transactions.csv')
+        workload.to_csv(path, index=False)
+        csv_bytes = os.path.getsize(path)
+
+        stages = []
+
+        def stage(name, fn, rows_in, rows_out=len):
+            result, measured = _measure(fn, args.repeat)
+            stages.append({'stage': name, 'rows_in': rows_in, 'rows_out': rows_out(result), **measured})
+            return result
+
+        df = stage('load_transactions', lambda: load_transactions(path), len(workload))
+        basket = stage(
+            'to_one_hot', lambda: to_one_hot(df, sparse_output=args.sparse), len(df)
+        )
+        itemsets = stage(
+            'mine_frequent_itemsets',
+            lambda: mine_frequent_itemsets(
+                basket, min_support=args.min_support, max_len=args.max_len, engine=args.engine
+            ),
+            len(basket),
+        )
+        rules = stage(
+            'mine_association_rules',
+            lambda: mine_association_rules(itemsets, metric='lift', min_threshold=1.0),
+            len(itemsets),
+        )
+        filtered = stage(
+            'filter_rules',
+            lambda: filter_rules(rules, min_confidence=args.min_confidence, min_lift=args.min_lift),
+            len(rules),
+        )
+        stage(
+            'recommend_products',
+            lambda: [recommend_products(filtered, items, top_n=5) for items in queries],
+            len(queries),
+            rows_out=lambda results: sum(len(r) for r in results),
+        )
+
+    return {
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'workload': {
+            'invoices': args.invoices,
+            'products': args.products,
+            'basket_size': args.basket_size,
+            'seed': args.seed,
+            'line_items': len(workload),
+            'csv_bytes': csv_bytes,
+        },
+        'settings': {
+            'engine': args.engine,
+            'sparse': args.sparse,
+            'min_support': args.min_support,
+            'max_len': args.max_len,
+            'min_confidence': args.min_confidence,
+            'min_lift': args.min_lift,
+            'queries': len(queries),
+            'repeat': args.repeat,
+        },
+        'stages': stages,
+        'total_seconds': round(sum(s['seconds'] for s in stages), 4),
+    }
+
+
+def compare(result: dict, baseline: dict, tolerance: float) -> bool:
+    '''Print per-stage ratios against ``baseline``; False if any stage regressed.'''
+    previous = {s['stage']: s for s in baseline['stages']}
+    ok = True
+    print(f"{'stage':<24}{'time x':>10}{'memory x':>10}", file=sys.stderr)
+    for current in result['stages']:
+        before = previous.get(current['stage'])
+        if before is None:
+            continue
+        time_ratio = current['seconds'] / max(before['seconds'], 1e-9)
+        memory_ratio = current['peak_bytes'] / max(before['peak_bytes'], 1)
+        flag = ''
+        # Sub-10 ms stages are too noisy to gate on.
+        if time_ratio > 1 + tolerance and current['seconds'] >= 0.01:
+            flag = '  slower'
+            ok = False
+        print(f"{current['stage']:<24}{time_ratio:>10.2f}{memory_ratio:>10.2f}{flag}", file=sys.stderr)
+    return ok
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--invoices', type=int, default=20_000)
+    parser.add_argument('--products', type=int, default=500)
+    parser.add_argument('--basket-size', type=float, default=8.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--engine', default='apriori')
+    parser.add_argument('--sparse', action='store_true', help='Use a sparse one-hot basket.')
+    parser.add_argument('--min-support', type=float, default=0.01)
+    parser.add_argument('--max-len', type=int, default=3)
+    parser.add_argument('--min-confidence', type=float, default=0.3)
+    parser.add_argument('--min-lift', type=float, default=1.2)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--query-items', type=int, default=3)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('-o', '--output', help='Write the JSON result here as well as to stdout.')
+    parser.add_argument('--baseline', help='Earlier JSON result to compare against.')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='Allowed slowdown per stage (0.2 = 20%%).')
+    args = parser.parse_args(argv)
+
+    result = run(args)
+    text = json.dumps(result, indent=2)
+    print(text)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            f.write(text + '\n')
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if not compare(result, baseline, args.tolerance):
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
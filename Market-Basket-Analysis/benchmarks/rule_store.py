@@ -0,0 +1,86 @@
+'''Compare the compact RuleTable with the frozenset rules frame.
+
+Mines rules from a seeded random workload, then reports memory footprint
+and the time to filter + prepare the displayed rows for both
+representations.
+
+    python benchmarks/rule_store.py --invoices 20000 --products 200 --min-support 0.002
+'''
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.association_rules import filter_rules, mine_association_rules, mine_frequent_itemsets  # noqa: E402
+from src.preprocessing import to_one_hot  # noqa: E402
+from src.rule_store import RuleTable  # noqa: E402
+
+
+def _best_of(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--invoices', type=int, default=20_000)
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--basket-size', type=float, default=6.0)
+    parser.add_argument('--min-support', type=float, default=0.002)
+    parser.add_argument('--max-len', type=int, default=3)
+    parser.add_argument('--rows-shown', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rng = np.random.default_rng(args.seed)
+    weights = 1.0 / np.arange(1, args.products + 1)
+    weights /= weights.sum()
+    sizes = rng.poisson(args.basket_size - 1, size=args.invoices) + 1
+    rows = [
+        (str(i), f'P{p}')
+        for i, size in enumerate(sizes)
+        for p in np.unique(rng.choice(args.products, size=size, p=weights))
+    ]
+    basket = to_one_hot(pd.DataFrame(rows, columns=['invoice_id', 'product']), sparse_output=True)
+    rules = mine_association_rules(
+        mine_frequent_itemsets(basket, args.min_support, args.max_len, engine='eclat'),
+        metric='lift',
+        min_threshold=1.0,
+    )
+
+    started = time.perf_counter()
+    table = RuleTable.from_frame(rules)
+    encode_seconds = time.perf_counter() - started
+
+    def frame_path():
+        filter_rules(rules, min_confidence=0.3, min_lift=1.2).head(args.rows_shown)
+
+    def table_path():
+        RuleTable.to_frame(table, table.filter(0.3, 1.2)[:args.rows_shown])
+
+    result = {
+        'rules': len(rules),
+        'frame_bytes': int(rules.memory_usage(deep=True).sum()),
+        'table_bytes': int(table.nbytes),
+        'encode_seconds': round(encode_seconds, 4),
+        'frame_filter_seconds': round(_best_of(frame_path, args.repeat), 4),
+        'table_filter_seconds': round(_best_of(table_path, args.repeat), 4),
+    }
+    result['memory_ratio'] = round(result['frame_bytes'] / max(result['table_bytes'], 1), 1)
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
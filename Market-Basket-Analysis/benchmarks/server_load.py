@@ -0,0 +1,111 @@
+'''Load generator for server.py.
+
+Opens ``--concurrency`` keep-alive connections to a running server and sends
+``--requests`` random basket queries built from the server's ``/items``
+list, then prints client-side throughput and p50 / p99 latency next to the
+server's own ``/stats``.
+
+    python server.py --data data/sample_transactions.csv &
+    python benchmarks/server_load.py --port 8080 --requests 20000 --concurrency 32
+'''
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import quote
+
+import numpy as np
+
+
+async def _request(reader, writer, method: str, path: str, body: bytes = b'') -> dict:
+    writer.write(
+        f'{method} {path} HTTP/1.1\r\nHost: bench\r\nContent-Length: {len(body)}\r\n\r\n'.encode()
+        + body
+    )
+    await writer.drain()
+    status = await reader.readline()
+    length = 0
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        if name.strip().lower() == 'content-length':
+            length = int(value)
+    payload = await reader.readexactly(length)
+    if not status.startswith(b'HTTP/1.1 200'):
+        raise RuntimeError(f'{path}: {status.decode().strip()} {payload[:200]!r}')
+    return json.loads(payload)
+
+
+async def _worker(host, port, queue, items, max_basket, latencies, rng):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        while True:
+            try:
+                queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            basket = rng.sample(items, rng.randint(1, min(max_basket, len(items))))
+            path = '/recommend?top_n=5&items=' + ','.join(quote(i, safe='') for i in basket)
+            started = time.perf_counter()
+            await _request(reader, writer, 'GET', path)
+            latencies.append((time.perf_counter() - started) * 1000.0)
+    finally:
+        writer.close()
+
+
+async def run(args) -> dict:
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    items = (await _request(reader, writer, 'GET', '/items'))['items']
+    writer.close()
+    if not items:
+        raise SystemExit('Server model has no items; mine with lower thresholds.')
+
+    queue = asyncio.Queue()
+    for _ in range(args.requests):
+        queue.put_nowait(None)
+
+    latencies: list[float] = []
+    started = time.perf_counter()
+    await asyncio.gather(
+        *(
+            _worker(args.host, args.port, queue, items, args.max_basket, latencies, random.Random(args.seed + i))
+            for i in range(args.concurrency)
+        )
+    )
+    elapsed = time.perf_counter() - started
+
+    reader, writer = await asyncio.open_connection(args.host, args.port)
+    server_stats = await _request(reader, writer, 'GET', '/stats')
+    writer.close()
+
+    p50, p99 = np.percentile(latencies, [50, 99])
+    return {
+        'requests': len(latencies),
+        'concurrency': args.concurrency,
+        'seconds': round(elapsed, 3),
+        'throughput_rps': round(len(latencies) / elapsed, 1),
+        'client_p50_ms': round(float(p50), 3),
+        'client_p99_ms': round(float(p99), 3),
+        'server': server_stats,
+    }
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Benchmark a running recommendation server.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--requests', type=int, default=10_000)
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--max-basket', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+
+    print(json.dumps(asyncio.run(run(args)), indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
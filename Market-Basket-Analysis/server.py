@@ -0,0 +1,216 @@
+'''Headless recommendation server.
+
+Loads a compiled rule model once at startup and answers basket
+recommendation queries over HTTP with asyncio, keeping per-request latency
+statistics. Recommendations are computed in the event loop's default thread
+pool, so a slow query does not hold up other connections.
+
+    python server.py --data data/sample_transactions.csv --save-model rules.npz
+    python server.py --model rules.npz --port 8080
+    python server.py --db rules.sqlite --run 3
+
+Endpoints:
+    GET  /recommend?items=Bread,Milk&top_n=5
+    GET  /recommend?item=Bread&item=Milk,+2%25&top_n=5   (one item per value)
+    POST /recommend        {"items": ["Bread", "Milk"], "top_n": 5}
+    GET  /items            products known to the model
+    GET  /stats            request count and p50 / p99 latency (ms)
+    GET  /health
+'''
+import argparse
+import asyncio
+import json
+import logging
+import time
+from collections import deque
+from urllib.parse import parse_qs, urlsplit
+
+import numpy as np
+
+from src.association_rules import ENGINES, mine_association_rules, mine_frequent_itemsets
+from src.cache import load_dataset
+from src.recommender import RecommenderModel, compile_rules
+from src.rule_db import RuleDB
+
+
+logger = logging.getLogger('mba.server')
+
+_REASONS = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed'}
+
+
+class LatencyTracker:
+    '''Rolling window of request latencies in milliseconds.'''
+
+    def __init__(self, window: int = 100_000):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds * 1000.0)
+        self.count += 1
+
+    def summary(self) -> dict:
+        if not self.samples:
+            return {'requests': self.count, 'p50_ms': None, 'p99_ms': None, 'max_ms': None}
+        values = np.fromiter(self.samples, dtype=float)
+        p50, p99 = np.percentile(values, [50, 99])
+        return {
+            'requests': self.count,
+            'window': len(values),
+            'p50_ms': round(float(p50), 3),
+            'p99_ms': round(float(p99), 3),
+            'max_ms': round(float(values.max()), 3),
+        }
+
+
+def _top_n(value) -> int:
+    '''``value`` if it is a positive integer (not a bool, float or string).'''
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        raise ValueError('top_n must be a positive integer')
+    return value
+
+
+def _query_int(text: str) -> int | None:
+    # Only plain ASCII digits; int() would also take ' 3 ', '+3' and '³'.
+    return int(text) if text.isascii() and text.isdigit() else None
+
+
+class RecommendationServer:
+    def __init__(self, model: RecommenderModel):
+        self.model = model
+        self.latency = LatencyTracker()
+
+    def recommend(self, items: list[str], top_n: int) -> dict:
+        return {
+            'items': items,
+            'recommendations': self.model.recommend_records(items, top_n=top_n),
+        }
+
+    def route(self, method: str, target: str, body: bytes) -> tuple[int, dict]:
+        url = urlsplit(target)
+        if url.path == '/recommend':
+            if method == 'GET':
+                query = parse_qs(url.query)
+                # ``items`` is comma separated; repeated ``item`` values may hold commas.
+                items = [i for part in query.get('items', []) for i in part.split(',') if i]
+                items += [i for i in query.get('item', []) if i]
+                top_n = _top_n(_query_int(query.get('top_n', ['5'])[0]))
+            elif method == 'POST':
+                payload = json.loads(body or b'{}')
+                if not isinstance(payload, dict):
+                    raise ValueError('body must be a JSON object')
+                items = payload.get('items', [])
+                if not isinstance(items, list) or not all(isinstance(i, str) for i in items):
+                    raise ValueError('items must be a list of strings')
+                top_n = _top_n(payload.get('top_n', 5))
+            else:
+                return 405, {'error': 'use GET or POST'}
+            return 200, self.recommend(items, top_n)
+        if url.path == '/items':
+            return 200, {'items': self.model.items}
+        if url.path == '/stats':
+            return 200, {'rules': len(self.model), **self.latency.summary()}
+        if url.path == '/health':
+            return 200, {'status': 'ok'}
+        return 404, {'error': f'unknown path {url.path}'}
+
+    async def handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                body = await reader.readexactly(length) if length else b''
+
+                started = time.perf_counter()
+                try:
+                    if target.startswith('/recommend'):
+                        status, payload = await asyncio.get_running_loop().run_in_executor(
+                            None, self.route, method, target, body
+                        )
+                    else:
+                        status, payload = self.route(method, target, body)
+                except (ValueError, KeyError, TypeError) as exc:
+                    status, payload = 400, {'error': str(exc)}
+                data = json.dumps(payload).encode()
+                if target.startswith('/recommend'):
+                    self.latency.record(time.perf_counter() - started)
+
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(
+                    f'HTTP/1.1 {status} {_REASONS.get(status, "")}\r\n'
+                    f'Content-Type: application/json\r\n'
+                    f'Content-Length: {len(data)}\r\n'
+                    f'Connection: {"keep-alive" if keep_alive else "close"}\r\n\r\n'.encode()
+                    + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host: str, port: int) -> None:
+        server = await asyncio.start_server(self.handle, host, port)
+        logger.info('Serving %d rules on http://%s:%d', len(self.model), host, port)
+        async with server:
+            await server.serve_forever()
+
+
+def build_model(args) -> RecommenderModel:
+    if args.model:
+        return RecommenderModel.load(args.model)
+    if args.db:
+        with RuleDB(args.db) as db:
+            return compile_rules(db.query_rules(args.run, min_lift=args.min_lift))
+
+    _, _, basket = load_dataset(args.data)
+    frequent = mine_frequent_itemsets(
+        basket, min_support=args.min_support, max_len=args.max_len, engine=args.engine
+    )
+    rules = mine_association_rules(frequent, metric='lift', min_threshold=args.min_lift)
+    model = compile_rules(rules)
+    if args.save_model:
+        model.save(args.save_model)
+    return model
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Serve basket recommendations over HTTP.')
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--model', help='Compiled model (.npz) from RecommenderModel.save.')
+    source.add_argument('--data', help='Transactions CSV to mine once at startup.')
+    source.add_argument('--db', help='SQLite rule store written by the pipeline or the app.')
+    parser.add_argument('--run', type=int, help='Run id in --db (default: latest).')
+    parser.add_argument('--min-support', type=float, default=0.05)
+    parser.add_argument('--min-lift', type=float, default=1.2)
+    parser.add_argument('--max-len', type=int, default=3)
+    parser.add_argument('--engine', choices=ENGINES, default='eclat')
+    parser.add_argument('--save-model', help='Write the mined model here for later --model runs.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s %(message)s')
+    server = RecommendationServer(build_model(args))
+    try:
+        asyncio.run(server.serve(args.host, args.port))
+    except KeyboardInterrupt:
+        logger.info('Final latency: %s', server.latency.summary())
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
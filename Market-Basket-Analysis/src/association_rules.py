@@ -1,40 +1,1348 @@
+import heapq
+import math
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from itertools import combinations
+
+import numpy as np
 import pandas as pd
-from mlxtend.frequent_patterns import apriori, association_rules
+from mlxtend.frequent_patterns import apriori, association_rules, fpgrowth
+from scipy import sparse
+from scipy.special import comb
+
+from src.data_loader import CodedTransactions, ProductHierarchy
+from src.instrumentation import instrument
+from src.jobs import checkpoint
+
+
+ENGINES = ('apriori', 'fpgrowth', 'eclat')
+KINDS = ('all', 'closed', 'maximal')
+ON_BUDGET = ('raise', 'raise_support', 'spill')
 
+_RULE_COLUMNS = [
+    'antecedents',
+    'consequents',
+    'antecedent support',
+    'consequent support',
+    'support',
+    'confidence',
+    'lift',
+    'leverage',
+    'conviction',
+]
 
+
+@instrument()
 def mine_frequent_itemsets(
     basket: pd.DataFrame,
     min_support: float = 0.02,
     max_len: int | None = None,
+    engine: str = 'apriori',
+    n_jobs: int = 1,
+    sample_fraction: float | None = None,
+    verify: bool = False,
+    random_state: int | None = None,
+    memory_budget: int | None = None,
+    on_budget: str = 'raise',
+    kind: str = 'all',
 ) -> pd.DataFrame:
-    '''Run Apriori to get frequent itemsets.'''
-    frequent = apriori(
-        basket,
-        min_support=min_support,
-        use_colnames=True,
-        max_len=max_len,
-    )
+    '''Mine frequent itemsets with the chosen engine.
+
+    ``basket`` may be the dense 0/1 frame or the sparse boolean frame from
+    ``to_one_hot(..., sparse_output=True)``.
+
+    Engines:
+        apriori  - mlxtend level-wise Apriori (default).
+        fpgrowth - mlxtend FP-Growth, no candidate generation.
+        eclat    - vertical depth-first search over tid bitsets.
+
+    All engines return the same ``support`` / ``itemsets`` frame.
+
+    With ``n_jobs`` other than 1 (``-1`` = all cores) invoices are split into
+    partitions mined in a process pool (SON algorithm): each worker finds its
+    locally frequent itemsets with ECLAT, and a second pass counts the merged
+    candidates over every partition for exact global supports. The result
+    matches the single-process output and ``engine`` is not used.
+
+    With ``sample_fraction`` set, the answer is a fast estimate (Toivonen):
+    a random sample of invoices is mined at a support lowered by its
+    sampling error, and itemsets whose estimated support reaches
+    ``min_support`` are returned with ``support_low`` / ``support_high``
+    95% Wilson intervals. ``verify=True`` adds a counting pass over the full
+    basket that replaces estimates with exact supports and checks the
+    sample's negative border. If a border itemset is frequent, the sample
+    missed something and the border is recounted until none is, so the
+    verified answer is exact; ``frame.attrs['passes']`` records how many
+    full passes that took.
+
+    With ``memory_budget`` (bytes), ``estimate_mining_cost`` runs first and
+    an over-budget setting is handled per ``on_budget``:
+        raise         - raise ``MemoryBudgetError`` without mining.
+        raise_support - mine at the smallest support (1.25x steps) whose
+                        estimate fits; ``attrs['min_support']`` holds it and
+                        ``attrs['requested_min_support']`` the original.
+        spill         - mine level-wise with itemset levels on disk, which
+                        keeps candidates out of memory (``attrs['spilled']``).
+    The budget is not applied to sampled runs, which already bound memory
+    by ``sample_fraction``.
+
+    ``kind`` condenses the output (``frame.attrs['kind']`` records it):
+        all     - every frequent itemset (default).
+        closed  - itemsets with no superset of equal support. Supports of
+                  all frequent itemsets stay recoverable via
+                  ``support_lookup`` and ``mine_association_rules``
+                  derives rules from them directly.
+        maximal - itemsets with no frequent superset; smallest, but
+                  subset supports need a counting pass.
+    Without ``max_len`` (and without sampling) closed and maximal itemsets
+    are mined directly by LCM, which never visits the non-closed ones and
+    ignores ``engine``, ``n_jobs`` and the budget. With ``max_len`` they are
+    closed / maximal among itemsets of at most ``max_len`` items, condensed
+    from a regular run.
+    '''
+    if on_budget not in ON_BUDGET:
+        raise ValueError(f"Unknown on_budget {on_budget!r}; expected one of {ON_BUDGET}.")
+    if kind not in KINDS:
+        raise ValueError(f"Unknown kind {kind!r}; expected one of {KINDS}.")
+    sampled = sample_fraction is not None and sample_fraction < 1
+    checkpoint(message=f'mining itemsets ({engine})')
+
+    if kind != 'all':
+        if max_len is None and not sampled:
+            frequent = _lcm_frame(basket, min_support, maximal=kind == 'maximal')
+            frequent = frequent.sort_values('support', ascending=False)
+        else:
+            frequent = _condense(
+                mine_frequent_itemsets(
+                    basket,
+                    min_support=min_support,
+                    max_len=max_len,
+                    engine=engine,
+                    n_jobs=n_jobs,
+                    sample_fraction=sample_fraction,
+                    verify=verify,
+                    random_state=random_state,
+                    memory_budget=memory_budget,
+                    on_budget=on_budget,
+                ),
+                kind,
+            )
+        frequent.attrs['kind'] = kind
+        return frequent
+
+    if memory_budget is not None and not sampled:
+        profile = _basket_profile(basket)
+        planned = 'eclat' if n_jobs != 1 else engine
+        estimate = _estimate(*profile, min_support, max_len, planned)
+        if estimate.peak_bytes > memory_budget:
+            if on_budget == 'raise':
+                raise MemoryBudgetError(
+                    f'Mining needs about {estimate.peak_bytes / 2**20:.1f} MiB '
+                    f'(about {estimate.total_itemsets} itemsets) but the budget is '
+                    f'{memory_budget / 2**20:.1f} MiB; raise min_support or lower max_len.',
+                    estimate,
+                )
+            if on_budget == 'raise_support':
+                support, estimate = _fit_support(profile, min_support, max_len, planned, memory_budget)
+                frequent = mine_frequent_itemsets(
+                    basket, min_support=support, max_len=max_len, engine=engine, n_jobs=n_jobs
+                )
+                frequent.attrs.update(min_support=support, requested_min_support=min_support)
+            else:
+                estimate = _estimate(*profile, min_support, max_len, 'spill')
+                if estimate.peak_bytes > memory_budget:
+                    raise MemoryBudgetError(
+                        f'Even spilling to disk needs about {estimate.peak_bytes / 2**20:.1f} MiB '
+                        f'for about {estimate.total_itemsets} itemsets.',
+                        estimate,
+                    )
+                frequent = _spill_frame(basket, min_support, max_len)
+                frequent = frequent.sort_values('support', ascending=False)
+                frequent.attrs['spilled'] = True
+            frequent.attrs['estimated_bytes'] = estimate.peak_bytes
+            return frequent
+
+    if sampled:
+        return _sampled_frame(
+            basket, min_support, max_len, engine, n_jobs, sample_fraction, verify, random_state
+        )
+
+    if engine not in ENGINES:
+        raise ValueError(f"Unknown engine {engine!r}; expected one of {ENGINES}.")
+    if basket.shape[0] == 0:
+        # mlxtend divides by the row count; nothing is frequent in no baskets.
+        frequent = pd.DataFrame({'support': [], 'itemsets': []}, columns=['support', 'itemsets'])
+    elif n_jobs != 1:
+        frequent = _son_frame(basket, min_support, max_len, n_jobs)
+    elif engine == 'apriori':
+        frequent = apriori(
+            basket,
+            min_support=min_support,
+            use_colnames=True,
+            max_len=max_len,
+        )
+    elif engine == 'fpgrowth':
+        frequent = fpgrowth(
+            basket,
+            min_support=min_support,
+            use_colnames=True,
+            max_len=max_len,
+        )
+    else:
+        frequent = _eclat_frame(basket, min_support, max_len)
+
+    checkpoint()
     frequent = frequent.sort_values('support', ascending=False)
     return frequent
 
 
+def _column_rows(basket: pd.DataFrame):
+    '''Yield the sorted row positions holding a True/1 for each column.'''
+    if hasattr(basket, 'sparse'):
+        matrix = basket.sparse.to_coo().tocsc()
+        matrix.sort_indices()
+        for j in range(matrix.shape[1]):
+            yield matrix.indices[matrix.indptr[j]:matrix.indptr[j + 1]]
+    else:
+        values = basket.to_numpy()
+        for j in range(values.shape[1]):
+            yield np.flatnonzero(values[:, j])
+
+
+def _rows_to_bitset(rows: np.ndarray, n_rows: int) -> int:
+    buf = np.zeros((n_rows + 7) // 8, dtype=np.uint8)
+    np.bitwise_or.at(buf, rows >> 3, (1 << (rows & 7)).astype(np.uint8))
+    return int.from_bytes(buf.tobytes(), 'little')
+
+
+def _item_tidsets(basket: pd.DataFrame) -> list[int]:
+    '''Vertical layout: one bitset (Python int) of row positions per column.'''
+    n_rows = len(basket)
+    return [_rows_to_bitset(rows, n_rows) for rows in _column_rows(basket)]
+
+
+def _apriori_gen(level: list[tuple], frequent: set[tuple]) -> list[tuple]:
+    '''Join sorted frequent k-itemsets sharing a (k-1)-prefix and prune.
+
+    Candidates with any infrequent k-subset are dropped, so every returned
+    (k+1)-itemset has all its subsets in ``frequent``.
+    '''
+    level = sorted(level)
+    candidates = []
+    for i, left in enumerate(level):
+        for right in level[i + 1:]:
+            if left[:-1] != right[:-1]:
+                break
+            candidate = left + right[-1:]
+            if all(
+                candidate[:j] + candidate[j + 1:] in frequent
+                for j in range(len(candidate) - 2)
+            ):
+                candidates.append(candidate)
+    return candidates
+
+
+def _eclat(
+    tidsets: list[int],
+    n_rows: int,
+    min_support: float,
+    max_len: int | None = None,
+    limit: int | None = None,
+    exclude: list[frozenset[int]] | None = None,
+) -> list[tuple[tuple[int, ...], int]]:
+    '''Depth-first ECLAT over tid bitsets.
+
+    Returns ``(column positions, row count)`` for every frequent itemset,
+    or stops early once more than ``limit`` have been found. Column ``j`` is
+    never joined to an itemset holding a column ``i`` with ``j`` in
+    ``exclude[i]``.
+    '''
+    found = []
+    if n_rows == 0:
+        return found
+
+    roots = []
+    for i, tids in enumerate(tidsets):
+        count = tids.bit_count()
+        if count / n_rows >= min_support:
+            roots.append((i, tids))
+            found.append(((i,), count))
+
+    stack = [((i,), tids, roots[pos + 1:]) for pos, (i, tids) in enumerate(roots)]
+    while stack:
+        prefix, prefix_tids, siblings = stack.pop()
+        if len(prefix) == 1:
+            # Roots are popped last to first, so a root with s siblings starts
+            # once roughly (s / n)^2 of the candidate pairs have been searched.
+            checkpoint((len(siblings) / len(roots)) ** 2)
+        else:
+            checkpoint()
+        if max_len is not None and len(prefix) >= max_len:
+            continue
+
+        # Siblings already passed the check against the earlier prefix items.
+        excluded = exclude[prefix[-1]] if exclude is not None else ()
+        children = []
+        for j, tids in siblings:
+            if j in excluded:
+                continue
+            joined = prefix_tids & tids
+            count = joined.bit_count()
+            if count / n_rows >= min_support:
+                children.append((j, joined))
+                found.append((prefix + (j,), count))
+
+        if limit is not None and len(found) > limit:
+            break
+        for pos, (j, joined) in enumerate(children):
+            stack.append((prefix + (j,), joined, children[pos + 1:]))
+
+    return found
+
+
+def _eclat_frame(
+    basket: pd.DataFrame,
+    min_support: float,
+    max_len: int | None,
+) -> pd.DataFrame:
+    n_rows = len(basket)
+    # Infrequent columns never join, so skip materialising their bitsets.
+    tidsets = [
+        _rows_to_bitset(rows, n_rows) if n_rows and len(rows) / n_rows >= min_support else 0
+        for rows in _column_rows(basket)
+    ]
+    found = _eclat(tidsets, n_rows, min_support, max_len)
+    columns = list(basket.columns)
+    return pd.DataFrame(
+        {
+            'support': [count / n_rows for _, count in found],
+            'itemsets': [frozenset(columns[i] for i in items) for items, _ in found],
+        },
+        columns=['support', 'itemsets'],
+    )
+
+
+@instrument()
+def mine_generalized_itemsets(
+    coded: CodedTransactions,
+    hierarchy: ProductHierarchy,
+    min_support: float = 0.02,
+    max_len: int | None = None,
+    levels: list[str] | None = None,
+) -> pd.DataFrame:
+    '''Frequent itemsets across hierarchy levels (Srikant & Agrawal's Cumulate).
+
+    Each invoice is extended with the ancestors of its products at
+    ``levels`` (default: every coarser level), labelled ``'<level>:<label>'``,
+    and mined with ECLAT. Itemsets holding an item together with one of its
+    ancestors are never generated: their support is that of the itemset
+    without the ancestor, so they only repeat other rules. The result is the
+    usual ``support`` / ``itemsets`` frame, so rules follow from
+    ``mine_association_rules`` unchanged, e.g. ``category:Dairy -> Bread``.
+    '''
+    extended, related = hierarchy.generalize(coded, levels)
+    n_rows = len(extended.invoice_labels)
+    matrix = sparse.csr_matrix(
+        (np.ones(len(extended), dtype=bool), (extended.invoice_codes, extended.product_codes)),
+        shape=(n_rows, len(extended.product_labels)),
+    )
+    matrix.sum_duplicates()
+    matrix = matrix.tocsc()
+    matrix.sort_indices()
+
+    tidsets = []
+    for j in range(matrix.shape[1]):
+        rows = matrix.indices[matrix.indptr[j]:matrix.indptr[j + 1]]
+        frequent = n_rows and len(rows) / n_rows >= min_support
+        tidsets.append(_rows_to_bitset(rows, n_rows) if frequent else 0)
+    found = _eclat(tidsets, n_rows, min_support, max_len, exclude=related)
+
+    labels = extended.product_labels
+    frequent = pd.DataFrame(
+        {
+            'support': [count / n_rows for _, count in found],
+            'itemsets': [frozenset(labels[i] for i in items) for items, _ in found],
+        },
+        columns=['support', 'itemsets'],
+    )
+    frequent.attrs['n_rows'] = n_rows
+    return frequent
+
+
+def _closure(tidsets: list[int], items: list[int], tids: int) -> tuple[int, ...]:
+    '''Every item of ``items`` present in all rows of ``tids``.'''
+    return tuple(j for j in items if tidsets[j] & tids == tids)
+
+
+def _lcm(
+    tidsets: list[int],
+    n_rows: int,
+    min_support: float,
+    maximal: bool = False,
+) -> list[tuple[tuple[int, ...], int]]:
+    '''Closed itemsets by prefix-preserving closure extension (LCM).
+
+    Each closed itemset is reached exactly once: from a closed parent ``P``
+    the search adds an item ``e`` past the parent's core item and takes the
+    closure ``Q`` of the joined tidset, keeping ``Q`` only when it adds no
+    item before ``e`` that ``P`` lacked. No non-closed itemset is ever
+    visited. With ``maximal`` only closed itemsets that no frequent item
+    extends are returned.
+    '''
+    found = []
+    if n_rows == 0:
+        return found
+    frequent = [j for j, tids in enumerate(tidsets) if tids.bit_count() / n_rows >= min_support]
+
+    def emit(items, tids, count):
+        if maximal and any(
+            (tids & tidsets[j]).bit_count() / n_rows >= min_support
+            for j in frequent
+            if j not in items
+        ):
+            return
+        found.append((items, count))
+
+    full = (1 << n_rows) - 1
+    root = _closure(tidsets, frequent, full)
+    if root:
+        emit(root, full, n_rows)
+
+    stack = [(root, full, -1)]
+    while stack:
+        checkpoint()
+        items, tids, core = stack.pop()
+        members = set(items)
+        for e in frequent:
+            if e <= core or e in members:
+                continue
+            joined = tids & tidsets[e]
+            count = joined.bit_count()
+            if count / n_rows < min_support:
+                continue
+            closed = _closure(tidsets, frequent, joined)
+            if any(j < e and j not in members for j in closed):
+                continue
+            emit(closed, joined, count)
+            stack.append((closed, joined, e))
+
+    return found
+
+
+def _lcm_frame(basket: pd.DataFrame, min_support: float, maximal: bool) -> pd.DataFrame:
+    n_rows = len(basket)
+    tidsets = [
+        _rows_to_bitset(rows, n_rows) if n_rows and len(rows) / n_rows >= min_support else 0
+        for rows in _column_rows(basket)
+    ]
+    found = _lcm(tidsets, n_rows, min_support, maximal)
+    columns = list(basket.columns)
+    return pd.DataFrame(
+        {
+            'support': [count / n_rows for _, count in found],
+            'itemsets': [frozenset(columns[i] for i in items) for items, _ in found],
+        },
+        columns=['support', 'itemsets'],
+    )
+
+
+def _condense(frequent: pd.DataFrame, kind: str) -> pd.DataFrame:
+    '''Keep the closed or maximal rows of a complete frequent-itemset frame.
+
+    An itemset is dropped when a one-item-larger frequent itemset has the
+    same support (closed) or exists at all (maximal); by anti-monotonicity
+    checking immediate supersets is enough.
+    '''
+    supports = dict(zip(frequent['itemsets'], frequent['support']))
+    dropped = set()
+    for itemset, support in supports.items():
+        if len(itemset) < 2:
+            continue
+        for item in itemset:
+            subset = itemset - {item}
+            if kind == 'maximal' or math.isclose(supports.get(subset, -1.0), support, rel_tol=1e-9):
+                dropped.add(subset)
+    keep = np.fromiter((items not in dropped for items in frequent['itemsets']), dtype=bool, count=len(frequent))
+    condensed = frequent[keep]
+    condensed.attrs.update(frequent.attrs)
+    return condensed
+
+
+def support_lookup(frequent_itemsets: pd.DataFrame, basket: pd.DataFrame | None = None):
+    '''Return ``support(items) -> float`` for any itemset of ``frequent_itemsets``' kind.
+
+    For a complete frame this is a dictionary lookup. For a closed frame the
+    support of a frequent itemset is that of its smallest closed superset,
+    i.e. the largest support among the closed rows containing it; itemsets
+    with no closed superset are infrequent and get 0.0. Maximal itemsets
+    only say which itemsets are frequent, so their supports are counted on
+    ``basket``, which is then required.
+    '''
+    kind = frequent_itemsets.attrs.get('kind', 'all')
+    cache: dict[frozenset, float] = {}
+
+    if kind == 'all':
+        cache.update(zip(frequent_itemsets['itemsets'], frequent_itemsets['support']))
+
+        def support(items) -> float:
+            return cache.get(frozenset(items), 0.0)
+
+        return support
+
+    if kind == 'maximal':
+        if basket is None:
+            raise ValueError('Maximal itemsets carry no subset supports; pass the basket to count them.')
+        positions = {c: j for j, c in enumerate(basket.columns)}
+        n_rows = len(basket)
+
+        def support(items) -> float:
+            items = frozenset(items)
+            if items not in cache:
+                try:
+                    key = tuple(sorted(positions[i] for i in items))
+                except KeyError:
+                    return 0.0
+                cache[items] = _count_itemsets(basket, [key])[0] / n_rows if n_rows else 0.0
+            return cache[items]
+
+        return support
+
+    # Closed: per-item bitsets over the closed rows sorted by descending
+    # support, so the lowest set bit of an intersection is the answer.
+    order = np.argsort(-frequent_itemsets['support'].to_numpy(), kind='stable')
+    supports = frequent_itemsets['support'].to_numpy()[order]
+    postings: dict = {}
+    for row, itemset in enumerate(frequent_itemsets['itemsets'].to_numpy()[order]):
+        for item in itemset:
+            postings[item] = postings.get(item, 0) | (1 << row)
+    every = (1 << len(supports)) - 1
+
+    def support(items) -> float:
+        items = frozenset(items)
+        if items not in cache:
+            rows = every
+            for item in items:
+                rows &= postings.get(item, 0)
+                if not rows:
+                    break
+            cache[items] = float(supports[(rows & -rows).bit_length() - 1]) if rows else 0.0
+        return cache[items]
+
+    return support
+
+
+def _basket_csr(basket: pd.DataFrame):
+    if hasattr(basket, 'sparse'):
+        return basket.sparse.to_coo().tocsr()
+    return sparse.csr_matrix(basket.to_numpy(dtype=bool))
+
+
+def _partition_tidsets(part) -> list[int]:
+    n_rows = part.shape[0]
+    csc = part.tocsc()
+    csc.sort_indices()
+    return [
+        _rows_to_bitset(csc.indices[csc.indptr[j]:csc.indptr[j + 1]], n_rows)
+        for j in range(csc.shape[1])
+    ]
+
+
+# Worker-process state between the two SON passes: the partition's tidsets.
+_son_tidsets: list[int] = []
+
+
+def _son_local(args) -> list[tuple[int, ...]]:
+    global _son_tidsets
+    part, min_support, max_len = args
+    _son_tidsets = _partition_tidsets(part)
+    # A hair of slack so float rounding can never drop a global candidate.
+    local_support = min_support * (1 - 1e-9)
+    return [items for items, _ in _eclat(_son_tidsets, part.shape[0], local_support, max_len)]
+
+
+def _son_count(candidates: list[tuple[int, ...]]) -> np.ndarray:
+    global _son_tidsets
+    tidsets, _son_tidsets = _son_tidsets, []
+    counts = np.zeros(len(candidates), dtype=np.int64)
+    for pos, items in enumerate(candidates):
+        joined = tidsets[items[0]]
+        for i in items[1:]:
+            joined &= tidsets[i]
+        counts[pos] = joined.bit_count()
+    return counts
+
+
+def _son_frame(
+    basket: pd.DataFrame,
+    min_support: float,
+    max_len: int | None,
+    n_jobs: int,
+) -> pd.DataFrame:
+    if n_jobs < 0:
+        n_jobs = os.cpu_count() or 1
+    matrix = _basket_csr(basket)
+    n_rows = matrix.shape[0]
+    bounds = np.linspace(0, n_rows, n_jobs + 1).astype(int)
+    parts = [matrix[start:stop] for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start]
+
+    # One single-process pool per partition, so the counting pass runs in the
+    # process that already holds the partition's tidsets from the first pass.
+    pools = [ProcessPoolExecutor(max_workers=1) for _ in parts]
+    try:
+        local = [pool.submit(_son_local, (part, min_support, max_len)) for pool, part in zip(pools, parts)]
+        candidates = sorted(set().union(*(future.result() for future in local)))
+        checkpoint()
+        counted = [pool.submit(_son_count, candidates) for pool in pools]
+        counts = sum((future.result() for future in counted), np.zeros(len(candidates), dtype=np.int64))
+    finally:
+        for pool in pools:
+            pool.shutdown(cancel_futures=True)
+
+    columns = list(basket.columns)
+    keep = [
+        (count / n_rows, frozenset(columns[i] for i in items))
+        for items, count in zip(candidates, counts)
+        if count / n_rows >= min_support
+    ]
+    return pd.DataFrame(keep, columns=['support', 'itemsets'])
+
+
+_Z = 1.959964  # two-sided 95% normal quantile
+
+
+def _wilson_interval(counts: np.ndarray, n: int) -> tuple[np.ndarray, np.ndarray]:
+    p = counts / n
+    denominator = 1 + _Z ** 2 / n
+    centre = (p + _Z ** 2 / (2 * n)) / denominator
+    half = _Z * np.sqrt(p * (1 - p) / n + _Z ** 2 / (4 * n ** 2)) / denominator
+    return np.clip(centre - half, 0, 1), np.clip(centre + half, 0, 1)
+
+
+def _count_itemsets(basket: pd.DataFrame, itemsets: list[tuple[int, ...]]) -> np.ndarray:
+    '''Exact row counts of column-position itemsets in one pass over ``basket``.'''
+    needed = {i for items in itemsets for i in items}
+    n_rows = len(basket)
+    tidsets = {
+        j: _rows_to_bitset(rows, n_rows)
+        for j, rows in enumerate(_column_rows(basket))
+        if j in needed
+    }
+    counts = np.zeros(len(itemsets), dtype=np.int64)
+    for pos, items in enumerate(itemsets):
+        if pos % 4096 == 0:
+            checkpoint(pos / len(itemsets))
+        joined = tidsets[items[0]]
+        for i in items[1:]:
+            joined &= tidsets[i]
+        counts[pos] = joined.bit_count()
+    return counts
+
+
+def _sampled_frame(
+    basket: pd.DataFrame,
+    min_support: float,
+    max_len: int | None,
+    engine: str,
+    n_jobs: int,
+    sample_fraction: float,
+    verify: bool,
+    random_state: int | None,
+) -> pd.DataFrame:
+    n_rows = len(basket)
+    if n_rows == 0 or basket.shape[1] == 0:
+        # Nothing to sample or count; same shape and attrs as a real run.
+        columns = ['support', 'itemsets'] if verify else ['support', 'itemsets', 'support_low', 'support_high']
+        frame = pd.DataFrame({c: [] for c in columns}, columns=columns)
+        frame.attrs.update(
+            n_rows=n_rows,
+            sample_size=0,
+            lowered_support=float(min_support),
+            verified=verify,
+            **({'passes': 0, 'complete': True} if verify else {'complete': None}),
+        )
+        return frame
+
+    n_sample = max(1, min(n_rows, int(round(n_rows * sample_fraction))))
+    rng = np.random.default_rng(random_state)
+    rows = np.sort(rng.choice(n_rows, size=n_sample, replace=False))
+    sample = basket.iloc[rows]
+
+    # Lower the threshold by the sampling error so that true frequent
+    # itemsets are unlikely to be missed; never below half of min_support.
+    error = _Z * np.sqrt(min_support * (1 - min_support) / n_sample)
+    lowered = max(min_support - error, min_support / 2)
+
+    found = mine_frequent_itemsets(
+        sample, min_support=lowered, max_len=max_len, engine=engine, n_jobs=n_jobs
+    )
+    positions = {c: j for j, c in enumerate(basket.columns)}
+    candidates = [tuple(sorted(positions[c] for c in items)) for items in found['itemsets']]
+    columns = list(basket.columns)
+    attrs = {
+        'n_rows': n_rows,
+        'sample_size': n_sample,
+        'lowered_support': float(lowered),
+        'verified': verify,
+    }
+
+    if not verify:
+        counts = np.rint(found['support'].to_numpy() * n_sample).astype(np.int64)
+        keep = counts / n_sample >= min_support
+        low, high = _wilson_interval(counts[keep], n_sample)
+        frame = pd.DataFrame(
+            {
+                'support': counts[keep] / n_sample,
+                'itemsets': found['itemsets'].to_numpy()[keep],
+                'support_low': low,
+                'support_high': high,
+            }
+        )
+        frame.attrs.update(attrs, complete=None)
+        return frame.sort_values('support', ascending=False)
+
+    # Count the sample result and its negative border over the full basket.
+    # If a border itemset turns out frequent, the border moves up and is
+    # counted again, so the verified answer is exact.
+    counted: dict[tuple, int] = {}
+    pending = candidates + _negative_border(set(candidates), len(columns), max_len)
+    passes = 0
+    while pending:
+        counted.update(zip(pending, _count_itemsets(basket, pending).tolist()))
+        passes += 1
+        frequent = {items for items, count in counted.items() if count / n_rows >= min_support}
+        pending = [
+            items
+            for items in _negative_border(frequent, len(columns), max_len)
+            if items not in counted
+        ]
+
+    frame = pd.DataFrame(
+        {
+            'support': [counted[items] / n_rows for items in frequent],
+            'itemsets': [frozenset(columns[i] for i in items) for items in frequent],
+        },
+        columns=['support', 'itemsets'],
+    )
+    # complete: the sample alone already contained every frequent itemset.
+    frame.attrs.update(attrs, passes=passes, complete=passes == 1)
+    return frame.sort_values('support', ascending=False)
+
+
+def _negative_border(frequent: set[tuple], n_columns: int, max_len: int | None) -> list[tuple]:
+    '''Minimal itemsets outside ``frequent`` whose proper subsets are all in it.'''
+    border = [(j,) for j in range(n_columns) if (j,) not in frequent]
+    by_size: dict[int, list[tuple]] = {}
+    for items in frequent:
+        by_size.setdefault(len(items), []).append(items)
+    for size, level in by_size.items():
+        if max_len is None or size < max_len:
+            border += [c for c in _apriori_gen(level, frequent) if c not in frequent]
+    return border
+
+
+# Rough per-object sizes on 64-bit CPython, used only for estimates.
+_ITEMSET_BYTES = 320  # one output row: frozenset, support, frame overhead
+_FP_NODE_BYTES = 150  # one FP-tree node and its parent's children-dict entry
+_SPILL_BLOCK = 1 << 16  # rows buffered before a spilled level is written
+_ESTIMATE_ROWS = 2_000  # minimum baskets mined to estimate level sizes
+_ESTIMATE_MIN_COUNT = 30  # sample occurrences expected at min_support
+_ESTIMATE_LIMIT = 200_000  # sample itemsets beyond which a setting counts as exploding
+
+
+class MemoryBudgetError(MemoryError):
+    '''Estimated mining memory is over ``memory_budget``.'''
+
+    def __init__(self, message: str, estimate: 'MiningEstimate'):
+        super().__init__(message)
+        self.estimate = estimate
+
+
+@dataclass
+class MiningEstimate:
+    '''Predicted cost of one ``mine_frequent_itemsets`` call.
+
+    ``candidates[k - 1]`` and ``itemsets[k - 1]`` estimate the level-``k``
+    candidate and frequent itemset counts; ``peak_bytes`` is the predicted
+    working memory on top of the basket itself.
+    '''
+
+    engine: str
+    min_support: float
+    n_rows: int
+    n_frequent_items: int
+    candidates: list[float]
+    itemsets: list[float]
+    peak_bytes: int
+
+    @property
+    def total_itemsets(self) -> int:
+        return int(sum(self.itemsets))
+
+
+def _basket_profile(basket: pd.DataFrame, random_state: int = 0):
+    '''(row-major matrix, per-column counts, dense itemsize, sampling order).'''
+    matrix = _basket_csr(basket)
+    counts = np.asarray(matrix.sum(axis=0)).ravel()
+    itemsize = 1 if hasattr(basket, 'sparse') else max(
+        (dtype.itemsize for dtype in basket.dtypes), default=1
+    )
+    order = np.random.default_rng(random_state).permutation(matrix.shape[0])
+    return matrix, counts, itemsize, order
+
+
+def _join_count(level: list[tuple[int, ...]]) -> int:
+    '''Candidates the Apriori join makes from one level (before pruning).'''
+    groups: dict[tuple, int] = {}
+    for itemset in level:
+        groups[itemset[:-1]] = groups.get(itemset[:-1], 0) + 1
+    return sum(g * (g - 1) // 2 for g in groups.values())
+
+
+def _estimate(matrix, counts, itemsize, order, min_support, max_len, engine) -> MiningEstimate:
+    n_rows = matrix.shape[0]
+    frequent = np.flatnonzero(counts >= min_support * n_rows) if n_rows else np.empty(0, dtype=int)
+    n_items = len(frequent)
+    row_sizes = np.asarray(matrix[:, frequent].sum(axis=1)).ravel().astype(np.int64)
+
+    # Level sizes: mine the (small) estimation sample at the same support.
+    # If even the sample explodes, fall back to the bound from basket sizes:
+    # a frequent k-itemset occurs in at least min_count baskets, so there
+    # are at most sum_b C(|b|, k) / min_count of them.
+    # The sample is large enough for itemsets at min_support to appear in
+    # about _ESTIMATE_MIN_COUNT of its baskets. Its level sizes are used as
+    # they are: how many itemsets reach a support fraction does not grow
+    # with the number of baskets, so there is nothing to scale.
+    m = min(n_rows, max(_ESTIMATE_ROWS, int(np.ceil(_ESTIMATE_MIN_COUNT / min_support))))
+    sample = (matrix[np.sort(order[:m])] if m < n_rows else matrix).tocsc()
+    sample.sort_indices()
+    tidsets = [
+        _rows_to_bitset(sample.indices[sample.indptr[j]:sample.indptr[j + 1]], m) for j in frequent
+    ]
+    found = _eclat(tidsets, m, min_support, max_len, limit=_ESTIMATE_LIMIT) if m else []
+    by_level: dict[int, list] = {}
+    for itemset, _ in found:
+        by_level.setdefault(len(itemset), []).append(itemset)
+
+    candidates = [float(matrix.shape[1])]
+    itemsets = [float(n_items)]
+    if len(found) > _ESTIMATE_LIMIT:
+        size_hist = np.bincount(row_sizes) if len(row_sizes) else np.zeros(1, dtype=np.int64)
+        min_count = max(np.ceil(min_support * n_rows), 1)
+        k = 2
+        while (max_len is None or k <= max_len) and k <= n_items and itemsets[-1] >= 1:
+            joins = comb(n_items, 2) if k == 2 else itemsets[-1] * (n_items - k + 1) / k
+            candidates.append(float(min(comb(n_items, k), joins)))
+            occurrences = float(np.dot(size_hist, comb(np.arange(len(size_hist)), k)))
+            itemsets.append(float(min(candidates[-1], occurrences / min_count)))
+            k += 1
+    else:
+        k = 2
+        while (max_len is None or k <= max_len) and by_level.get(k - 1):
+            candidates.append(float(comb(n_items, 2) if k == 2 else _join_count(sorted(by_level[k - 1]))))
+            itemsets.append(float(len(by_level.get(k, ()))))
+            k += 1
+
+    output = sum(itemsets) * _ITEMSET_BYTES
+    bitset = n_rows / 8 + 40
+    if engine == 'apriori':
+        # mlxtend materialises rows x candidates (x k for dense input) per level.
+        per_level = [n_rows * c * (k * itemsize + 1) for k, c in enumerate(candidates[1:], start=2)]
+        working = max(per_level, default=0)
+    elif engine == 'fpgrowth':
+        working = 2 * int(row_sizes.sum()) * _FP_NODE_BYTES
+    elif engine == 'spill':
+        working = n_items * bitset + _SPILL_BLOCK * 8 * (len(itemsets) + 1)
+    else:
+        # ECLAT / SON: root bitsets plus pending children on the DFS stack.
+        working = n_items * bitset + min(sum(itemsets), n_items * len(itemsets)) * bitset
+
+    return MiningEstimate(
+        engine=engine,
+        min_support=min_support,
+        n_rows=n_rows,
+        n_frequent_items=n_items,
+        candidates=candidates,
+        itemsets=itemsets,
+        peak_bytes=int(output + working),
+    )
+
+
+def estimate_mining_cost(
+    basket: pd.DataFrame,
+    min_support: float = 0.02,
+    max_len: int | None = None,
+    engine: str = 'apriori',
+) -> MiningEstimate:
+    '''Predict itemset counts and peak memory before mining.
+
+    The frequent items follow exactly from column counts. Level sizes come
+    from mining a seeded sample of baskets at the same support, sized so
+    itemsets at ``min_support`` occur about 30 times in it (at least 2,000
+    baskets; the whole basket when smaller), and Apriori candidate counts from joining
+    those levels. A setting that explodes even on the sample falls back to
+    a bound from basket sizes (frequent k-subsets per basket over the
+    minimum count). Memory is modelled per engine from these counts, the
+    basket's row count and its line items. ``engine`` is one of ``ENGINES``
+    or ``'spill'``.
+    '''
+    return _estimate(*_basket_profile(basket), min_support, max_len, engine)
+
+
+def _fit_support(profile, min_support, max_len, engine, memory_budget) -> tuple[float, MiningEstimate]:
+    '''Smallest support on a 1.25x grid from ``min_support`` that fits the budget.'''
+    support = min_support
+    while True:
+        estimate = _estimate(*profile, support, max_len, engine)
+        if estimate.peak_bytes <= memory_budget:
+            return support, estimate
+        if support >= 1.0:
+            raise MemoryBudgetError(
+                f'No support up to 1.0 fits a {memory_budget / 2**20:.1f} MiB budget.', estimate
+            )
+        support = min(support * 1.25, 1.0)
+
+
+def _spill_frame(
+    basket: pd.DataFrame,
+    min_support: float,
+    max_len: int | None,
+    directory: str | None = None,
+) -> pd.DataFrame:
+    '''Level-wise mining with every itemset level kept on disk.
+
+    Level ``k`` is an int32 ``(n, k)`` file of sorted item positions.
+    Level ``k + 1`` is produced by streaming it back in prefix groups and
+    joining the last items of each group, with counts from AND-ed tid bitsets.
+    Candidates are counted as soon as they are generated (no subset
+    pruning, which would need the whole level in memory), so only the item
+    bitsets and one write buffer stay resident until the final frame is
+    assembled.
+    '''
+    n_rows = len(basket)
+    columns = list(basket.columns)
+    positions = []
+    bits = []
+    for j, rows in enumerate(_column_rows(basket)):
+        if n_rows and len(rows) / n_rows >= min_support:
+            positions.append(j)
+            bits.append(_rows_to_bitset(rows, n_rows))
+
+    with tempfile.TemporaryDirectory(prefix='mba-spill-', dir=directory) as tmp:
+        levels = [(np.arange(len(bits), dtype=np.int32).reshape(-1, 1), np.array([b.bit_count() for b in bits]))]
+        k = 1
+        while len(levels[-1][0]) and (max_len is None or k < max_len):
+            path = os.path.join(tmp, f'level{k + 1}')
+            n_out = 0
+            with open(path + '.items', 'wb') as items_file, open(path + '.counts', 'wb') as counts_file:
+                item_buffer = []
+                count_buffer = []
+                for prefix, lasts in _prefix_groups(levels[-1][0]):
+                    prefix_bits = None
+                    for i in prefix:
+                        prefix_bits = bits[i] if prefix_bits is None else prefix_bits & bits[i]
+                    for a, left in enumerate(lasts):
+                        left_bits = bits[left] if prefix_bits is None else prefix_bits & bits[left]
+                        for right in lasts[a + 1:]:
+                            count = (left_bits & bits[right]).bit_count()
+                            if count / n_rows >= min_support:
+                                item_buffer.extend(prefix + (left, right))
+                                count_buffer.append(count)
+                        if len(count_buffer) >= _SPILL_BLOCK:
+                            items_file.write(np.asarray(item_buffer, dtype=np.int32).tobytes())
+                            counts_file.write(np.asarray(count_buffer, dtype=np.int64).tobytes())
+                            n_out += len(count_buffer)
+                            item_buffer, count_buffer = [], []
+                items_file.write(np.asarray(item_buffer, dtype=np.int32).tobytes())
+                counts_file.write(np.asarray(count_buffer, dtype=np.int64).tobytes())
+                n_out += len(count_buffer)
+
+            k += 1
+            if n_out == 0:
+                break
+            levels.append(
+                (
+                    np.memmap(path + '.items', dtype=np.int32, mode='r', shape=(n_out, k)),
+                    np.memmap(path + '.counts', dtype=np.int64, mode='r', shape=(n_out,)),
+                )
+            )
+
+        itemsets = [
+            frozenset(columns[positions[i]] for i in row)
+            for level, _ in levels
+            for row in level.tolist()
+        ]
+        counts = np.concatenate([np.asarray(level_counts) for _, level_counts in levels])
+
+    return pd.DataFrame(
+        {'support': counts / n_rows if n_rows else counts.astype(float), 'itemsets': itemsets}
+    )
+
+
+def _prefix_groups(level: np.ndarray):
+    '''Yield ``(prefix, [last items])`` runs of a lexicographically sorted level.'''
+    prefix = None
+    lasts = []
+    for start in range(0, len(level), _SPILL_BLOCK):
+        for row in level[start:start + _SPILL_BLOCK].tolist():
+            head = tuple(row[:-1])
+            if head != prefix:
+                if lasts:
+                    yield prefix, lasts
+                prefix, lasts = head, []
+            lasts.append(row[-1])
+    if lasts:
+        yield prefix, lasts
+
+
+@instrument()
 def mine_association_rules(
     frequent_itemsets: pd.DataFrame,
     metric: str = 'lift',
     min_threshold: float = 1.0,
 ) -> pd.DataFrame:
-    '''Derive association rules from frequent itemsets.'''
-    rules = association_rules(
-        frequent_itemsets,
-        metric=metric,
-        min_threshold=min_threshold,
-    )
+    '''Derive association rules from frequent itemsets.
+
+    Itemsets estimated from a sample (``sample_fraction`` without
+    ``verify``) also get ``lift_low`` / ``lift_high``: a 95% interval from
+    the delta method on log-lift, treating the three supports as
+    independent, which errs on the wide side.
+
+    Closed itemsets (``kind='closed'``) give the min-max basis instead of
+    every rule: ``A -> C - A`` for each closed ``C`` and each minimal
+    antecedent ``A`` (no subset of ``A`` has its support). Every rule of the
+    full set has the same support and confidence as one of these with a
+    smaller or equal antecedent and a larger or equal consequent.
+    Maximal itemsets cannot produce rules.
+    '''
+    kind = frequent_itemsets.attrs.get('kind', 'all')
+    if kind == 'maximal':
+        raise ValueError('Maximal itemsets carry no subset supports; mine closed itemsets for rules.')
+    checkpoint(message='deriving rules')
+    if kind == 'closed':
+        rules = pd.DataFrame(
+            [
+                {'antecedents': antecedent, 'consequents': consequent, **metrics}
+                for antecedent, consequent, metrics in _closed_rules(
+                    frequent_itemsets, metric, min_threshold
+                )
+            ],
+            columns=_RULE_COLUMNS,
+        )
+    elif frequent_itemsets.empty:
+        # mlxtend refuses an empty itemset frame.
+        rules = pd.DataFrame(columns=_RULE_COLUMNS)
+    else:
+        rules = association_rules(
+            frequent_itemsets[['support', 'itemsets']],
+            metric=metric,
+            min_threshold=min_threshold,
+        )
+
+    n_sample = frequent_itemsets.attrs.get('sample_size')
+    if n_sample and not frequent_itemsets.attrs.get('verified'):
+        variance = sum(
+            (1 - rules[col]) / (n_sample * rules[col])
+            for col in ['support', 'antecedent support', 'consequent support']
+        )
+        spread = np.exp(_Z * np.sqrt(variance))
+        rules['lift_low'] = rules['lift'] / spread
+        rules['lift_high'] = rules['lift'] * spread
+        rules.attrs.update(frequent_itemsets.attrs)
 
     # Sort for nicer display
     rules = rules.sort_values([metric, 'confidence', 'support'], ascending=False)
     return rules
 
 
+def iter_association_rules(
+    frequent_itemsets: pd.DataFrame,
+    metric: str = 'lift',
+    min_threshold: float = 1.0,
+):
+    '''Yield ``(antecedents, consequents, metrics)`` one rule at a time.
+
+    Produces the same rules and metric values as ``mine_association_rules``
+    (unsorted, without interval columns) while holding only the itemset
+    supports, so callers can stream rules to disk instead of building the
+    whole rules frame. ``metrics`` is keyed like the rule columns.
+    '''
+    kind = frequent_itemsets.attrs.get('kind', 'all')
+    if kind == 'maximal':
+        raise ValueError('Maximal itemsets carry no subset supports; mine closed itemsets for rules.')
+    if kind == 'closed':
+        yield from _closed_rules(frequent_itemsets, metric, min_threshold)
+        return
+
+    supports = dict(zip(frequent_itemsets['itemsets'], frequent_itemsets['support']))
+    for itemset, support in supports.items():
+        if len(itemset) < 2:
+            continue
+        items = sorted(itemset)
+        for size in range(1, len(items)):
+            for antecedent in combinations(items, size):
+                antecedent = frozenset(antecedent)
+                consequent = itemset - antecedent
+                antecedent_support = supports.get(antecedent)
+                consequent_support = supports.get(consequent)
+                if antecedent_support is None or consequent_support is None:
+                    continue
+
+                metrics = _rule_metrics(support, antecedent_support, consequent_support)
+                if metrics[metric] >= min_threshold:
+                    yield antecedent, consequent, metrics
+
+
+def _rule_metrics(support: float, antecedent_support: float, consequent_support: float) -> dict:
+    confidence = support / antecedent_support
+    return {
+        'antecedent support': antecedent_support,
+        'consequent support': consequent_support,
+        'support': support,
+        'confidence': confidence,
+        'lift': confidence / consequent_support,
+        'leverage': support - antecedent_support * consequent_support,
+        'conviction': (
+            (1.0 - consequent_support) / (1.0 - confidence) if confidence < 1.0 else np.inf
+        ),
+    }
+
+
+def _closed_rules(closed: pd.DataFrame, metric: str, min_threshold: float):
+    '''Min-max basis rules of a closed-itemset frame (see ``mine_association_rules``).
+
+    Antecedents are the minimal generators, found level-wise as in Apriori
+    (every subset of one is one), so the work follows their number rather
+    than the 2^|C| subsets of each closed itemset ``C``. The support of any
+    itemset is that of the most frequent closed itemset containing it, read
+    from per-item bitsets over the closed itemsets.
+    '''
+    closed = closed.sort_values('support', ascending=False, kind='stable')
+    closed_sets = list(closed['itemsets'])
+    closed_supports = closed['support'].tolist()
+    codes: dict = {}
+    containing: list[int] = []  # per item code: bitset of closed itemsets holding it
+    for pos, itemset in enumerate(closed_sets):
+        for item in itemset:
+            code = codes.setdefault(item, len(codes))
+            if code == len(containing):
+                containing.append(0)
+            containing[code] |= 1 << pos
+    labels = list(codes)
+
+    def holders(items: tuple[int, ...]) -> int:
+        ids = containing[items[0]]
+        for i in items[1:]:
+            ids &= containing[i]
+        return ids
+
+    supports: dict[tuple[int, ...], float] = {}
+
+    def support_of(items: tuple[int, ...]) -> float:
+        if items not in supports:
+            ids = holders(items)
+            # Sorted by support, so the lowest position is the closure.
+            supports[items] = closed_supports[(ids & -ids).bit_length() - 1]
+        return supports[items]
+
+    level = [(code,) for code in range(len(codes))]
+    generators = set(level)
+    while level:
+        for items in level:
+            checkpoint()
+            antecedent = frozenset(labels[i] for i in items)
+            antecedent_support = support_of(items)
+            ids = holders(items)
+            while ids:
+                low = ids & -ids
+                ids ^= low
+                pos = low.bit_length() - 1
+                itemset = closed_sets[pos]
+                if len(itemset) == len(items):
+                    continue
+                consequent = itemset - antecedent
+                consequent_support = support_of(tuple(sorted(codes[item] for item in consequent)))
+                metrics = _rule_metrics(closed_supports[pos], antecedent_support, consequent_support)
+                if metrics[metric] >= min_threshold:
+                    yield antecedent, consequent, metrics
+
+        # A larger antecedent is minimal only if dropping any item raises its support.
+        level = [
+            items
+            for items in _apriori_gen(level, generators)
+            if holders(items)
+            and all(support_of(items[:j] + items[j + 1:]) != support_of(items) for j in range(len(items)))
+        ]
+        generators.update(level)
+
+
+TOP_K_MEASURES = ('support', 'confidence', 'lift')
+_TOP_K_SEED_ITEMS = 200  # most frequent items whose pair rules seed the heap
+
+
+@instrument()
+def mine_top_k_rules(
+    basket: pd.DataFrame,
+    k: int = 100,
+    min_confidence: float = 0.5,
+    min_lift: float = 1.0,
+    max_len: int | None = None,
+    sort_by: str = 'lift',
+    min_support: float = 0.0,
+) -> pd.DataFrame:
+    '''Mine the K best rules by ``sort_by`` without a hand-tuned ``min_support``.
+
+    Rules passing ``min_confidence``, ``min_lift`` and ``min_support`` are
+    ranked by ``sort_by`` (ties broken by the other measures) in a size-K
+    heap. The heap is seeded with the rules of item pairs among the most
+    frequent items, so the bounds below bite from the start.
+
+    support    - TopKRules-style: itemsets are expanded best-first in
+                 decreasing support over tid bitsets; once the heap is full
+                 the support of its weakest rule is the internal support
+                 bound, everything below it is pruned with all supersets, and
+                 the search stops when the best remaining itemset falls
+                 under it. Run time is governed by K.
+    confidence - the confidence floor rises to the weakest kept rule's as
+                 the heap fills. Confidence is not anti-monotone in support
+                 (a rare superset can hold a better rule), so itemsets are
+                 searched depth-first down to ``min_support``; once K rules
+                 reach confidence 1, only better-supported rules can enter
+                 and the support bound prunes as above.
+    lift       - the lift floor rises likewise. A rule of an itemset with
+                 count c has lift at most n / c, so itemsets too frequent to
+                 beat the weakest kept rule are skipped for rule generation,
+                 but their supersets are still searched down to
+                 ``min_support``: no support bound is safe for lift.
+
+    Returns:
+        The K best rules as a ``mine_association_rules``-style frame sorted
+        by ``sort_by``. ``frame.attrs['min_support']`` holds the support
+        bound reached.
+    '''
+    if sort_by not in TOP_K_MEASURES:
+        raise ValueError(f'Unknown sort_by {sort_by!r}; expected one of {TOP_K_MEASURES}.')
+    n_rows = len(basket)
+    if n_rows == 0 or basket.shape[1] == 0 or k < 1:
+        rules = pd.DataFrame(columns=_RULE_COLUMNS)
+        rules.attrs['min_support'] = min_support
+        return rules
+
+    columns = list(basket.columns)
+    item_tids = [_rows_to_bitset(rows, n_rows) for rows in _column_rows(basket)]
+    counts = {(i,): tids.bit_count() for i, tids in enumerate(item_tids)}
+
+    def count_of(itemset: tuple) -> int:
+        if itemset not in counts:
+            joined = item_tids[itemset[0]]
+            for i in itemset[1:]:
+                joined &= item_tids[i]
+            counts[itemset] = joined.bit_count()
+        return counts[itemset]
+
+    # Smallest rule count allowed: the min_support floor, later the bound.
+    min_count = max(1, math.ceil(min_support * n_rows - 1e-9))
+    top: list[tuple] = []
+
+    def add_rules(itemset: tuple, count: int) -> None:
+        nonlocal min_count
+        if sort_by == 'lift' and len(top) == k and n_rows / count < top[0][0][0]:
+            return
+        for size in range(1, len(itemset)):
+            for antecedent in combinations(itemset, size):
+                consequent = tuple(i for i in itemset if i not in antecedent)
+                confidence = count / count_of(antecedent)
+                lift = confidence * n_rows / count_of(consequent)
+                if confidence < min_confidence or lift < min_lift:
+                    continue
+                if sort_by == 'support':
+                    key = (count, confidence, lift)
+                elif sort_by == 'confidence':
+                    key = (confidence, count, lift)
+                else:
+                    key = (lift, count, confidence)
+                entry = (key, antecedent, consequent)
+                if len(top) < k:
+                    heapq.heappush(top, entry)
+                elif entry > top[0]:
+                    heapq.heapreplace(top, entry)
+                else:
+                    continue
+                if len(top) == k:
+                    weakest = top[0][0]
+                    if sort_by == 'support':
+                        min_count = max(min_count, weakest[0])
+                    elif sort_by == 'confidence' and weakest[0] >= 1.0:
+                        min_count = max(min_count, weakest[1])
+
+    # Seed: rules of pairs among the most frequent items.
+    seed_items = sorted(
+        (i for (i,), c in counts.items() if c >= min_count), key=lambda i: -counts[(i,)]
+    )[:_TOP_K_SEED_ITEMS]
+    seeded = set(seed_items)
+    if max_len is None or max_len >= 2:
+        for a, b in combinations(sorted(seed_items), 2):
+            checkpoint()
+            count = count_of((a, b))
+            if count >= min_count:
+                add_rules((a, b), count)
+
+    best_first = sort_by == 'support'
+    frontier = [
+        (-counts[(i,)], (i,), tids) for i, tids in enumerate(item_tids) if counts[(i,)] >= min_count
+    ]
+    if best_first:
+        heapq.heapify(frontier)
+
+    while frontier:
+        checkpoint()
+        neg_count, itemset, tids = heapq.heappop(frontier) if best_first else frontier.pop()
+        count = -neg_count
+        if count < min_count:
+            if best_first:
+                break
+            continue
+
+        if len(itemset) >= 3 or (len(itemset) == 2 and not seeded.issuperset(itemset)):
+            add_rules(itemset, count)
+
+        if max_len is None or len(itemset) < max_len:
+            for j in range(itemset[-1] + 1, len(item_tids)):
+                if counts[(j,)] < min_count:
+                    continue
+                joined = tids & item_tids[j]
+                joined_count = joined.bit_count()
+                if joined_count >= min_count:
+                    child = itemset + (j,)
+                    counts[child] = joined_count
+                    if best_first:
+                        heapq.heappush(frontier, (-joined_count, child, joined))
+                    else:
+                        frontier.append((-joined_count, child, joined))
+
+    records = []
+    for _, antecedent, consequent in top:
+        count = count_of(tuple(sorted(antecedent + consequent)))
+        records.append(
+            {
+                'antecedents': frozenset(columns[i] for i in antecedent),
+                'consequents': frozenset(columns[i] for i in consequent),
+                **_rule_metrics(
+                    count / n_rows, count_of(antecedent) / n_rows, count_of(consequent) / n_rows
+                ),
+            }
+        )
+
+    rules = pd.DataFrame(records, columns=_RULE_COLUMNS)
+    if not rules.empty:
+        others = [m for m in TOP_K_MEASURES if m != sort_by]
+        rules = rules.sort_values([sort_by, *others], ascending=False)
+    rules.attrs['min_support'] = min_count / n_rows
+    return rules
+
+
+@instrument()
 def filter_rules(
     rules: pd.DataFrame,
     min_confidence: float = 0.3,
@@ -0,0 +1,351 @@
+'''Content-addressed on-disk cache for loaded transactions and basket matrices.
+
+Entries are keyed by a SHA-256 of the input bytes plus ``LOADER_VERSION`` and
+stored as plain ``.npy`` arrays, so a repeat load of the same file is a few
+memory-mapped reads instead of a CSV parse and pivot.
+
+Command line:
+    python -m src.cache list
+    python -m src.cache clear [KEY ...]
+'''
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from src.data_loader import LOADER_VERSION, CodedTransactions, DatasetProfile, load_transactions_coded
+from src.instrumentation import instrument
+
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser('~'), '.cache', 'market-basket')
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+_ARRAYS = ('invoice_codes', 'product_codes', 'basket_indptr', 'basket_indices')
+_PROFILE_ARRAYS = ('product_counts', 'invoice_sizes')
+
+
+def cache_dir() -> str:
+    return os.environ.get('MBA_CACHE_DIR', DEFAULT_CACHE_DIR)
+
+
+def max_cache_bytes() -> int:
+    return int(os.environ.get('MBA_CACHE_MAX_BYTES', DEFAULT_MAX_BYTES))
+
+
+def _read_bytes(source) -> bytes:
+    if hasattr(source, 'getvalue'):
+        return source.getvalue()
+    if hasattr(source, 'read'):
+        source.seek(0)
+        data = source.read()
+        source.seek(0)
+        return data
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+def dataset_key(source, timestamps: bool = False) -> str:
+    '''Hash of the input bytes, the loader version and the timestamps flag.'''
+    digest = hashlib.sha256(f'loader-v{LOADER_VERSION}{"+times" if timestamps else ""}:'.encode())
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    else:
+        digest.update(_read_bytes(source))
+    return digest.hexdigest()
+
+
+@instrument(rows_out=lambda result: len(result[1]))
+def load_dataset(
+    source, directory: str | None = None, timestamps: bool = False, key: str | None = None
+) -> tuple[str, CodedTransactions, pd.DataFrame]:
+    '''Load transactions and their sparse basket, going through the cache.
+
+    Args:
+        source: CSV path or file-like object (e.g. a Streamlit upload).
+        directory: Cache directory; defaults to ``$MBA_CACHE_DIR``.
+        timestamps: Also load per-invoice timestamps from a date/time
+            column; cached as a separate entry.
+        key: ``dataset_key(source, timestamps)`` if the caller already has
+            it, e.g. memoised per upload, so the bytes are not hashed again.
+
+    Returns:
+        ``(key, coded transactions, sparse boolean basket frame)``.
+    '''
+    directory = directory or cache_dir()
+    key = key or dataset_key(source, timestamps)
+    entry = os.path.join(directory, key)
+
+    if os.path.isdir(entry):
+        try:
+            result = _read_entry(entry)
+            os.utime(os.path.join(entry, 'meta.json'))
+            return (key,) + result
+        except (OSError, ValueError, KeyError):
+            shutil.rmtree(entry, ignore_errors=True)
+
+    if hasattr(source, 'seek'):
+        source.seek(0)
+    coded = load_transactions_coded(source, timestamps=timestamps)
+    matrix = sparse.csr_matrix(
+        (
+            np.ones(len(coded), dtype=bool),
+            (coded.invoice_codes, coded.product_codes),
+        ),
+        shape=(len(coded.invoice_labels), len(coded.product_labels)),
+    )
+    matrix.sum_duplicates()
+    matrix.sort_indices()
+
+    try:
+        _write_entry(directory, key, coded, matrix)
+        evict(directory)
+    except OSError:
+        # Read-only or full cache directory; the loaded data is still valid.
+        pass
+    return key, coded, _basket_frame(coded, matrix)
+
+
+def load_profile(key: str, coded: CodedTransactions, directory: str | None = None) -> DatasetProfile:
+    '''The ``DatasetProfile`` of a cached dataset, computed on first request.
+
+    The profile arrays are stored next to the dataset's entry, so later loads
+    of the same file skip even the single counting pass.
+    '''
+    entry = os.path.join(directory or cache_dir(), key)
+    paths = {name: os.path.join(entry, f'profile_{name}.npy') for name in _PROFILE_ARRAYS}
+    try:
+        arrays = {name: np.load(path) for name, path in paths.items()}
+        return DatasetProfile(product_labels=coded.product_labels, **arrays)
+    except (OSError, ValueError):
+        pass
+
+    profile = DatasetProfile.from_coded(coded)
+    try:
+        for name, path in paths.items():
+            fd, tmp = tempfile.mkstemp(prefix='.profile-', suffix='.npy', dir=entry)
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, getattr(profile, name))
+            os.replace(tmp, path)
+    except OSError:
+        # Entry evicted or not cached; the profile is still valid in memory.
+        pass
+    return profile
+
+
+def load_periods(
+    key: str,
+    coded: CodedTransactions,
+    freq: str = 'month',
+    floor: float = 0.01,
+    max_len: int | None = 3,
+    directory: str | None = None,
+):
+    '''The ``periods.PeriodCounts`` of a cached dataset, built on first request.
+
+    Partitions are stored next to the dataset's entry, one file per
+    ``(freq, floor, max_len)``, so every later date-range query merges the
+    stored per-period counts instead of mining again.
+    '''
+    from src.periods import PeriodCounts
+
+    entry = os.path.join(directory or cache_dir(), key)
+    path = os.path.join(entry, f'periods_{freq}_{floor:g}_{max_len or 0}.npz')
+    try:
+        return PeriodCounts.load(path)
+    except (OSError, ValueError, KeyError):
+        pass
+
+    partitions = PeriodCounts.build(coded, freq=freq, floor=floor, max_len=max_len)
+    try:
+        fd, tmp = tempfile.mkstemp(prefix='.periods-', suffix='.npz', dir=entry)
+        with os.fdopen(fd, 'wb') as f:
+            partitions.save(f)
+        os.replace(tmp, path)
+    except OSError:
+        # Entry evicted or not cached; the partitions are still valid in memory.
+        pass
+    return partitions
+
+
+def _basket_frame(coded: CodedTransactions, matrix) -> pd.DataFrame:
+    return pd.DataFrame.sparse.from_spmatrix(
+        matrix,
+        index=pd.Index(coded.invoice_labels, name='invoice_id'),
+        columns=pd.Index(coded.product_labels, name='product'),
+    )
+
+
+def _write_entry(directory: str, key: str, coded: CodedTransactions, matrix) -> None:
+    os.makedirs(directory, exist_ok=True)
+    tmp = tempfile.mkdtemp(prefix=f'.{key}-', dir=directory)
+    try:
+        _write_files(tmp, coded, matrix)
+    except OSError:
+        shutil.rmtree(tmp, ignore_errors=True)
+        raise
+
+    try:
+        os.replace(tmp, os.path.join(directory, key))
+    except OSError:
+        # Another process stored the same entry first.
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def _write_files(tmp: str, coded: CodedTransactions, matrix) -> None:
+    arrays = {
+        'invoice_codes': coded.invoice_codes.astype(np.int32, copy=False),
+        'product_codes': coded.product_codes.astype(np.int32, copy=False),
+        'basket_indptr': matrix.indptr.astype(np.int64, copy=False),
+        'basket_indices': matrix.indices.astype(np.int32, copy=False),
+    }
+    if coded.invoice_times is not None:
+        arrays['invoice_times'] = coded.invoice_times
+    for name, values in arrays.items():
+        np.save(os.path.join(tmp, f'{name}.npy'), values)
+
+    with open(os.path.join(tmp, 'labels.json'), 'w', encoding='utf-8') as f:
+        json.dump(
+            {'invoices': coded.invoice_labels, 'products': coded.product_labels},
+            f,
+        )
+    with open(os.path.join(tmp, 'meta.json'), 'w', encoding='utf-8') as f:
+        json.dump(
+            {
+                'loader_version': LOADER_VERSION,
+                'created': time.time(),
+                'n_rows': len(coded),
+                'n_invoices': len(coded.invoice_labels),
+                'n_products': len(coded.product_labels),
+            },
+            f,
+        )
+
+
+def _read_entry(entry: str) -> tuple[CodedTransactions, pd.DataFrame]:
+    arrays = {
+        name: np.load(os.path.join(entry, f'{name}.npy'), mmap_mode='r')
+        for name in _ARRAYS
+    }
+    with open(os.path.join(entry, 'labels.json'), encoding='utf-8') as f:
+        labels = json.load(f)
+    times_path = os.path.join(entry, 'invoice_times.npy')
+
+    coded = CodedTransactions(
+        invoice_codes=arrays['invoice_codes'],
+        product_codes=arrays['product_codes'],
+        invoice_labels=labels['invoices'],
+        product_labels=labels['products'],
+        invoice_times=np.load(times_path) if os.path.exists(times_path) else None,
+    )
+    indices = arrays['basket_indices']
+    matrix = sparse.csr_matrix(
+        (np.ones(len(indices), dtype=bool), indices, arrays['basket_indptr']),
+        shape=(len(coded.invoice_labels), len(coded.product_labels)),
+    )
+    return coded, _basket_frame(coded, matrix)
+
+
+def _entry_size(entry: str) -> int:
+    return sum(
+        os.path.getsize(os.path.join(entry, name)) for name in os.listdir(entry)
+    )
+
+
+def list_entries(directory: str | None = None) -> list[dict]:
+    '''Describe cache entries, most recently used first.'''
+    directory = directory or cache_dir()
+    if not os.path.isdir(directory):
+        return []
+
+    entries = []
+    for key in os.listdir(directory):
+        entry = os.path.join(directory, key)
+        meta_path = os.path.join(entry, 'meta.json')
+        if key.startswith('.') or not os.path.isfile(meta_path):
+            continue
+        with open(meta_path, encoding='utf-8') as f:
+            meta = json.load(f)
+        meta.update(
+            key=key,
+            size_bytes=_entry_size(entry),
+            last_used=os.path.getmtime(meta_path),
+        )
+        entries.append(meta)
+    return sorted(entries, key=lambda e: e['last_used'], reverse=True)
+
+
+def evict(directory: str | None = None, max_bytes: int | None = None) -> list[str]:
+    '''Drop least recently used entries until the cache fits in ``max_bytes``.'''
+    directory = directory or cache_dir()
+    max_bytes = max_cache_bytes() if max_bytes is None else max_bytes
+
+    entries = list_entries(directory)
+    total = sum(e['size_bytes'] for e in entries)
+    removed = []
+    while entries and total > max_bytes:
+        oldest = entries.pop()
+        shutil.rmtree(os.path.join(directory, oldest['key']), ignore_errors=True)
+        total -= oldest['size_bytes']
+        removed.append(oldest['key'])
+    return removed
+
+
+def clear(directory: str | None = None, keys: list[str] | None = None) -> list[str]:
+    '''Remove the given entries, or every entry when ``keys`` is empty.'''
+    directory = directory or cache_dir()
+    if not keys:
+        keys = [e['key'] for e in list_entries(directory)]
+    for key in keys:
+        shutil.rmtree(os.path.join(directory, key), ignore_errors=True)
+    return keys
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m src.cache',
+        description='Inspect or clear the market basket dataset cache.',
+    )
+    parser.add_argument('--dir', default=None, help='Cache directory (default: $MBA_CACHE_DIR).')
+    sub = parser.add_subparsers(dest='command', required=True)
+    sub.add_parser('list', help='Show cached datasets and total size.')
+    clear_parser = sub.add_parser('clear', help='Delete cached datasets.')
+    clear_parser.add_argument('keys', nargs='*', help='Entry keys (default: all).')
+    args = parser.parse_args(argv)
+
+    directory = args.dir or cache_dir()
+    if args.command == 'list':
+        entries = list_entries(directory)
+        for e in entries:
+            used = time.strftime('%Y-%m-%d %H:%M', time.localtime(e['last_used']))
+            print(
+                f"{e['key'][:16]}  {e['size_bytes'] / 1024 ** 2:9.1f} MB  "
+                f"rows={e['n_rows']} invoices={e['n_invoices']} "
+                f"products={e['n_products']}  last used {used}"
+            )
+        total = sum(e['size_bytes'] for e in entries)
+        print(
+            f'{len(entries)} entries, {total / 1024 ** 2:.1f} MB '
+            f'(limit {max_cache_bytes() / 1024 ** 2:.0f} MB) in {directory}'
+        )
+    else:
+        if args.keys:
+            known = [e['key'] for e in list_entries(directory)]
+            matched = [k for k in known if any(k.startswith(p) for p in args.keys)]
+            removed = clear(directory, matched) if matched else []
+        else:
+            removed = clear(directory)
+        print(f'Removed {len(removed)} entries from {directory}')
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
@@ -1,7 +1,57 @@
+import warnings
+from dataclasses import dataclass
+
+import numpy as np
 import pandas as pd
+from pandas.tseries.api import guess_datetime_format
+
+from src.instrumentation import instrument
+
+
+# Bump when loader output changes so cached datasets are rebuilt.
+LOADER_VERSION = 3
+
+
+def _is_time_column(name: str) -> bool:
+    return 'date' in name or 'time' in name
+
 
+def _detect_time_column(columns) -> str | None:
+    '''The first date/time-like column among normalised header names, if any.'''
+    return next((c for c in columns if _is_time_column(c)), None)
 
-def load_transactions(path: str) -> pd.DataFrame:
+
+def _detect_columns(columns) -> tuple[str, str]:
+    '''Pick the invoice and product columns from normalised header names.
+
+    Date/time columns are skipped, so ``invoice_date`` is not mistaken for
+    the invoice id.
+    '''
+    invoice_col = None
+    product_col = None
+
+    for c in columns:
+        if _is_time_column(c):
+            continue
+        if 'invoice' in c or 'bill' in c or 'order' in c or 'basket' in c or 'transaction' in c:
+            invoice_col = c
+        if 'product' in c or 'item' in c or 'sku' in c:
+            product_col = c
+
+    if invoice_col is None or product_col is None:
+        raise ValueError(
+            "Could not automatically detect invoice/product columns. "
+            "Make sure your file has columns like 'invoice_id' and 'product'."
+        )
+    return invoice_col, product_col
+
+
+@instrument()
+def load_transactions(
+    path: str,
+    timestamps: bool = False,
+    hierarchy: 'str | ProductHierarchy | None' = None,
+) -> pd.DataFrame:
     '''Load transactional data.
 
     Expected long format:
@@ -10,6 +60,10 @@ def load_transactions(path: str) -> pd.DataFrame:
 
     Args:
         path: Path to CSV file.
+        timestamps: Also keep a detected date/time column as ``timestamp``
+            (datetime64, NaT where unparseable).
+        hierarchy: A ``ProductHierarchy`` or the path of a hierarchy CSV;
+            adds one column per level (e.g. 'category', 'department').
 
     Returns:
         DataFrame with at least two columns: 'invoice_id' and 'product'.
@@ -18,30 +72,364 @@ def load_transactions(path: str) -> pd.DataFrame:
     
     df.columns = [c.strip().lower() for c in df.columns]
 
-    invoice_col = None
-    product_col = None
+    invoice_col, product_col = _detect_columns(df.columns)
+    time_col = _detect_time_column(df.columns) if timestamps else None
 
-    for c in df.columns:
-        if 'invoice' in c or 'bill' in c or 'order' in c or 'basket' in c or 'transaction' in c:
-            invoice_col = c
-        if 'product' in c or 'item' in c or 'sku' in c:
-            product_col = c
+    columns = {invoice_col: 'invoice_id', product_col: 'product'}
+    if time_col is not None:
+        columns[time_col] = 'timestamp'
+    df = df[list(columns)].rename(columns=columns)
+    if time_col is not None:
+        df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
 
-    if invoice_col is None or product_col is None:
+    # Drop before ``astype(str)``, which turns NaN into 'nan' on pandas < 3.
+    df = df.dropna(subset=['invoice_id', 'product'])
+    df['invoice_id'] = df['invoice_id'].astype(str)
+    df['product'] = df['product'].astype(str).str.strip()
+    if hierarchy is not None:
+        if not isinstance(hierarchy, ProductHierarchy):
+            hierarchy = load_hierarchy(hierarchy)
+        df = hierarchy.annotate(df)
+    return df
+
+
+@dataclass
+class CodedTransactions:
+    '''Compact transactions: int32 (invoice, product) codes plus label lookups.
+
+    ``invoice_labels[invoice_codes[i]]`` and ``product_labels[product_codes[i]]``
+    give back the original values of line item ``i``. When the source had a
+    date/time column, ``invoice_times[c]`` is the earliest timestamp seen on
+    invoice code ``c`` (``datetime64[s]``, NaT if none parsed).
+    '''
+
+    invoice_codes: np.ndarray
+    product_codes: np.ndarray
+    invoice_labels: list[str]
+    product_labels: list[str]
+    invoice_times: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return len(self.invoice_codes)
+
+    def to_frame(self, limit: int | None = None) -> pd.DataFrame:
+        '''Expand to the ``invoice_id, product`` frame of ``load_transactions``.
+
+        ``limit`` expands only the first rows, e.g. for a preview.
+        '''
+        rows = slice(None, limit)
+        return pd.DataFrame(
+            {
+                'invoice_id': np.asarray(self.invoice_labels, dtype=object)[self.invoice_codes[rows]],
+                'product': np.asarray(self.product_labels, dtype=object)[self.product_codes[rows]],
+            }
+        )
+
+
+@dataclass
+class ProductHierarchy:
+    '''Product -> category -> department (or any number of coarser levels).
+
+    ``table`` is indexed by product label with one column per coarser level,
+    finest first. A product missing from the table, or with a blank level,
+    falls back to its label at the next finer level, so rolling up never
+    drops line items.
+    '''
+
+    table: pd.DataFrame
+
+    @property
+    def levels(self) -> list[str]:
+        return ['product'] + list(self.table.columns)
+
+    def _check(self, level: str) -> None:
+        if level not in self.levels:
+            raise ValueError(f'Unknown level {level!r}; expected one of {self.levels}.')
+
+    def labels_at(self, products, level: str) -> np.ndarray:
+        '''Label at ``level`` of each product in ``products``.'''
+        self._check(level)
+        products = pd.Index(products)
+        labels = products.to_numpy(dtype=object)
+        for name in self.levels[1:self.levels.index(level) + 1]:
+            mapped = self.table[name].reindex(products).to_numpy(dtype=object)
+            labels = np.where(pd.isna(mapped), labels, mapped)
+        return labels
+
+    def annotate(self, df: pd.DataFrame) -> pd.DataFrame:
+        '''Add a column per coarser level to an ``invoice_id, product`` frame.'''
+        return df.assign(**{level: self.labels_at(df['product'], level) for level in self.levels[1:]})
+
+    def roll_up(self, coded: 'CodedTransactions', level: str) -> 'CodedTransactions':
+        '''``coded`` with product codes replaced by codes of ``level``.
+
+        One lookup array (product code -> level code) is gathered over the
+        line items; invoice codes, labels and times are shared, not copied.
+        Repeated (invoice, category) pairs collapse when the basket is built.
+        '''
+        if level == 'product':
+            return coded
+        lookup, labels = pd.factorize(self.labels_at(coded.product_labels, level))
+        return CodedTransactions(
+            invoice_codes=coded.invoice_codes,
+            product_codes=lookup.astype(np.int32)[coded.product_codes],
+            invoice_labels=coded.invoice_labels,
+            product_labels=list(labels),
+            invoice_times=coded.invoice_times,
+        )
+
+    def generalize(
+        self,
+        coded: 'CodedTransactions',
+        levels: list[str] | None = None,
+    ) -> tuple['CodedTransactions', list[frozenset[int]]]:
+        '''Extend every invoice with the ancestors of its products.
+
+        Ancestors are labelled ``'<level>:<label>'`` and coded after the
+        products. Also returns, per extended code, the codes on the same
+        product-to-root path (its ancestors and descendants), which a
+        generalized itemset never combines with it.
+        '''
+        levels = self.levels[1:] if levels is None else levels
+        for level in levels:
+            self._check(level)
+        products = pd.Index(coded.product_labels)
+        labels = list(coded.product_labels)
+        invoice_parts = [coded.invoice_codes]
+        product_parts = [coded.product_codes]
+        paths = [[j] for j in range(len(products))]
+
+        for level in levels:
+            if level == 'product':
+                continue
+            mapped = self.table[level].reindex(products).to_numpy(dtype=object)
+            present = ~pd.isna(mapped)
+            codes, uniques = pd.factorize(mapped[present])
+            lookup = np.full(len(products), -1, dtype=np.int32)
+            lookup[present] = codes + len(labels)
+            labels.extend(f'{level}:{label}' for label in uniques)
+
+            ancestors = lookup[coded.product_codes]
+            keep = ancestors >= 0
+            invoice_parts.append(coded.invoice_codes[keep])
+            product_parts.append(ancestors[keep])
+            for j in np.flatnonzero(present):
+                paths[j].append(int(lookup[j]))
+
+        related = [set() for _ in labels]
+        for path in paths:
+            for code in path:
+                related[code].update(path)
+        for code, codes in enumerate(related):
+            codes.discard(code)
+
+        extended = CodedTransactions(
+            invoice_codes=np.concatenate(invoice_parts),
+            product_codes=np.concatenate(product_parts),
+            invoice_labels=coded.invoice_labels,
+            product_labels=labels,
+            invoice_times=coded.invoice_times,
+        )
+        return extended, [frozenset(codes) for codes in related]
+
+
+def load_hierarchy(path) -> ProductHierarchy:
+    '''Read a product hierarchy CSV.
+
+    Expected wide format, finest level first:
+        product, category, department
+    The product column is detected like in ``load_transactions``; every
+    other column is a level, in file order.
+    '''
+    df = pd.read_csv(path, dtype=str)
+    df.columns = [c.strip().lower() for c in df.columns]
+
+    product_col = next((c for c in df.columns if 'product' in c or 'item' in c or 'sku' in c), None)
+    if product_col is None or len(df.columns) < 2:
         raise ValueError(
-            "Could not automatically detect invoice/product columns. "
-            "Make sure your file has columns like 'invoice_id' and 'product'."
+            "Could not read the product hierarchy. "
+            "Make sure your file has columns like 'product', 'category', 'department'."
         )
+    levels = [c for c in df.columns if c != product_col]
+
+    df = df.apply(lambda column: column.str.strip()).dropna(subset=[product_col])
+    table = df.drop_duplicates(product_col).set_index(product_col)[levels]
+    table.index.name = 'product'
+    return ProductHierarchy(table)
+
+
+@dataclass
+class DatasetProfile:
+    '''Summary counts of a coded dataset, computed in one pass over the codes.
+
+    ``product_counts[c]`` is the number of line items of product code ``c``
+    and ``invoice_sizes[c]`` the number of line items on invoice code ``c``;
+    everything the dashboard header and overview show derives from these.
+    '''
+
+    product_labels: list[str]
+    product_counts: np.ndarray
+    invoice_sizes: np.ndarray
+
+    @classmethod
+    def from_coded(cls, coded: CodedTransactions) -> 'DatasetProfile':
+        return cls(
+            product_labels=coded.product_labels,
+            product_counts=np.bincount(coded.product_codes, minlength=len(coded.product_labels)),
+            invoice_sizes=np.bincount(coded.invoice_codes, minlength=len(coded.invoice_labels)),
+        )
+
+    @property
+    def n_rows(self) -> int:
+        return int(self.product_counts.sum())
 
-    df = df[[invoice_col, product_col]].rename(
-        columns={invoice_col: 'invoice_id', product_col: 'product'}
+    def stats(self) -> dict:
+        '''Same keys as ``get_unique_stats``.'''
+        return {
+            'n_invoices': int(np.count_nonzero(self.invoice_sizes)),
+            'n_products': int(np.count_nonzero(self.product_counts)),
+            'n_rows': self.n_rows,
+        }
+
+    def top_products(self, n: int = 10) -> pd.Series:
+        '''Most frequent products, like ``df['product'].value_counts().head(n)``.'''
+        order = np.argsort(-self.product_counts, kind='stable')[:n]
+        order = order[self.product_counts[order] > 0]
+        return pd.Series(
+            self.product_counts[order],
+            index=pd.Index([self.product_labels[c] for c in order], name='product'),
+            name='count',
+        )
+
+    def basket_size_distribution(self) -> pd.Series:
+        '''Number of invoices per basket size (line items per invoice).'''
+        sizes = np.bincount(self.invoice_sizes)
+        present = np.flatnonzero(sizes[1:]) + 1
+        return pd.Series(sizes[present], index=pd.Index(present, name='basket_size'), name='invoices')
+
+    def invoice_stats(self) -> dict:
+        '''Mean / median / max line items per invoice.'''
+        sizes = self.invoice_sizes[self.invoice_sizes > 0]
+        if len(sizes) == 0:
+            return {'mean': 0.0, 'median': 0.0, 'max': 0}
+        return {
+            'mean': float(sizes.mean()),
+            'median': float(np.median(sizes)),
+            'max': int(sizes.max()),
+        }
+
+
+class _Interner:
+    '''Assigns stable integer codes to labels in order of first appearance.'''
+
+    def __init__(self):
+        self.index: dict[str, int] = {}
+        self.labels: list[str] = []
+
+    def encode(self, values: pd.Series) -> np.ndarray:
+        local_codes, uniques = pd.factorize(values)
+        lookup = np.empty(len(uniques), dtype=np.int32)
+        for pos, label in enumerate(uniques):
+            code = self.index.get(label)
+            if code is None:
+                code = len(self.labels)
+                self.index[label] = code
+                self.labels.append(label)
+            lookup[pos] = code
+        return lookup[local_codes]
+
+
+@instrument()
+def load_transactions_coded(
+    path,
+    chunksize: int = 1_000_000,
+    timestamps: bool = False,
+    time_format: str | None = None,
+) -> CodedTransactions:
+    '''Stream transactions in chunks into integer category codes.
+
+    Only the detected columns are read, ``chunksize`` rows at a time, and
+    each chunk is interned into int32 invoice/product codes before the next
+    one is parsed, so peak memory stays a small multiple of one chunk plus
+    the code arrays and label dictionaries. As in ``load_transactions``,
+    lines with a missing invoice id or product are dropped: ``astype(str)``
+    used to turn them into a literal ``'nan'`` item (pandas < 3), which then
+    showed up in itemsets and rules.
+
+    Args:
+        path: Path or file-like object with a CSV header row.
+        chunksize: Rows parsed per chunk.
+        timestamps: Also parse a detected date/time column into one
+            timestamp per invoice (``invoice_times``).
+        time_format: ``strftime`` format of that column. By default it is
+            guessed once from the first value and used for every chunk, so
+            all chunks parse alike; unguessable columns fall back to
+            per-value parsing.
+
+    Returns:
+        CodedTransactions holding the code arrays and code-to-label lists.
+        Pass them to ``preprocessing.codes_to_basket`` for a sparse basket.
+    '''
+    header = pd.read_csv(path, nrows=0).columns
+    if hasattr(path, 'seek'):
+        path.seek(0)
+
+    normalised = {c.strip().lower(): c for c in header}
+    invoice_col, product_col = _detect_columns(normalised)
+    time_col = _detect_time_column(normalised) if timestamps else None
+    usecols = [normalised[invoice_col], normalised[product_col]]
+    if time_col is not None:
+        usecols.append(normalised[time_col])
+
+    invoices = _Interner()
+    products = _Interner()
+    invoice_parts = []
+    product_parts = []
+    time_parts = []
+
+    reader = pd.read_csv(path, usecols=usecols, dtype=str, chunksize=chunksize)
+    for chunk in reader:
+        chunk = chunk.dropna(subset=usecols[:2])
+        invoice_parts.append(invoices.encode(chunk[normalised[invoice_col]]))
+        product_parts.append(products.encode(chunk[normalised[product_col]].str.strip()))
+        if time_col is not None:
+            values = chunk[normalised[time_col]]
+            if time_format is None and values.notna().any():
+                with warnings.catch_warnings():
+                    # Day-first guesses warn about the dayfirst default; the format is explicit below.
+                    warnings.simplefilter('ignore', UserWarning)
+                    time_format = guess_datetime_format(values.dropna().iloc[0]) or 'mixed'
+            times = pd.to_datetime(values, format=time_format, errors='coerce', utc=True, cache=True)
+            time_parts.append(times.dt.tz_localize(None).to_numpy(dtype='datetime64[s]'))
+
+    def _concat(parts):
+        return np.concatenate(parts) if parts else np.empty(0, dtype=np.int32)
+
+    invoice_codes = _concat(invoice_parts)
+    invoice_times = None
+    if time_col is not None:
+        times = np.concatenate(time_parts) if time_parts else np.empty(0, dtype='datetime64[s]')
+        invoice_times = _earliest_per_invoice(invoice_codes, times, len(invoices.labels))
+
+    return CodedTransactions(
+        invoice_codes=invoice_codes,
+        product_codes=_concat(product_parts),
+        invoice_labels=invoices.labels,
+        product_labels=products.labels,
+        invoice_times=invoice_times,
     )
 
-    df['invoice_id'] = df['invoice_id'].astype(str)
-    df['product'] = df['product'].astype(str).str.strip()
 
-    df = df.dropna(subset=['invoice_id', 'product'])
-    return df
+def _earliest_per_invoice(invoice_codes: np.ndarray, times: np.ndarray, n_invoices: int) -> np.ndarray:
+    '''Minimum line-item timestamp per invoice code, ignoring NaT.'''
+    latest = np.iinfo(np.int64).max
+    seconds = times.view(np.int64).copy()
+    seconds[np.isnat(times)] = latest
+    earliest = np.full(n_invoices, latest, dtype=np.int64)
+    np.minimum.at(earliest, invoice_codes, seconds)
+    result = earliest.view('datetime64[s]').copy()
+    result[earliest == latest] = np.datetime64('NaT')
+    return result
 
 
 def get_unique_stats(df: pd.DataFrame) -> dict:
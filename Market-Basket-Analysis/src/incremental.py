@@ -0,0 +1,185 @@
+from functools import reduce
+
+import numpy as np
+import pandas as pd
+
+from src.association_rules import (
+    _column_rows,
+    _rows_to_bitset,
+    mine_association_rules,
+)
+
+
+class IncrementalMiner:
+    '''Maintain frequent itemsets as invoice batches are appended (FUP-style).
+
+    The miner keeps exact counts for every frequent itemset and for its
+    negative border (the minimal infrequent itemsets whose subsets are all
+    frequent). Appending a batch only counts those tracked itemsets inside
+    the batch. The full history is consulted only for candidates that appear
+    because a border itemset became frequent, and then through compact
+    per-item tid-lists rather than a rescan of the raw transactions.
+
+    Item labels are stored as ``str(label)`` so that itemsets sort the same
+    way across batches; ``1`` and ``'1'`` are therefore the same item (two
+    such columns in one batch are merged), and itemsets and rules come back
+    with string labels.
+
+    Usage:
+        miner = IncrementalMiner(min_support=0.02, max_len=3)
+        miner.update(to_one_hot(first_batch, sparse_output=True))
+        miner.update(to_one_hot(next_batch, sparse_output=True))
+        itemsets = miner.frequent_itemsets()
+        rules = miner.rules(metric='lift', min_threshold=1.2)
+    '''
+
+    # Segments are merged once this many batches have been appended.
+    max_segments = 64
+
+    def __init__(self, min_support: float = 0.02, max_len: int | None = None):
+        self.min_support = min_support
+        self.max_len = max_len
+        self.n_rows = 0
+        self.item_counts: dict[str, int] = {}
+        # Counts of tracked itemsets of size >= 2 (frequent + negative border).
+        self.counts: dict[tuple, int] = {}
+        self.frequent: set[tuple] = set()
+        self._frequent_items: set[str] = set()
+        # Per batch: (row count, item -> sorted row positions in that batch).
+        self._segments: list[tuple[int, dict[str, np.ndarray]]] = []
+
+    def update(self, batch: pd.DataFrame) -> 'IncrementalMiner':
+        '''Append a basket frame of new invoices and refresh the itemsets.
+
+        ``batch`` is a one-hot basket (dense or sparse) as returned by
+        ``to_one_hot``; its columns need not match earlier batches and are
+        coerced with ``str()``.
+        '''
+        n_batch = len(batch)
+        rows: dict[str, np.ndarray] = {}
+        for item, positions in zip(batch.columns, _column_rows(batch)):
+            if not len(positions):
+                continue
+            item = str(item)
+            # Columns equal after str() are one item: an invoice holds it if either is set.
+            rows[item] = np.union1d(rows[item], positions) if item in rows else positions
+        rows = {item: positions.astype(np.int32) for item, positions in rows.items()}
+
+        for item, positions in rows.items():
+            self.item_counts[item] = self.item_counts.get(item, 0) + len(positions)
+
+        bitsets = {item: _rows_to_bitset(positions, n_batch) for item, positions in rows.items()}
+        for itemset in self.counts:
+            self.counts[itemset] += _bitset_count(bitsets, itemset)
+
+        self._segments.append((n_batch, rows))
+        self.n_rows += n_batch
+        if len(self._segments) > self.max_segments:
+            self._compact()
+
+        self._refresh()
+        return self
+
+    def frequent_itemsets(self) -> pd.DataFrame:
+        '''Current frequent itemsets as a ``support`` / ``itemsets`` frame.'''
+        records = [
+            (count / self.n_rows, frozenset((item,)))
+            for item, count in self.item_counts.items()
+            if self._is_frequent(count)
+        ]
+        records += [
+            (self.counts[itemset] / self.n_rows, frozenset(itemset))
+            for itemset in self.frequent
+        ]
+        frame = pd.DataFrame(records, columns=['support', 'itemsets'])
+        return frame.sort_values('support', ascending=False)
+
+    def rules(self, metric: str = 'lift', min_threshold: float = 1.0) -> pd.DataFrame:
+        '''Association rules over the current frequent itemsets.'''
+        return mine_association_rules(
+            self.frequent_itemsets(), metric=metric, min_threshold=min_threshold
+        )
+
+    @property
+    def negative_border(self) -> set[tuple]:
+        '''Tracked infrequent itemsets of size >= 2.'''
+        return set(self.counts) - self.frequent
+
+    def _is_frequent(self, count: int) -> bool:
+        return self.n_rows > 0 and count / self.n_rows >= self.min_support
+
+    def _refresh(self) -> None:
+        '''Update the frequent itemsets and border where an itemset crossed the threshold.
+
+        Statuses are re-read from the maintained counts. Nothing else is done
+        unless one changed: tracked itemsets that lost a frequent subset are
+        dropped, and children of newly frequent itemsets are counted in
+        history, level by level, until no new itemset turns frequent.
+        '''
+        items = {item for item, count in self.item_counts.items() if self._is_frequent(count)}
+        frequent = {itemset for itemset, count in self.counts.items() if self._is_frequent(count)}
+        gained = sorted((item,) for item in items - self._frequent_items) + sorted(frequent - self.frequent)
+        lost = bool(self._frequent_items - items or self.frequent - frequent)
+        known = frequent | {(item,) for item in items}
+
+        if lost:
+            self.counts = {
+                itemset: count
+                for itemset, count in self.counts.items()
+                if all(itemset[:j] + itemset[j + 1:] in known for j in range(len(itemset)))
+            }
+
+        ordered_items = sorted(items)
+        level = gained
+        while level:
+            next_level = []
+            for itemset in level:
+                if self.max_len is not None and len(itemset) >= self.max_len:
+                    continue
+                for item in ordered_items:
+                    if item in itemset:
+                        continue
+                    candidate = tuple(sorted(itemset + (item,)))
+                    if candidate in self.counts or not all(
+                        candidate[:j] + candidate[j + 1:] in known for j in range(len(candidate))
+                    ):
+                        continue
+                    count = self.counts[candidate] = self._count_history(candidate)
+                    if self._is_frequent(count):
+                        known.add(candidate)
+                        frequent.add(candidate)
+                        next_level.append(candidate)
+            level = next_level
+
+        self._frequent_items = items
+        self.frequent = frequent
+
+    def _count_history(self, itemset: tuple) -> int:
+        total = 0
+        for _, rows in self._segments:
+            lists = [rows.get(item) for item in itemset]
+            if any(positions is None for positions in lists):
+                continue
+            lists.sort(key=len)
+            total += len(reduce(lambda a, b: np.intersect1d(a, b, assume_unique=True), lists))
+        return total
+
+    def _compact(self) -> None:
+        '''Merge all batch segments into one with globally offset row ids.'''
+        merged: dict[str, list[np.ndarray]] = {}
+        offset = 0
+        for n_batch, rows in self._segments:
+            for item, positions in rows.items():
+                merged.setdefault(item, []).append(positions.astype(np.int64) + offset)
+            offset += n_batch
+        self._segments = [(offset, {item: np.concatenate(parts) for item, parts in merged.items()})]
+
+
+def _bitset_count(bitsets: dict[str, int], itemset: tuple) -> int:
+    joined = -1
+    for item in itemset:
+        tids = bitsets.get(item)
+        if tids is None:
+            return 0
+        joined &= tids
+    return joined.bit_count()
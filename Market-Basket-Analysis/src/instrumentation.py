@@ -0,0 +1,198 @@
+'''Lightweight per-stage timing and memory records for the pipeline.
+
+Pipeline functions are wrapped with ``@instrument()``; while a ``recording()``
+block is active (the app opens one per rerun) every call appends a
+``StageRecord`` with wall time, rows in / out, resident memory at the end
+of the stage and its peak while the stage ran. Setting ``MBA_PERF_LOG`` to
+a file path (or ``-`` for stderr) also writes each record as one JSON line,
+with or without an active recording. With neither, the wrapper is a single
+context-variable lookup.
+'''
+import contextlib
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import asdict, dataclass, field
+
+
+@dataclass
+class StageRecord:
+    name: str
+    seconds: float = 0.0
+    rows_in: int | None = None
+    rows_out: int | None = None
+    rss_bytes: int | None = None
+    peak_rss_bytes: int | None = None
+    depth: int = 0
+    started_at: float = field(default_factory=time.time)
+
+
+class Recorder:
+    '''Records collected during one ``recording()`` block, in call order.'''
+
+    def __init__(self):
+        self.records: list[StageRecord] = []
+        self._depth = 0
+
+    def to_frame(self):
+        import pandas as pd
+
+        return pd.DataFrame([asdict(r) for r in self.records])
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(r.seconds for r in self.records if r.depth == 0)
+
+
+_recorder: contextvars.ContextVar[Recorder | None] = contextvars.ContextVar('mba_recorder', default=None)
+_log_lock = threading.Lock()
+
+
+def _log_target() -> str | None:
+    return os.environ.get('MBA_PERF_LOG') or None
+
+
+def _rss_bytes() -> int | None:
+    '''Current resident set size, from /proc where available.'''
+    try:
+        with open('/proc/self/statm', encoding='ascii') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class _PeakSampler:
+    '''Polls RSS on a daemon thread while any stage is open.
+
+    Each open record's ``peak_rss_bytes`` is raised to the highest reading
+    taken between its start and end, so it is the stage's own high-water
+    mark rather than the process lifetime's. The thread exits once no stage
+    is open and is restarted by the next one.
+    '''
+
+    interval = 0.005
+
+    def __init__(self):
+        self._open: dict[int, StageRecord] = {}
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def start(self, record: StageRecord) -> None:
+        record.peak_rss_bytes = _rss_bytes()
+        if record.peak_rss_bytes is None:
+            return
+        with self._lock:
+            self._open[id(record)] = record
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='mba-rss', daemon=True)
+                self._thread.start()
+
+    def stop(self, record: StageRecord) -> None:
+        with self._lock:
+            self._open.pop(id(record), None)
+            self._raise([record], record.rss_bytes)
+
+    @staticmethod
+    def _raise(records: list[StageRecord], rss: int | None) -> None:
+        for record in records:
+            if rss is not None and record.peak_rss_bytes is not None and rss > record.peak_rss_bytes:
+                record.peak_rss_bytes = rss
+
+    def _run(self) -> None:
+        while True:
+            rss = _rss_bytes()
+            with self._lock:
+                if not self._open:
+                    self._thread = None
+                    return
+                self._raise(list(self._open.values()), rss)
+            time.sleep(self.interval)
+
+
+_sampler = _PeakSampler()
+
+
+def _count(value) -> int | None:
+    if isinstance(value, (str, bytes, tuple, dict)) or not hasattr(value, '__len__'):
+        return None
+    try:
+        return len(value)
+    except TypeError:
+        return None
+
+
+def _write_log(record: StageRecord) -> None:
+    target = _log_target()
+    line = json.dumps({'event': 'stage', **asdict(record)})
+    with _log_lock:
+        if target == '-':
+            print(line, file=sys.stderr, flush=True)
+        else:
+            with open(target, 'a', encoding='utf-8') as f:
+                f.write(line + '\n')
+
+
+@contextlib.contextmanager
+def recording():
+    '''Collect the records of every instrumented call made inside the block.'''
+    recorder = Recorder()
+    token = _recorder.set(recorder)
+    try:
+        yield recorder
+    finally:
+        _recorder.reset(token)
+
+
+@contextlib.contextmanager
+def stage(name: str, rows_in: int | None = None):
+    '''Record a block of code; set ``record.rows_out`` inside it if known.'''
+    recorder = _recorder.get()
+    if recorder is None and _log_target() is None:
+        yield StageRecord(name)
+        return
+
+    record = StageRecord(name, rows_in=rows_in)
+    if recorder is not None:
+        record.depth = recorder._depth
+        recorder.records.append(record)
+        recorder._depth += 1
+    _sampler.start(record)
+    started = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record.seconds = time.perf_counter() - started
+        record.rss_bytes = _rss_bytes()
+        _sampler.stop(record)
+        if recorder is not None:
+            recorder._depth -= 1
+        if _log_target() is not None:
+            _write_log(record)
+
+
+def instrument(name: str | None = None, rows_out=None):
+    '''Decorator recording each call of a pipeline function as a stage.
+
+    Rows in is ``len()`` of the first argument and rows out ``len()`` of the
+    result when those are sized collections; pass ``rows_out`` (a function
+    of the result) for functions returning tuples.
+    '''
+    def decorate(fn):
+        label = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if _recorder.get() is None and _log_target() is None:
+                return fn(*args, **kwargs)
+            with stage(label, rows_in=_count(args[0]) if args else None) as record:
+                result = fn(*args, **kwargs)
+                record.rows_out = rows_out(result) if rows_out else _count(result)
+            return result
+
+        return wrapper
+
+    return decorate
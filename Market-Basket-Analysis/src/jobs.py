@@ -0,0 +1,179 @@
+'''Background mining jobs with cooperative cancellation and progress.
+
+``JobRunner.submit(key, fn, ...)`` runs ``fn`` on a small thread pool and
+returns a ``Job`` at once. Threads rather than processes, because a job
+works on the caller's basket and lattice in place; mining loops release
+nothing, but the UI thread only needs short slices to stay responsive.
+
+A job cannot be interrupted from outside, so long-running loops call
+``checkpoint()``: inside a job it records progress and raises
+``JobCancelled`` once ``Job.cancel()`` was called; outside a job it is a
+single context-variable lookup. The ECLAT and LCM searches, support
+counting and the lattice call it, so a superseded job stops within one
+search step (mlxtend's Apriori / FP-Growth run to the end of the call).
+
+Each job runs inside its own ``recording()`` block, kept as ``job.recorder``.
+
+``LatestJob`` keeps one consumer's newest job, cancelling the one it
+supersedes, together with the last result that finished successfully.
+'''
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import CancelledError, Future, ThreadPoolExecutor
+
+from src.instrumentation import Recorder, recording
+
+
+DEFAULT_WORKERS = 2
+
+
+class JobCancelled(Exception):
+    '''Raised inside a job by ``checkpoint()`` after ``Job.cancel()``.'''
+
+
+class Job:
+    '''Handle on one submitted call: progress, cancellation and result.'''
+
+    def __init__(self, key, future: Future | None = None):
+        self.key = key
+        self.future = future
+        self.progress: float | None = None
+        self.message = 'queued'
+        self.submitted_at = time.time()
+        self.started_at: float | None = None
+        self.finished_at: float | None = None
+        self.recorder: Recorder | None = None
+        self._cancel = threading.Event()
+
+    def __repr__(self) -> str:
+        return f'Job({self.key!r}, {self.state})'
+
+    def cancel(self) -> None:
+        '''Ask the job to stop at its next checkpoint (or never start).'''
+        self._cancel.set()
+        self.future.cancel()
+
+    @property
+    def cancel_requested(self) -> bool:
+        return self._cancel.is_set()
+
+    @property
+    def done(self) -> bool:
+        return self.future.done()
+
+    @property
+    def state(self) -> str:
+        if not self.future.done():
+            return 'cancelling' if self._cancel.is_set() else ('running' if self.started_at else 'queued')
+        if self.future.cancelled() or isinstance(self.future.exception(), JobCancelled):
+            return 'cancelled'
+        return 'failed' if self.future.exception() is not None else 'finished'
+
+    @property
+    def elapsed(self) -> float:
+        if self.started_at is None:
+            return 0.0
+        return (self.finished_at or time.time()) - self.started_at
+
+    def wait(self, timeout: float | None = None) -> bool:
+        '''Block up to ``timeout`` seconds; True if the job is done.'''
+        try:
+            self.future.exception(timeout=timeout)
+        except CancelledError:
+            pass
+        except TimeoutError:
+            return False
+        return True
+
+    def result(self, timeout: float | None = None):
+        '''The job's return value; re-raises its exception.'''
+        return self.future.result(timeout=timeout)
+
+    def error(self) -> BaseException | None:
+        '''The exception of a finished job, ``None`` if it succeeded.'''
+        if self.future.cancelled():
+            return JobCancelled(self.key)
+        return self.future.exception()
+
+
+_current: contextvars.ContextVar[Job | None] = contextvars.ContextVar('mba_job', default=None)
+
+
+def checkpoint(progress: float | None = None, message: str | None = None) -> None:
+    '''Report progress (0..1) of the running job; raise if it was cancelled.'''
+    job = _current.get()
+    if job is None:
+        return
+    if job._cancel.is_set():
+        raise JobCancelled(job.key)
+    if progress is not None:
+        job.progress = progress
+    if message is not None:
+        job.message = message
+
+
+class JobRunner:
+    '''A thread pool running ``Job``s; workers default to ``$MBA_JOB_WORKERS``.'''
+
+    def __init__(self, max_workers: int | None = None):
+        max_workers = max_workers or int(os.environ.get('MBA_JOB_WORKERS', DEFAULT_WORKERS))
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='mba-job')
+
+    def submit(self, key, fn, *args, **kwargs) -> Job:
+        '''Run ``fn(*args, **kwargs)`` in the pool as job ``key``.'''
+        job = Job(key)
+        job.future = self._pool.submit(self._run, job, fn, args, kwargs)
+        return job
+
+    @staticmethod
+    def _run(job: Job, fn, args, kwargs):
+        token = _current.set(job)
+        job.started_at = time.time()
+        job.message = 'running'
+        try:
+            checkpoint()
+            with recording() as job.recorder:
+                result = fn(*args, **kwargs)
+            job.progress = 1.0
+            job.message = 'done'
+            return result
+        finally:
+            job.finished_at = time.time()
+            _current.reset(token)
+
+    def shutdown(self, cancel: bool = True) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=cancel)
+
+
+class LatestJob:
+    '''The newest job for one consumer and the last result that finished.
+
+    ``switch`` submits a job for a new key and cancels the running one it
+    replaces; ``poll`` publishes the current job's result once it finished
+    without error. Cancelled and failed jobs never replace ``result``, so the
+    last good one stays available while a new job runs.
+    '''
+
+    def __init__(self):
+        self.job: Job | None = None
+        # (key, return value) of ``published``.
+        self.result: tuple | None = None
+        self.published: Job | None = None
+
+    def switch(self, runner: JobRunner, key, fn, *args, **kwargs) -> Job:
+        '''The job for ``key``, submitting ``fn`` unless it is already current.'''
+        if self.job is None or self.job.key != key:
+            if self.job is not None and not self.job.done:
+                self.job.cancel()
+            self.job = runner.submit(key, fn, *args, **kwargs)
+        return self.job
+
+    def poll(self, timeout: float | None = 0) -> tuple | None:
+        '''Wait up to ``timeout`` for the current job; the published ``(key, result)``.'''
+        job = self.job
+        if job is not None and job.wait(timeout) and job.error() is None and self.published is not job:
+            self.result = (job.key, job.result())
+            self.published = job
+        return self.result
@@ -0,0 +1,127 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from src.association_rules import mine_association_rules, mine_frequent_itemsets
+from src.instrumentation import instrument
+
+
+class RuleLattice:
+    '''Mine once at a support floor and answer stricter thresholds by filtering.
+
+    The lattice keeps the itemsets mined at the lowest ``min_support`` and
+    longest ``max_len`` requested so far, plus the lift-sorted rules derived
+    at the lowest ``min_lift``. Any combination at or above those floors is
+    answered by masking the cached frames; the rules of a stricter setting
+    are exactly the cached rules whose itemset passes the new support and
+    length limits, because every subset of a frequent itemset is frequent.
+
+    Only going below the cached support floor (or past the cached length)
+    re-mines; going below the cached lift floor re-derives rules from the
+    cached itemsets without touching the basket.
+
+    With ``mine_options={'kind': 'closed'}`` the same holds for support and
+    lift, but closedness depends on the length limit, so a different
+    ``max_len`` re-mines.
+
+    Queries are serialised by a lock, so background jobs (``src.jobs``) can
+    share one lattice; a cancelled job leaves the cached frames untouched.
+    '''
+
+    def __init__(
+        self,
+        basket: pd.DataFrame,
+        engine: str = 'apriori',
+        mine_options: dict | None = None,
+    ):
+        self.basket = basket
+        self.engine = engine
+        # Extra mine_frequent_itemsets arguments, e.g. sample_fraction/verify.
+        self.mine_options = mine_options or {}
+        self.min_support: float | None = None
+        self.max_len: int | None = None
+        self.min_lift: float | None = None
+        self.itemsets: pd.DataFrame | None = None
+        self.rules: pd.DataFrame | None = None
+        self._itemset_sizes = None
+        self._rule_sizes = None
+        self._lock = threading.Lock()
+
+    def covers(self, min_support: float, max_len: int | None) -> bool:
+        '''True when the cached itemsets already contain this setting's answer.'''
+        if self.itemsets is None or min_support < self.min_support:
+            return False
+        if self.mine_options.get('kind', 'all') != 'all':
+            return max_len == self.max_len
+        if self.max_len is None:
+            return True
+        return max_len is not None and max_len <= self.max_len
+
+    @instrument('RuleLattice.query', rows_out=lambda result: len(result[1]))
+    def query(
+        self,
+        min_support: float,
+        max_len: int | None = None,
+        min_lift: float = 1.0,
+    ) -> tuple[pd.DataFrame, pd.DataFrame]:
+        '''Frequent itemsets and lift-filtered rules for the given thresholds.
+
+        Equivalent to ``mine_frequent_itemsets`` followed by
+        ``mine_association_rules(metric='lift', min_threshold=min_lift)``.
+        '''
+        with self._lock:
+            return self._query(min_support, max_len, min_lift)
+
+    def _query(self, min_support: float, max_len: int | None, min_lift: float):
+        if not self.covers(min_support, max_len):
+            self._mine(min_support, max_len)
+        if self.rules is None or min_lift < self.min_lift:
+            self._derive_rules(min_lift)
+
+        length_limit = np.inf if max_len is None else max_len
+
+        itemsets_mask = (self.itemsets['support'].to_numpy() >= min_support) & (
+            self._itemset_sizes <= length_limit
+        )
+        rules_mask = (
+            (self.rules['support'].to_numpy() >= min_support)
+            & (self.rules['lift'].to_numpy() >= min_lift)
+            & (self._rule_sizes <= length_limit)
+        )
+        return self.itemsets[itemsets_mask], self.rules[rules_mask]
+
+    def _mine(self, min_support: float, max_len: int | None) -> None:
+        if self.itemsets is not None:
+            if self.mine_options.get('kind', 'all') != 'all':
+                if max_len == self.max_len:
+                    min_support = min(min_support, self.min_support)
+            else:
+                min_support = min(min_support, self.min_support)
+                if self.max_len is None or max_len is None:
+                    max_len = None
+                else:
+                    max_len = max(max_len, self.max_len)
+
+        self.itemsets = mine_frequent_itemsets(
+            self.basket,
+            min_support=min_support,
+            max_len=max_len,
+            engine=self.engine,
+            **self.mine_options,
+        )
+        self._itemset_sizes = self.itemsets['itemsets'].map(len).to_numpy()
+        self.min_support = min_support
+        self.max_len = max_len
+        self.rules = None
+
+    def _derive_rules(self, min_lift: float) -> None:
+        if self.min_lift is not None and self.rules is None:
+            # Re-mined itemsets: keep the widest lift floor seen so far.
+            min_lift = min(min_lift, self.min_lift)
+
+        self.rules = mine_association_rules(self.itemsets, metric='lift', min_threshold=min_lift)
+        self._rule_sizes = (
+            self.rules['antecedents'].map(len) + self.rules['consequents'].map(len)
+        ).to_numpy(dtype=int)
+        self.min_lift = min_lift
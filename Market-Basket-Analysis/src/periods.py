@@ -0,0 +1,406 @@
+'''Per-period itemset counts that merge into rules for any date range.
+
+Invoices are bucketed by the day, week or month of their timestamp. Each
+period is mined once, at a low ``floor`` support, and keeps the counts of
+its locally frequent itemsets next to its (invoice x product) matrix. A
+date range is then answered from those partitions alone, SON-style: an
+itemset frequent over the range is locally frequent in at least one of its
+periods, so the union of the cached itemsets is a complete candidate set,
+and a candidate's total is the sum of its cached per-period counts, with
+the gaps filled by intersecting tid bitsets of the stored matrices. Periods
+too small for their cache to be complete at the requested support are
+pooled and mined together. Nothing re-reads the CSV or rebuilds a basket.
+
+    python -m src.periods data/transactions.csv --freq month --a 2024-01:2024-03
+    python -m src.periods data/transactions.csv --freq month --a 2024-01:2024-03 --b 2024-04:2024-06
+'''
+import argparse
+import math
+from dataclasses import dataclass, field
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from src.association_rules import _eclat, _rows_to_bitset, mine_association_rules
+from src.data_loader import CodedTransactions
+from src.instrumentation import instrument
+
+
+FREQUENCIES = {'day': 'D', 'week': 'W', 'month': 'M'}
+
+# Periods cache itemsets seen at least this often, whatever the floor, so
+# tiny periods (a quiet day) do not cache every itemset they contain.
+_MIN_CACHED_COUNT = 2
+
+
+def _min_count(support: float, n_rows: int) -> int:
+    '''Smallest count ``c`` with ``c / n_rows >= support``.'''
+    count = max(math.ceil(support * n_rows), 0)
+    while count > 0 and (count - 1) / n_rows >= support:
+        count -= 1
+    while count / n_rows < support:
+        count += 1
+    return count
+
+
+def _intersect(tidset, items: tuple[int, ...]) -> int:
+    joined = tidset(items[0])
+    for j in items[1:]:
+        joined &= tidset(j)
+    return joined.bit_count()
+
+
+@dataclass
+class Period:
+    '''One time bucket: its invoices as a CSC matrix plus cached itemset counts.
+
+    ``counts`` holds every itemset (product-code tuple, up to the build's
+    ``max_len``) occurring at least ``min_count`` times in the period.
+    '''
+
+    label: str
+    start: np.datetime64
+    matrix: sparse.csc_matrix
+    min_count: int
+    counts: dict[tuple[int, ...], int]
+    _tidsets: dict[int, int] = field(default_factory=dict, repr=False)
+
+    @classmethod
+    def mine(cls, label, start, matrix, min_count: int, max_len: int | None) -> 'Period':
+        matrix = sparse.csc_matrix(matrix)
+        matrix.sort_indices()
+        period = cls(label, start, matrix, min_count, {})
+        n_rows = period.n_rows
+        if n_rows:
+            sizes = np.diff(matrix.indptr)
+            tidsets = [period.tidset(j) if sizes[j] >= min_count else 0 for j in range(matrix.shape[1])]
+            period.counts = dict(_eclat(tidsets, n_rows, min_count / n_rows, max_len))
+        return period
+
+    @property
+    def n_rows(self) -> int:
+        return self.matrix.shape[0]
+
+    def tidset(self, j: int) -> int:
+        '''Bitset of the period's rows holding product code ``j`` (memoised).'''
+        if j not in self._tidsets:
+            rows = self.matrix.indices[self.matrix.indptr[j]:self.matrix.indptr[j + 1]]
+            self._tidsets[j] = _rows_to_bitset(rows, self.n_rows)
+        return self._tidsets[j]
+
+    def complete_at(self, min_support: float) -> bool:
+        '''True if every itemset with local support >= ``min_support`` is cached.'''
+        return self.n_rows == 0 or (self.min_count - 1) / self.n_rows < min_support
+
+    def count(self, items: tuple[int, ...]) -> int:
+        cached = self.counts.get(items)
+        if cached is not None:
+            return cached
+        if self.n_rows == 0 or any(self.matrix.indptr[j] == self.matrix.indptr[j + 1] for j in items):
+            return 0
+        return _intersect(self.tidset, items)
+
+
+class _RangeCounter:
+    '''Exact itemset counts over a set of periods.'''
+
+    def __init__(self, periods: list[Period], min_support: float, max_len: int | None):
+        self.n_rows = sum(p.n_rows for p in periods)
+        complete = [p for p in periods if p.complete_at(min_support)]
+        pooled = [p for p in periods if not p.complete_at(min_support)]
+        if pooled:
+            matrix = sparse.vstack([p.matrix for p in pooled], format='csc')
+            complete.append(
+                Period.mine('pooled', pooled[0].start, matrix, _min_count(min_support, matrix.shape[0]), max_len)
+            )
+        self.periods = [p for p in complete if p.n_rows]
+        self._cache: dict[tuple[int, ...], int] = {}
+
+        candidates = set()
+        for period in self.periods:
+            candidates.update(
+                items for items, count in period.counts.items() if count / period.n_rows >= min_support
+            )
+        self.frequent = {}
+        for items in candidates:
+            total = self.count(items)
+            if total / self.n_rows >= min_support:
+                self.frequent[items] = total
+
+    def count(self, items: tuple[int, ...]) -> int:
+        if items not in self._cache:
+            self._cache[items] = sum(p.count(items) for p in self.periods)
+        return self._cache[items]
+
+
+class PeriodCounts:
+    '''Period partitions of a dataset; see the module docstring.'''
+
+    def __init__(
+        self,
+        freq: str,
+        floor: float,
+        max_len: int | None,
+        product_labels: list[str],
+        periods: list[Period],
+        undated: int = 0,
+    ):
+        self.freq = freq
+        self.floor = floor
+        self.max_len = max_len
+        self.product_labels = product_labels
+        self.periods = periods
+        # Invoices without a parseable timestamp, left out of every period.
+        self.undated = undated
+
+    @classmethod
+    @instrument('PeriodCounts.build', rows_out=lambda result: len(result.periods))
+    def build(
+        cls,
+        coded: CodedTransactions,
+        freq: str = 'month',
+        floor: float = 0.01,
+        max_len: int | None = 3,
+    ) -> 'PeriodCounts':
+        '''Partition ``coded`` by ``freq`` and mine each period at ``floor``.'''
+        if freq not in FREQUENCIES:
+            raise ValueError(f'Unknown freq {freq!r}; expected one of {list(FREQUENCIES)}.')
+        if coded.invoice_times is None:
+            raise ValueError('The dataset has no date/time column to partition by.')
+
+        matrix = sparse.csr_matrix(
+            (np.ones(len(coded), dtype=bool), (coded.invoice_codes, coded.product_codes)),
+            shape=(len(coded.invoice_labels), len(coded.product_labels)),
+        )
+        matrix.sum_duplicates()
+
+        times = np.asarray(coded.invoice_times)
+        dated = np.flatnonzero(~np.isnat(times))
+        starts = (
+            pd.Series(times[dated]).dt.to_period(FREQUENCIES[freq]).dt.start_time.to_numpy(dtype='datetime64[D]')
+        )
+        unique_starts, group = np.unique(starts, return_inverse=True)
+        order = np.argsort(group, kind='stable')
+        bounds = np.searchsorted(group[order], np.arange(len(unique_starts) + 1))
+
+        periods = []
+        for g, start in enumerate(unique_starts):
+            rows = dated[order[bounds[g]:bounds[g + 1]]]
+            n_rows = len(rows)
+            min_count = max(_min_count(floor, n_rows), _MIN_CACHED_COUNT)
+            periods.append(Period.mine(cls._label(start, freq), start, matrix[rows], min_count, max_len))
+        return cls(freq, floor, max_len, coded.product_labels, periods, undated=len(times) - len(dated))
+
+    @staticmethod
+    def _label(start: np.datetime64, freq: str) -> str:
+        return str(start)[:7] if freq == 'month' else str(start)
+
+    @property
+    def labels(self) -> list[str]:
+        return [p.label for p in self.periods]
+
+    def summary(self) -> pd.DataFrame:
+        '''Invoices and cached itemsets per period.'''
+        return pd.DataFrame(
+            {
+                'invoices': [p.n_rows for p in self.periods],
+                'cached_itemsets': [len(p.counts) for p in self.periods],
+            },
+            index=pd.Index(self.labels, name='period'),
+        )
+
+    def select(self, start=None, end=None) -> list[Period]:
+        '''Periods starting within ``[start, end]`` (labels or anything ``pd.Timestamp`` parses).'''
+        low = np.datetime64(pd.Timestamp(start).floor('D').date()) if start is not None else None
+        high = np.datetime64(pd.Timestamp(end).date()) if end is not None else None
+        return [
+            p for p in self.periods
+            if (low is None or p.start >= low) and (high is None or p.start <= high)
+        ]
+
+    def _counter(self, start, end, min_support: float) -> _RangeCounter:
+        return _RangeCounter(self.select(start, end), min_support, self.max_len)
+
+    def _frame(self, counter: _RangeCounter) -> pd.DataFrame:
+        items = list(counter.frequent)
+        frame = pd.DataFrame(
+            {
+                'support': [counter.frequent[i] / counter.n_rows for i in items],
+                'itemsets': [frozenset(self.product_labels[j] for j in i) for i in items],
+            },
+            columns=['support', 'itemsets'],
+        )
+        frame = frame.sort_values('support', ascending=False)
+        frame.attrs.update(n_rows=counter.n_rows, periods=len(counter.periods))
+        return frame
+
+    def frequent_itemsets(self, start=None, end=None, min_support: float = 0.02) -> pd.DataFrame:
+        '''Exact ``mine_frequent_itemsets`` result for invoices dated in the range.'''
+        return self._frame(self._counter(start, end, min_support))
+
+    def association_rules(
+        self,
+        start=None,
+        end=None,
+        min_support: float = 0.02,
+        metric: str = 'lift',
+        min_threshold: float = 1.0,
+    ) -> pd.DataFrame:
+        '''Rules of the range, as ``mine_association_rules`` would give them.'''
+        itemsets = self.frequent_itemsets(start, end, min_support)
+        return mine_association_rules(itemsets, metric=metric, min_threshold=min_threshold)
+
+    def drift(
+        self,
+        a: tuple,
+        b: tuple,
+        min_support: float = 0.02,
+        min_lift: float = 1.0,
+    ) -> pd.DataFrame:
+        '''Compare rules between two ``(start, end)`` ranges.
+
+        Every rule whose itemset is frequent, and whose lift reaches
+        ``min_lift``, in at least one range is reported with its support,
+        confidence and lift in both (exact counts, also where it is not
+        frequent), plus the changes from ``a`` to ``b``, largest lift change
+        first.
+        '''
+        counters = (self._counter(*a, min_support), self._counter(*b, min_support))
+        itemsets = set(counters[0].frequent) | set(counters[1].frequent)
+
+        records = []
+        for items in itemsets:
+            if len(items) < 2:
+                continue
+            for size in range(1, len(items)):
+                for antecedent in combinations(items, size):
+                    consequent = tuple(j for j in items if j not in antecedent)
+                    record = {
+                        'antecedents': frozenset(self.product_labels[j] for j in antecedent),
+                        'consequents': frozenset(self.product_labels[j] for j in consequent),
+                    }
+                    for suffix, counter in zip(('a', 'b'), counters):
+                        n = counter.n_rows
+                        both, left, right = (counter.count(x) for x in (items, antecedent, consequent))
+                        record[f'support_{suffix}'] = both / n if n else np.nan
+                        record[f'confidence_{suffix}'] = both / left if left else np.nan
+                        record[f'lift_{suffix}'] = both * n / (left * right) if left and right else np.nan
+                    if max(record['lift_a'], record['lift_b']) >= min_lift:
+                        records.append(record)
+
+        columns = ['antecedents', 'consequents'] + [
+            f'{metric}_{suffix}' for suffix in ('a', 'b') for metric in ('support', 'confidence', 'lift')
+        ]
+        drift = pd.DataFrame(records, columns=columns)
+        drift['support_change'] = drift['support_b'] - drift['support_a']
+        drift['confidence_change'] = drift['confidence_b'] - drift['confidence_a']
+        drift['lift_change'] = drift['lift_b'] - drift['lift_a']
+        drift = drift.sort_values('lift_change', key=np.abs, ascending=False, na_position='first')
+        drift.attrs.update(n_rows_a=counters[0].n_rows, n_rows_b=counters[1].n_rows)
+        return drift.reset_index(drop=True)
+
+    def save(self, path) -> None:
+        '''Persist every period (matrices and cached counts) in one ``.npz`` file.'''
+        itemsets = [items for p in self.periods for items in p.counts]
+        np.savez_compressed(
+            path,
+            freq=np.asarray(self.freq),
+            floor=np.asarray(self.floor),
+            max_len=np.asarray(-1 if self.max_len is None else self.max_len),
+            undated=np.asarray(self.undated),
+            product_labels=np.asarray(self.product_labels, dtype=str),
+            labels=np.asarray(self.labels, dtype=str),
+            starts=np.asarray([p.start for p in self.periods], dtype='datetime64[D]'),
+            n_rows=np.asarray([p.n_rows for p in self.periods], dtype=np.int64),
+            min_counts=np.asarray([p.min_count for p in self.periods], dtype=np.int64),
+            indptr=np.stack([p.matrix.indptr.astype(np.int64) for p in self.periods])
+            if self.periods else np.empty((0, len(self.product_labels) + 1), dtype=np.int64),
+            indices=np.concatenate([p.matrix.indices.astype(np.int32) for p in self.periods] or [np.empty(0, np.int32)]),
+            period_counts=np.asarray([len(p.counts) for p in self.periods], dtype=np.int64),
+            itemset_offsets=np.concatenate([[0], np.cumsum([len(i) for i in itemsets])]).astype(np.int64),
+            itemset_items=np.asarray([j for i in itemsets for j in i], dtype=np.int32),
+            itemset_counts=np.asarray([c for p in self.periods for c in p.counts.values()], dtype=np.int64),
+        )
+
+    @classmethod
+    def load(cls, path) -> 'PeriodCounts':
+        '''Load partitions written by ``save``.'''
+        with np.load(path, allow_pickle=False) as data:
+            n_products = len(data['product_labels'])
+            offsets = data['itemset_offsets']
+            items = data['itemset_items']
+            counts = data['itemset_counts']
+            first = np.concatenate([[0], np.cumsum(data['period_counts'])])
+            index_start = 0
+            periods = []
+            for i, label in enumerate(data['labels'].tolist()):
+                indptr = data['indptr'][i]
+                n_indices = int(indptr[-1])
+                matrix = sparse.csc_matrix(
+                    (
+                        np.ones(n_indices, dtype=bool),
+                        data['indices'][index_start:index_start + n_indices],
+                        indptr,
+                    ),
+                    shape=(int(data['n_rows'][i]), n_products),
+                )
+                index_start += n_indices
+                period_counts = {
+                    tuple(items[offsets[k]:offsets[k + 1]].tolist()): int(counts[k])
+                    for k in range(first[i], first[i + 1])
+                }
+                periods.append(Period(label, data['starts'][i], matrix, int(data['min_counts'][i]), period_counts))
+            max_len = int(data['max_len'])
+            return cls(
+                str(data['freq']),
+                float(data['floor']),
+                None if max_len < 0 else max_len,
+                data['product_labels'].tolist(),
+                periods,
+                undated=int(data['undated']),
+            )
+
+
+def _range(text: str | None) -> tuple:
+    if not text:
+        return None, None
+    start, _, end = text.partition(':')
+    return start or None, end or start or None
+
+
+def main(argv: list[str] | None = None) -> int:
+    from src.cache import load_dataset, load_periods
+
+    parser = argparse.ArgumentParser(
+        prog='python -m src.periods',
+        description='Rules for a date range, or rule drift between two ranges, from period partitions.',
+    )
+    parser.add_argument('source', help='Transactions CSV with a date/time column.')
+    parser.add_argument('--freq', choices=list(FREQUENCIES), default='month')
+    parser.add_argument('--a', help='START:END of the (first) range, e.g. 2024-01:2024-03.')
+    parser.add_argument('--b', help='START:END of the range to compare against --a.')
+    parser.add_argument('--min-support', type=float, default=0.02)
+    parser.add_argument('--min-lift', type=float, default=1.2)
+    parser.add_argument('--max-len', type=int, default=3)
+    parser.add_argument('--top', type=int, default=20)
+    args = parser.parse_args(argv)
+
+    key, coded, _ = load_dataset(args.source, timestamps=True)
+    partitions = load_periods(key, coded, freq=args.freq, floor=min(0.01, args.min_support), max_len=args.max_len)
+    print(partitions.summary().to_string())
+    if args.b:
+        result = partitions.drift(_range(args.a), _range(args.b), args.min_support, args.min_lift)
+    else:
+        result = partitions.association_rules(
+            *_range(args.a), min_support=args.min_support, min_threshold=args.min_lift
+        ).sort_values('lift', ascending=False)
+    for side in ('antecedents', 'consequents'):
+        result[side] = result[side].map(lambda items: ', '.join(sorted(items)))
+    print(result.head(args.top).to_string(index=False))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
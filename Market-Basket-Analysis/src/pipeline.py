@@ -0,0 +1,336 @@
+'''Headless mining pipeline: load -> one-hot -> mine -> rules -> filter.
+
+The same presets and parameters as the Streamlit sidebar, for cron / Airflow
+style batch runs:
+
+    python -m src.pipeline data/transactions.csv -o rules.jsonl.gz --preset balanced
+    python -m src.pipeline data/transactions.csv -o rules.jsonl.gz --min-support 0.01 --engine eclat
+
+The output is JSON lines (gzip-compressed for ``.gz`` paths): a ``meta``
+line with the settings, one line per frequent itemset, one line per rule
+written as soon as it is generated, and a closing ``summary`` line whose
+presence tells readers the file is complete. Rules are streamed from the
+itemset supports rather than collected into a frame, so memory does not
+grow with the number of rules; they are therefore not sorted.
+
+With ``--db rules.sqlite`` the run is also stored in a SQLite rule store
+(``src.rule_db``) for indexed queries by item and metric.
+
+``--itemsets closed`` writes closed itemsets and their non-redundant rules
+only; ``--itemsets maximal`` writes maximal itemsets and no rules.
+
+With ``--hierarchy categories.csv`` (product, category, department, ...)
+``--level category`` mines category baskets rolled up from the same loaded
+codes, and ``--generalized`` mines multi-level rules such as
+``category:Dairy -> Bread``.
+
+Exit codes: 0 success, 1 unexpected error, 2 unreadable or malformed input
+(or an invalid combination of options), 3 no rules passed the thresholds (with ``--fail-on-empty``), 4 the run
+would exceed ``--memory-budget`` (with ``--on-budget raise``).
+'''
+import argparse
+import gzip
+import json
+import logging
+import math
+import sys
+import time
+
+from src.association_rules import (
+    ENGINES,
+    KINDS,
+    ON_BUDGET,
+    MemoryBudgetError,
+    iter_association_rules,
+    mine_frequent_itemsets,
+    mine_generalized_itemsets,
+)
+from src.cache import load_dataset
+from src.data_loader import load_hierarchy, load_transactions_coded
+from src.instrumentation import stage
+from src.preprocessing import codes_to_basket
+from src.rule_db import RuleDB
+
+
+logger = logging.getLogger('mba.pipeline')
+
+PRESETS = {
+    'exploration': {
+        'label': 'Exploration (loose)',
+        'min_support': 0.02,
+        'min_confidence': 0.25,
+        'min_lift': 1.05,
+        'max_len': 4,
+    },
+    'balanced': {
+        'label': 'Balanced (default)',
+        'min_support': 0.05,
+        'min_confidence': 0.4,
+        'min_lift': 1.2,
+        'max_len': 3,
+    },
+    'strict': {
+        'label': 'Strict (high precision)',
+        'min_support': 0.08,
+        'min_confidence': 0.6,
+        'min_lift': 1.5,
+        'max_len': 3,
+    },
+}
+DEFAULT_PRESET = 'balanced'
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_INPUT = 2
+EXIT_EMPTY = 3
+EXIT_BUDGET = 4
+
+_LOG_EVERY = 100_000
+
+
+class InputError(Exception):
+    '''The source, hierarchy or options cannot be used (exit code 2).'''
+
+
+def resolve_params(preset: str = DEFAULT_PRESET, **overrides) -> dict:
+    '''Preset thresholds with any non-None ``overrides`` applied.'''
+    params = {k: v for k, v in PRESETS[preset].items() if k != 'label'}
+    params.update({k: v for k, v in overrides.items() if v is not None})
+    return params
+
+
+def _open_output(path: str):
+    if path == '-':
+        return sys.stdout
+    if path.endswith('.gz'):
+        return gzip.open(path, 'wt', encoding='utf-8')
+    return open(path, 'w', encoding='utf-8')
+
+
+def _number(value: float):
+    # JSON has no infinity; conviction of a 100%-confidence rule is written as null.
+    return None if math.isinf(value) else round(float(value), 6)
+
+
+def _dump(record: dict) -> str:
+    return json.dumps(record, separators=(',', ':'), ensure_ascii=False) + '\n'
+
+
+def run_pipeline(
+    source,
+    output: str,
+    min_support: float,
+    min_confidence: float,
+    min_lift: float,
+    max_len: int | None = None,
+    engine: str = 'apriori',
+    n_jobs: int = 1,
+    use_cache: bool = True,
+    memory_budget: int | None = None,
+    on_budget: str = 'raise',
+    kind: str = 'all',
+    db_path: str | None = None,
+    hierarchy_path: str | None = None,
+    level: str = 'product',
+    generalized: bool = False,
+) -> dict:
+    '''Mine ``source`` and stream itemsets and rules to ``output``.
+
+    Returns a summary dict (counts and elapsed seconds), also written as the
+    file's last line.
+    '''
+    started = time.perf_counter()
+    settings = {
+        'min_support': min_support,
+        'min_confidence': min_confidence,
+        'min_lift': min_lift,
+        'max_len': max_len,
+        'engine': engine,
+        'itemsets': kind,
+    }
+    if hierarchy_path:
+        settings.update(level=level, generalized=generalized)
+    elif level != 'product' or generalized:
+        raise InputError('level and generalized mining need a product hierarchy.')
+    if generalized and kind != 'all':
+        raise InputError('Generalized mining only supports --itemsets all.')
+
+    logger.info('Loading %s', source)
+    key = None
+    # Only reading and parsing the inputs maps to InputError; the same
+    # exception types raised later are bugs or environment failures.
+    try:
+        with stage('load'):
+            if use_cache:
+                key, coded, basket = load_dataset(source)
+            else:
+                coded = load_transactions_coded(source)
+                basket = codes_to_basket(
+                    coded.invoice_codes, coded.product_codes, coded.invoice_labels, coded.product_labels
+                )
+            if hierarchy_path:
+                hierarchy = load_hierarchy(hierarchy_path)
+                if level != 'product':
+                    coded = hierarchy.roll_up(coded, level)
+                    basket = codes_to_basket(
+                        coded.invoice_codes, coded.product_codes, coded.invoice_labels, coded.product_labels
+                    )
+    except (OSError, ValueError) as exc:
+        raise InputError(f'cannot load {source}: {exc}') from exc
+    logger.info(
+        'Loaded %d line items: %d invoices x %d products', len(coded), basket.shape[0], basket.shape[1]
+    )
+
+    logger.info(
+        'Mining frequent itemsets (engine=%s, min_support=%s, max_len=%s)',
+        'generalized eclat' if generalized else engine, min_support, max_len,
+    )
+    with stage('mine', rows_in=len(basket)):
+        if generalized:
+            itemsets = mine_generalized_itemsets(coded, hierarchy, min_support=min_support, max_len=max_len)
+        else:
+            itemsets = mine_frequent_itemsets(
+                basket,
+                min_support=min_support,
+                max_len=max_len,
+                engine=engine,
+                n_jobs=n_jobs,
+                memory_budget=memory_budget,
+                on_budget=on_budget,
+                kind=kind,
+            )
+    if 'requested_min_support' in itemsets.attrs:
+        logger.warning(
+            'Raised min_support to %.4f to fit the memory budget', itemsets.attrs['min_support']
+        )
+        settings['min_support'] = itemsets.attrs['min_support']
+    logger.info('Found %d frequent itemsets', len(itemsets))
+
+    n_rules = 0
+    out = _open_output(output)
+    db = RuleDB(db_path) if db_path else None
+    try:
+        if db is not None:
+            run_id = db.begin_run(settings, dataset_key=key)
+            db.add_itemsets(run_id, itemsets)
+            writer = db.rule_writer(run_id)
+
+        out.write(_dump({'meta': {**settings, 'invoices': basket.shape[0], 'products': basket.shape[1]}}))
+        for itemset, support in zip(itemsets['itemsets'], itemsets['support']):
+            out.write(_dump({'itemset': sorted(itemset), 'support': _number(support)}))
+
+        if kind == 'maximal':
+            logger.info('Maximal itemsets carry no subset supports; no rules written')
+            rules = ()
+        else:
+            rules = iter_association_rules(itemsets, metric='lift', min_threshold=min_lift)
+        with stage('rules', rows_in=len(itemsets)) as record:
+            for antecedent, consequent, metrics in rules:
+                if metrics['confidence'] < min_confidence:
+                    continue
+                out.write(
+                    _dump(
+                        {
+                            'antecedents': sorted(antecedent),
+                            'consequents': sorted(consequent),
+                            **{name: _number(value) for name, value in metrics.items()},
+                        }
+                    )
+                )
+                if db is not None:
+                    writer.add(antecedent, consequent, metrics)
+                n_rules += 1
+                if n_rules % _LOG_EVERY == 0:
+                    logger.info('%d rules written', n_rules)
+            record.rows_out = n_rules
+
+        summary = {
+            'itemsets': len(itemsets),
+            'rules': n_rules,
+            'seconds': round(time.perf_counter() - started, 3),
+        }
+        out.write(_dump({'summary': summary}))
+        if db is not None:
+            writer.flush()
+            db.conn.commit()
+            logger.info('Stored run %d in %s', run_id, db_path)
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if db is not None:
+            db.close()
+
+    logger.info('Wrote %d itemsets and %d rules to %s in %.1fs', summary['itemsets'], n_rules, output, summary['seconds'])
+    return summary
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description='Mine association rules from a transactions CSV.')
+    parser.add_argument('source', help='Transactions CSV (invoice and product columns).')
+    parser.add_argument('-o', '--output', required=True, help='Output JSON lines; gzip if it ends in .gz, - for stdout.')
+    parser.add_argument('--preset', choices=sorted(PRESETS), default=DEFAULT_PRESET)
+    parser.add_argument('--min-support', type=float, help='Overrides the preset.')
+    parser.add_argument('--min-confidence', type=float, help='Overrides the preset.')
+    parser.add_argument('--min-lift', type=float, help='Overrides the preset.')
+    parser.add_argument('--max-len', type=int, help='Overrides the preset.')
+    parser.add_argument('--engine', choices=ENGINES, default='apriori')
+    parser.add_argument('--itemsets', choices=KINDS, default='all', help='Condense to closed or maximal itemsets.')
+    parser.add_argument('--n-jobs', type=int, default=1, help='Worker processes for partitioned mining (-1: all cores).')
+    parser.add_argument('--memory-budget', type=float, help='Memory budget for mining, in MB.')
+    parser.add_argument('--on-budget', choices=ON_BUDGET, default='raise', help='What to do when over budget.')
+    parser.add_argument('--hierarchy', help='Product hierarchy CSV (product, category, department, ...).')
+    parser.add_argument('--level', default='product', help='Hierarchy level to mine at (needs --hierarchy).')
+    parser.add_argument('--generalized', action='store_true', help='Mine rules across all hierarchy levels.')
+    parser.add_argument('--db', help='Also store itemsets and rules in this SQLite rule store.')
+    parser.add_argument('--no-cache', action='store_true', help='Parse the CSV without the on-disk dataset cache.')
+    parser.add_argument('--fail-on-empty', action='store_true', help=f'Exit {EXIT_EMPTY} when no rules are found.')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Only log warnings and errors.')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.WARNING if args.quiet else logging.INFO,
+        format='%(asctime)s %(levelname)s %(message)s',
+        stream=sys.stderr,
+    )
+    params = resolve_params(
+        args.preset,
+        min_support=args.min_support,
+        min_confidence=args.min_confidence,
+        min_lift=args.min_lift,
+        max_len=args.max_len,
+    )
+
+    try:
+        summary = run_pipeline(
+            args.source,
+            args.output,
+            engine=args.engine,
+            n_jobs=args.n_jobs,
+            use_cache=not args.no_cache,
+            memory_budget=int(args.memory_budget * 2**20) if args.memory_budget else None,
+            on_budget=args.on_budget,
+            kind=args.itemsets,
+            db_path=args.db,
+            hierarchy_path=args.hierarchy,
+            level=args.level,
+            generalized=args.generalized,
+            **params,
+        )
+    except MemoryBudgetError as exc:
+        logger.error('%s', exc)
+        return EXIT_BUDGET
+    except InputError as exc:
+        logger.error('%s', exc)
+        return EXIT_INPUT
+    except Exception:
+        logger.exception('Pipeline failed')
+        return EXIT_ERROR
+
+    if summary['rules'] == 0 and args.fail_on_empty:
+        logger.warning('No rules passed the thresholds')
+        return EXIT_EMPTY
+    return EXIT_OK
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
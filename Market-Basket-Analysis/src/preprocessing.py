@@ -1,7 +1,12 @@
+import numpy as np
 import pandas as pd
+from scipy import sparse
 
+from src.instrumentation import instrument
 
-def to_one_hot(df: pd.DataFrame) -> pd.DataFrame:
+
+@instrument()
+def to_one_hot(df: pd.DataFrame, sparse_output: bool = False) -> pd.DataFrame:
     '''Convert long format transactions to one-hot encoded basket matrix.
 
     Input:
@@ -9,7 +14,22 @@ def to_one_hot(df: pd.DataFrame) -> pd.DataFrame:
 
     Output:
         One row per invoice_id, one column per product with 0/1.
+
+    With ``sparse_output=True`` the basket is built straight from categorical
+    codes as a ``SparseDtype(bool)`` frame, so memory grows with the number of
+    line items instead of invoices x products. ``mine_frequent_itemsets``
+    accepts either form.
     '''
+    if sparse_output:
+        invoices = pd.Categorical(df['invoice_id'])
+        products = pd.Categorical(df['product'])
+        return codes_to_basket(
+            invoices.codes,
+            products.codes,
+            invoices.categories,
+            products.categories,
+        )
+
     basket = (
         df.assign(value=1)
         .pivot_table(
@@ -23,3 +43,35 @@ def to_one_hot(df: pd.DataFrame) -> pd.DataFrame:
 
     basket = basket.astype(int)
     return basket
+
+
+@instrument()
+def codes_to_basket(
+    invoice_codes: np.ndarray,
+    product_codes: np.ndarray,
+    invoice_labels,
+    product_labels,
+) -> pd.DataFrame:
+    '''Build a sparse boolean basket frame from integer (invoice, product) codes.
+
+    Rows with a negative code (missing values after categorisation) are
+    ignored and repeated (invoice, product) pairs collapse to a single True.
+    '''
+    invoice_codes = np.asarray(invoice_codes)
+    product_codes = np.asarray(product_codes)
+    keep = (invoice_codes >= 0) & (product_codes >= 0)
+
+    matrix = sparse.csr_matrix(
+        (
+            np.ones(int(keep.sum()), dtype=bool),
+            (invoice_codes[keep], product_codes[keep]),
+        ),
+        shape=(len(invoice_labels), len(product_labels)),
+    )
+    matrix.sum_duplicates()
+
+    return pd.DataFrame.sparse.from_spmatrix(
+        matrix,
+        index=pd.Index(invoice_labels, name='invoice_id'),
+        columns=pd.Index(product_labels, name='product'),
+    )
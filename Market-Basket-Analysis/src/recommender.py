@@ -1,6 +1,39 @@
+import gzip
+
+import numpy as np
 import pandas as pd
+from scipy import sparse
+
+from src.instrumentation import instrument
+
+
+_RESULT_COLUMNS = ['product', 'score', 'support', 'confidence', 'lift']
+
+
+def _rank(exploded: pd.DataFrame, top_n: int) -> pd.DataFrame:
+    '''Aggregate exploded (rule, consequent) rows into ranked suggestions.'''
+    if exploded.empty:
+        return pd.DataFrame(columns=_RESULT_COLUMNS)
+
+    exploded['score'] = exploded['confidence'] * exploded['lift']
 
+    grouped = (
+        exploded.groupby('consequents')
+        .agg(
+            score=('score', 'sum'),
+            support=('support', 'max'),
+            confidence=('confidence', 'max'),
+            lift=('lift', 'max'),
+        )
+        .reset_index()
+        .rename(columns={'consequents': 'product'})
+        .sort_values('score', ascending=False)
+    )
+
+    return grouped.head(top_n)
 
+
+@instrument()
 def recommend_products(
     rules: pd.DataFrame,
     basket_items: list[str],
@@ -10,9 +43,10 @@ def recommend_products(
     using association rules.
 
     We look for rules where antecedents are subset of basket_items.
+    For repeated lookups against the same rules use ``compile_rules``.
     '''
     if rules.empty:
-        return pd.DataFrame(columns=['product', 'score', 'support', 'confidence', 'lift'])
+        return pd.DataFrame(columns=_RESULT_COLUMNS)
 
     basket_set = set(basket_items)
 
@@ -21,7 +55,7 @@ def recommend_products(
 
     candidate_rules = rules[rules.apply(antecedent_match, axis=1)].copy()
     if candidate_rules.empty:
-        return pd.DataFrame(columns=['product', 'score', 'support', 'confidence', 'lift'])
+        return pd.DataFrame(columns=_RESULT_COLUMNS)
 
     
     exploded = candidate_rules.explode('consequents')
@@ -29,23 +63,335 @@ def recommend_products(
     
     exploded = exploded[~exploded['consequents'].isin(basket_set)]
 
-    if exploded.empty:
-        return pd.DataFrame(columns=['product', 'score', 'support', 'confidence', 'lift'])
+    return _rank(exploded, top_n)
 
-    
-    exploded['score'] = exploded['confidence'] * exploded['lift']
 
-    grouped = (
-        exploded.groupby('consequents')
-        .agg(
-            score=('score', 'sum'),
-            support=('support', 'max'),
-            confidence=('confidence', 'max'),
-            lift=('lift', 'max'),
+class RecommenderModel:
+    '''Rules compiled for fast repeated ``recommend_products`` lookups.
+
+    Items are mapped to integer ids and an inverted index lists, per item,
+    the rules whose antecedent contains it. A lookup gathers the index
+    entries of the basket items only; a rule's antecedent is a subset of the
+    basket exactly when it was hit once per antecedent item, so the subset
+    check is a vectorised count comparison instead of a set test per rule.
+    '''
+
+    def __init__(
+        self,
+        items: list[str],
+        antecedent_sizes: np.ndarray,
+        antecedent_index: dict[int, np.ndarray],
+        consequent_offsets: np.ndarray,
+        consequent_items: np.ndarray,
+        support: np.ndarray,
+        confidence: np.ndarray,
+        lift: np.ndarray,
+    ):
+        self.items = items
+        self.item_ids = {item: i for i, item in enumerate(items)}
+        self.antecedent_sizes = antecedent_sizes
+        self.antecedent_index = antecedent_index
+        self.consequent_offsets = consequent_offsets
+        self.consequent_items = consequent_items
+        self.support = support
+        self.confidence = confidence
+        self.lift = lift
+        self._rule_matrices = None
+
+    def __len__(self) -> int:
+        return len(self.antecedent_sizes)
+
+    def basket_ids(self, basket_items: list[str]) -> np.ndarray:
+        '''Sorted ids of the basket items known to the model.'''
+        return np.unique(
+            np.asarray(
+                [self.item_ids[item] for item in basket_items if item in self.item_ids],
+                dtype=np.int64,
+            )
         )
-        .reset_index()
-        .rename(columns={'consequents': 'product'})
-        .sort_values('score', ascending=False)
+
+    def matching_rules(self, basket_ids: np.ndarray) -> np.ndarray:
+        '''Ids (ascending) of rules whose antecedent is a subset of the basket.'''
+        touched = [self.antecedent_index[i] for i in basket_ids.tolist() if i in self.antecedent_index]
+        if not touched:
+            return np.empty(0, dtype=np.int64)
+
+        rule_ids, hits = np.unique(np.concatenate(touched), return_counts=True)
+        return rule_ids[hits == self.antecedent_sizes[rule_ids]]
+
+    def _explode(self, basket_items: list[str]) -> tuple[np.ndarray, np.ndarray]:
+        '''(rule id, consequent item id) pairs of matching rules, basket items removed.'''
+        basket_ids = self.basket_ids(basket_items)
+        matched = self.matching_rules(basket_ids)
+
+        starts = self.consequent_offsets[matched]
+        lengths = self.consequent_offsets[matched + 1] - starts
+        rule_ids = np.repeat(matched, lengths)
+        group_starts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        positions = np.repeat(starts, lengths) + np.arange(lengths.sum()) - group_starts
+        products = self.consequent_items[positions]
+
+        outside = ~np.isin(products, basket_ids)
+        return rule_ids[outside], products[outside]
+
+    @instrument('RecommenderModel.recommend')
+    def recommend(self, basket_items: list[str], top_n: int = 5) -> pd.DataFrame:
+        '''Same ranked frame as ``recommend_products(rules, basket_items, top_n)``.'''
+        rule_ids, products = self._explode(basket_items)
+        if len(rule_ids) == 0:
+            return pd.DataFrame(columns=_RESULT_COLUMNS)
+
+        exploded = pd.DataFrame(
+            {
+                'consequents': np.asarray(self.items, dtype=object)[products],
+                'support': self.support[rule_ids],
+                'confidence': self.confidence[rule_ids],
+                'lift': self.lift[rule_ids],
+            }
+        )
+        return _rank(exploded, top_n)
+
+    def recommend_records(self, basket_items: list[str], top_n: int = 5) -> list[dict]:
+        '''``recommend`` without pandas, for latency-sensitive callers.
+
+        Aggregates with numpy and returns plain dicts; equal scores are
+        ordered by product name.
+        '''
+        rule_ids, products = self._explode(basket_items)
+        if len(rule_ids) == 0:
+            return []
+
+        unique, inverse = np.unique(products, return_inverse=True)
+        score = np.bincount(inverse, weights=self.confidence[rule_ids] * self.lift[rule_ids])
+        metrics = {}
+        for name, values in (('support', self.support), ('confidence', self.confidence), ('lift', self.lift)):
+            best = np.full(len(unique), -np.inf)
+            np.maximum.at(best, inverse, values[rule_ids])
+            metrics[name] = best
+
+        names = np.asarray(self.items, dtype=object)[unique]
+        order = sorted(range(len(unique)), key=lambda i: (-score[i], names[i]))[:top_n]
+        return [
+            {
+                'product': names[i],
+                'score': float(score[i]),
+                'support': float(metrics['support'][i]),
+                'confidence': float(metrics['confidence'][i]),
+                'lift': float(metrics['lift'][i]),
+            }
+            for i in order
+        ]
+
+    def save(self, path: str) -> None:
+        '''Persist the compiled model as a single ``.npz`` file.'''
+        keys = np.asarray(sorted(self.antecedent_index), dtype=np.int64)
+        lists = [self.antecedent_index[k] for k in keys.tolist()]
+        np.savez_compressed(
+            path,
+            items=np.asarray(self.items, dtype=str),
+            antecedent_sizes=self.antecedent_sizes,
+            index_keys=keys,
+            index_offsets=np.concatenate([[0], np.cumsum([len(x) for x in lists])]).astype(np.int64),
+            index_rules=np.concatenate(lists or [np.empty(0, dtype=np.int64)]),
+            consequent_offsets=self.consequent_offsets,
+            consequent_items=self.consequent_items,
+            support=self.support,
+            confidence=self.confidence,
+            lift=self.lift,
+        )
+
+    @classmethod
+    def load(cls, path: str) -> 'RecommenderModel':
+        '''Load a model written by ``save``.'''
+        with np.load(path, allow_pickle=False) as data:
+            offsets = data['index_offsets']
+            rules = data['index_rules']
+            index = {
+                int(key): rules[offsets[i]:offsets[i + 1]]
+                for i, key in enumerate(data['index_keys'])
+            }
+            return cls(
+                items=data['items'].tolist(),
+                antecedent_sizes=data['antecedent_sizes'],
+                antecedent_index=index,
+                consequent_offsets=data['consequent_offsets'],
+                consequent_items=data['consequent_items'],
+                support=data['support'],
+                confidence=data['confidence'],
+                lift=data['lift'],
+            )
+
+    def rule_matrices(self):
+        '''Sparse (rules x items) antecedent indicator and weighted consequent matrices.
+
+        Consequent entries hold ``confidence * lift`` so that summing a
+        basket's fired rules reproduces the ``recommend_products`` score.
+        '''
+        if self._rule_matrices is None:
+            n_rules, n_items = len(self), len(self.items)
+            antecedent_rows = np.concatenate(
+                [np.full(len(rules), item, dtype=np.int64) for item, rules in self.antecedent_index.items()]
+                or [np.empty(0, dtype=np.int64)]
+            )
+            antecedent_cols = np.concatenate(
+                list(self.antecedent_index.values()) or [np.empty(0, dtype=np.int64)]
+            )
+            antecedents = sparse.csr_matrix(
+                (np.ones(len(antecedent_rows), dtype=np.int32), (antecedent_rows, antecedent_cols)),
+                shape=(n_items, n_rules),
+            )
+            weights = self.confidence * self.lift
+            consequents = sparse.csr_matrix(
+                (
+                    np.repeat(weights, np.diff(self.consequent_offsets)),
+                    self.consequent_items,
+                    self.consequent_offsets,
+                ),
+                shape=(n_rules, n_items),
+            )
+            self._rule_matrices = antecedents, consequents
+        return self._rule_matrices
+
+
+def _baskets_csr(model: RecommenderModel, baskets: pd.DataFrame):
+    '''Baskets as a (baskets x model items) boolean CSR; unknown columns dropped.'''
+    matrix = baskets.sparse.to_coo().tocsc() if hasattr(baskets, 'sparse') else sparse.csc_matrix(
+        baskets.to_numpy(dtype=bool)
     )
+    known = [(j, model.item_ids[col]) for j, col in enumerate(baskets.columns) if col in model.item_ids]
+    if not known:
+        return sparse.csr_matrix((len(baskets), len(model.items)), dtype=np.int32)
 
-    return grouped.head(top_n)
+    positions, item_ids = map(np.asarray, zip(*known))
+    remap = sparse.csr_matrix(
+        (np.ones(len(known), dtype=np.int32), (positions, item_ids)),
+        shape=(matrix.shape[1], len(model.items)),
+    )
+    result = (matrix.astype(np.int32) @ remap).tocsr()
+    result.data[:] = 1
+    return result
+
+
+def iter_batch_recommendations(
+    model: RecommenderModel,
+    baskets: pd.DataFrame,
+    top_n: int = 5,
+    chunk_size: int = 10_000,
+):
+    '''Score many baskets at once, yielding top-N frames chunk by chunk.
+
+    ``baskets`` is a one-hot frame (dense or sparse, e.g. from
+    ``to_one_hot(..., sparse_output=True)``) with one row per basket. For
+    each chunk of rows the antecedent hit counts are one sparse product
+    against the rule matrix; rules fire where the hit count equals the
+    antecedent size, and a second product sums ``confidence * lift`` per
+    consequent, as ``recommend_products`` does. Items already in the basket
+    are excluded.
+
+    Yields:
+        Frames with columns ``basket``, ``product``, ``score``, best first
+        within each basket.
+    '''
+    antecedents, consequents = model.rule_matrices()
+    matrix = _baskets_csr(model, baskets)
+    labels = np.asarray(baskets.index, dtype=object)
+    items = np.asarray(model.items, dtype=object)
+
+    for start in range(0, matrix.shape[0], chunk_size):
+        chunk = matrix[start:start + chunk_size]
+
+        hits = (chunk @ antecedents).tocsr()
+        hits.data = (hits.data == model.antecedent_sizes[hits.indices]).astype(np.float64)
+        hits.eliminate_zeros()
+
+        scores = (hits @ consequents).tocsr()
+        scores = (scores - scores.multiply(chunk)).tocsr()
+        scores.eliminate_zeros()
+        if scores.nnz == 0:
+            continue
+
+        rows = np.repeat(np.arange(scores.shape[0]), np.diff(scores.indptr))
+        order = np.lexsort((scores.indices, -scores.data, rows))
+        rank = np.arange(len(order)) - scores.indptr[rows[order]]
+        keep = order[rank < top_n]
+
+        yield pd.DataFrame(
+            {
+                'basket': labels[start + rows[keep]],
+                'product': items[scores.indices[keep]],
+                'score': scores.data[keep],
+            }
+        )
+
+
+def write_batch_recommendations(
+    model: RecommenderModel,
+    baskets: pd.DataFrame,
+    path: str,
+    top_n: int = 5,
+    chunk_size: int = 10_000,
+) -> int:
+    '''Write ``iter_batch_recommendations`` output to a CSV (``.gz`` compresses).
+
+    Returns:
+        Number of (basket, product, score) rows written.
+    '''
+    opener = gzip.open if str(path).endswith('.gz') else open
+    written = 0
+    with opener(path, 'wt', newline='') as f:
+        f.write('basket,product,score\n')
+        for frame in iter_batch_recommendations(model, baskets, top_n, chunk_size):
+            frame.to_csv(f, header=False, index=False)
+            written += len(frame)
+    return written
+
+
+@instrument()
+def compile_rules(rules: pd.DataFrame) -> RecommenderModel:
+    '''Compile a rules frame (frozenset antecedents/consequents) into a model.'''
+    item_ids: dict[str, int] = {}
+    items: list[str] = []
+
+    def encode(itemset) -> list[int]:
+        codes = []
+        for item in itemset:
+            code = item_ids.get(item)
+            if code is None:
+                code = item_ids[item] = len(items)
+                items.append(item)
+            codes.append(code)
+        return codes
+
+    antecedent_sizes = []
+    index_items = []
+    index_rules = []
+    consequent_items = []
+    consequent_offsets = [0]
+
+    for rule_id, (antecedent, consequent) in enumerate(
+        zip(rules['antecedents'], rules['consequents'])
+    ):
+        codes = encode(antecedent)
+        index_items.extend(codes)
+        index_rules.extend([rule_id] * len(codes))
+        antecedent_sizes.append(len(codes))
+
+        consequent_items.extend(encode(consequent))
+        consequent_offsets.append(len(consequent_items))
+
+    index_items = np.asarray(index_items, dtype=np.int64)
+    index_rules = np.asarray(index_rules, dtype=np.int64)
+    order = np.argsort(index_items, kind='stable')
+    keys, starts = np.unique(index_items[order], return_index=True)
+    antecedent_index = dict(zip(keys.tolist(), np.split(index_rules[order], starts[1:])))
+
+    return RecommenderModel(
+        items=items,
+        antecedent_sizes=np.asarray(antecedent_sizes, dtype=np.int64),
+        antecedent_index=antecedent_index,
+        consequent_offsets=np.asarray(consequent_offsets, dtype=np.int64),
+        consequent_items=np.asarray(consequent_items, dtype=np.int64),
+        support=rules['support'].to_numpy(dtype=float),
+        confidence=rules['confidence'].to_numpy(dtype=float),
+        lift=rules['lift'].to_numpy(dtype=float),
+    )
@@ -0,0 +1,437 @@
+'''SQLite store for mined itemsets and rules, queryable without loading them.
+
+Each mining run is a row in ``runs`` with its settings; its itemsets and
+rules reference it. Rule items are also kept in ``rule_items`` keyed by
+``(run, item, side, rule)``, so "rules of this run with Milk in the
+antecedent" is an index range scan however many runs are stored, and the metric columns are indexed per run, so thresholds and
+top-N by lift are answered by SQLite rather than by a full frame in memory.
+
+Command line:
+    python -m src.rule_db runs rules.sqlite
+    python -m src.rule_db query rules.sqlite --antecedent Milk --min-lift 2 --limit 20
+    python -m src.rule_db recommend rules.sqlite Bread Milk
+'''
+import argparse
+import json
+import math
+import sqlite3
+import time
+from itertools import islice
+
+import numpy as np
+import pandas as pd
+
+from src.association_rules import _RULE_COLUMNS
+from src.recommender import _RESULT_COLUMNS, _rank
+
+
+SCHEMA_VERSION = 2
+
+_METRICS = _RULE_COLUMNS[2:]
+_SQL_METRICS = {name: name.replace(' ', '_') for name in _METRICS}
+_ANTECEDENT, _CONSEQUENT = 0, 1
+_CHUNK = 50_000
+
+_SCHEMA = f'''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    created_at REAL NOT NULL,
+    dataset_key TEXT,
+    settings TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    label TEXT NOT NULL UNIQUE
+);
+CREATE TABLE IF NOT EXISTS itemsets (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    items TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    support REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS itemset_items (
+    item_id INTEGER NOT NULL,
+    itemset_id INTEGER NOT NULL REFERENCES itemsets(id) ON DELETE CASCADE,
+    PRIMARY KEY (item_id, itemset_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS rules (
+    id INTEGER PRIMARY KEY,
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    antecedents TEXT NOT NULL,
+    consequents TEXT NOT NULL,
+    antecedent_size INTEGER NOT NULL,
+    consequent_size INTEGER NOT NULL,
+    {', '.join(f'{column} REAL' for column in _SQL_METRICS.values())}
+);
+CREATE TABLE IF NOT EXISTS rule_items (
+    run_id INTEGER NOT NULL,
+    item_id INTEGER NOT NULL,
+    side INTEGER NOT NULL,
+    rule_id INTEGER NOT NULL REFERENCES rules(id) ON DELETE CASCADE,
+    PRIMARY KEY (run_id, item_id, side, rule_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS itemsets_run_support ON itemsets(run_id, support);
+CREATE INDEX IF NOT EXISTS itemset_items_itemset ON itemset_items(itemset_id);
+CREATE INDEX IF NOT EXISTS rule_items_rule ON rule_items(rule_id);
+''' + ''.join(
+    f'CREATE INDEX IF NOT EXISTS rules_run_{column} ON rules(run_id, {column});\n'
+    for column in ('support', 'confidence', 'lift', 'leverage')
+)
+
+
+def _number(value) -> float | None:
+    # Conviction of a 100%-confidence rule is infinite; stored as NULL.
+    value = float(value)
+    return None if math.isinf(value) else value
+
+
+class RuleWriter:
+    '''Buffered inserts of one run's rules; use via ``RuleDB.rule_writer``.'''
+
+    def __init__(self, db: 'RuleDB', run_id: int):
+        self.db = db
+        self.run_id = run_id
+        self.count = 0
+        self._next_id = db._next_id('rules')
+        self._rules: list[tuple] = []
+        self._items: list[tuple] = []
+
+    def add(self, antecedent, consequent, metrics: dict) -> None:
+        rule_id = self._next_id + self.count
+        antecedent, consequent = sorted(antecedent), sorted(consequent)
+        ids = self.db._item_ids(antecedent + consequent)
+        self._rules.append(
+            (
+                rule_id,
+                self.run_id,
+                json.dumps(antecedent, ensure_ascii=False),
+                json.dumps(consequent, ensure_ascii=False),
+                len(antecedent),
+                len(consequent),
+                *(_number(metrics[name]) for name in _METRICS),
+            )
+        )
+        self._items.extend((self.run_id, ids[item], _ANTECEDENT, rule_id) for item in antecedent)
+        self._items.extend((self.run_id, ids[item], _CONSEQUENT, rule_id) for item in consequent)
+        self.count += 1
+        if len(self._rules) >= _CHUNK:
+            self.flush()
+
+    def flush(self) -> None:
+        placeholders = ', '.join('?' * (6 + len(_METRICS)))
+        self.db.conn.executemany(f'INSERT INTO rules VALUES ({placeholders})', self._rules)
+        self.db.conn.executemany('INSERT INTO rule_items VALUES (?, ?, ?, ?)', self._items)
+        self._rules.clear()
+        self._items.clear()
+
+
+class RuleDB:
+    '''A SQLite database of mining runs (see the module docstring).'''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.execute('PRAGMA journal_mode = WAL')
+        self.conn.execute('PRAGMA synchronous = NORMAL')
+        self.conn.execute('PRAGMA foreign_keys = ON')
+        version = self.conn.execute('PRAGMA user_version').fetchone()[0]
+        if version not in (0, SCHEMA_VERSION):
+            raise ValueError(f'{path} has rule store schema {version}; expected {SCHEMA_VERSION}.')
+        with self.conn:
+            self.conn.executescript(_SCHEMA)
+            self.conn.execute(f'PRAGMA user_version = {SCHEMA_VERSION}')
+        self._ids: dict[str, int] = {}
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self) -> 'RuleDB':
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def _next_id(self, table: str) -> int:
+        return self.conn.execute(f'SELECT COALESCE(MAX(id), 0) + 1 FROM {table}').fetchone()[0]
+
+    def _item_ids(self, labels) -> dict[str, int]:
+        '''Ids for ``labels``, inserting unseen ones; memoised per connection.
+
+        The memo is only valid for committed rows: ``write_run`` clears it
+        when its transaction rolls back.
+        '''
+        missing = [label for label in labels if label not in self._ids]
+        if missing:
+            self.conn.executemany('INSERT OR IGNORE INTO items (label) VALUES (?)', [(m,) for m in missing])
+            self._ids.update(self._stored_ids(missing))
+        return self._ids
+
+    def _stored_ids(self, labels) -> dict[str, int]:
+        '''Ids of the ``labels`` already in ``items``, without inserting.'''
+        labels = list(dict.fromkeys(labels))
+        found = {}
+        for start in range(0, len(labels), 500):
+            chunk = labels[start:start + 500]
+            found.update(
+                self.conn.execute(f'SELECT label, id FROM items WHERE label IN ({", ".join("?" * len(chunk))})', chunk)
+            )
+        return found
+
+    def latest_run(self) -> int | None:
+        return self.conn.execute('SELECT MAX(id) FROM runs').fetchone()[0]
+
+    def _run(self, run_id: int | None) -> int:
+        run_id = self.latest_run() if run_id is None else run_id
+        if run_id is None:
+            raise ValueError(f'{self.path} holds no mining runs.')
+        return run_id
+
+    def begin_run(self, settings: dict | None = None, dataset_key: str | None = None) -> int:
+        '''Create a run row and return its id.'''
+        cursor = self.conn.execute(
+            'INSERT INTO runs (created_at, dataset_key, settings) VALUES (?, ?, ?)',
+            (time.time(), dataset_key, json.dumps(settings or {})),
+        )
+        return cursor.lastrowid
+
+    def add_itemsets(self, run_id: int, itemsets: pd.DataFrame) -> None:
+        '''Store a ``mine_frequent_itemsets`` frame under ``run_id``.'''
+        next_id = self._next_id('itemsets')
+        pairs = zip(itemsets['itemsets'], itemsets['support'])
+        while True:
+            chunk = list(islice(pairs, _CHUNK))
+            if not chunk:
+                break
+            rows, members = [], []
+            for offset, (itemset, support) in enumerate(chunk):
+                items = sorted(itemset)
+                ids = self._item_ids(items)
+                rows.append((next_id + offset, run_id, json.dumps(items, ensure_ascii=False), len(items), float(support)))
+                members.extend((ids[item], next_id + offset) for item in items)
+            self.conn.executemany('INSERT INTO itemsets VALUES (?, ?, ?, ?, ?)', rows)
+            self.conn.executemany('INSERT INTO itemset_items VALUES (?, ?)', members)
+            next_id += len(chunk)
+
+    def rule_writer(self, run_id: int) -> RuleWriter:
+        '''Writer whose ``add(antecedent, consequent, metrics)`` buffers one rule.
+
+        Call ``flush()`` and commit (or use ``write_run``) when done.
+        '''
+        return RuleWriter(self, run_id)
+
+    def write_run(
+        self,
+        itemsets: pd.DataFrame | None,
+        rules,
+        settings: dict | None = None,
+        dataset_key: str | None = None,
+    ) -> int:
+        '''Store a run in one transaction and return its id.
+
+        ``rules`` is a ``mine_association_rules`` frame or an iterable of
+        ``(antecedents, consequents, metrics)`` as from
+        ``iter_association_rules``.
+        '''
+        if isinstance(rules, pd.DataFrame):
+            rules = (
+                (antecedent, consequent, dict(zip(_METRICS, values)))
+                for antecedent, consequent, *values in zip(
+                    rules['antecedents'], rules['consequents'], *(rules[name] for name in _METRICS)
+                )
+            )
+        try:
+            with self.conn:
+                run_id = self.begin_run(settings, dataset_key)
+                if itemsets is not None:
+                    self.add_itemsets(run_id, itemsets)
+                writer = self.rule_writer(run_id)
+                for antecedent, consequent, metrics in rules:
+                    writer.add(antecedent, consequent, metrics)
+                writer.flush()
+        except BaseException:
+            # Items inserted by the rolled-back transaction are gone again.
+            self._ids.clear()
+            raise
+        return run_id
+
+    def delete_run(self, run_id: int) -> None:
+        '''Remove a run; its itemsets and rules cascade.'''
+        with self.conn:
+            self.conn.execute('DELETE FROM runs WHERE id = ?', (run_id,))
+
+    def runs(self) -> pd.DataFrame:
+        '''One row per stored run with its settings and row counts.'''
+        frame = pd.read_sql_query(
+            '''
+            SELECT r.id, r.created_at, r.dataset_key, r.settings,
+                   (SELECT COUNT(*) FROM itemsets WHERE run_id = r.id) AS itemsets,
+                   (SELECT COUNT(*) FROM rules WHERE run_id = r.id) AS rules
+            FROM runs r ORDER BY r.id
+            ''',
+            self.conn,
+        )
+        frame['created_at'] = pd.to_datetime(frame['created_at'], unit='s')
+        frame['settings'] = frame['settings'].map(json.loads)
+        return frame.set_index('id')
+
+    def query_rules(
+        self,
+        run_id: int | None = None,
+        antecedent: list[str] = (),
+        consequent: list[str] = (),
+        min_support: float = 0.0,
+        min_confidence: float = 0.0,
+        min_lift: float = 0.0,
+        sort_by: str = 'lift',
+        limit: int | None = None,
+    ) -> pd.DataFrame:
+        '''Rules of a run (latest by default) matching every condition.
+
+        ``antecedent`` / ``consequent`` items must all appear on that side.
+        Returns a ``mine_association_rules``-style frame indexed by rule id,
+        sorted descending by ``sort_by``.
+        '''
+        run_id = self._run(run_id)
+        if sort_by not in _SQL_METRICS:
+            raise ValueError(f'Unknown sort_by {sort_by!r}; expected one of {list(_SQL_METRICS)}.')
+        stored = self._stored_ids([*antecedent, *consequent])
+        conditions = [(item, _ANTECEDENT) for item in antecedent] + [(item, _CONSEQUENT) for item in consequent]
+        if any(item not in stored for item, _ in conditions):
+            return self._rule_frame([])
+
+        where = ['run_id = ?', 'support >= ?', 'confidence >= ?', 'lift >= ?']
+        params = [run_id, min_support, min_confidence, min_lift]
+        for item, side in conditions:
+            where.append('id IN (SELECT rule_id FROM rule_items WHERE run_id = ? AND item_id = ? AND side = ?)')
+            params += [run_id, stored[item], side]
+        sql = (
+            f'SELECT id, antecedents, consequents, {", ".join(_SQL_METRICS.values())} FROM rules '
+            f'WHERE {" AND ".join(where)} ORDER BY {_SQL_METRICS[sort_by]} DESC'
+        )
+        if limit is not None:
+            sql += ' LIMIT ?'
+            params.append(int(limit))
+        return self._rule_frame(self.conn.execute(sql, params).fetchall())
+
+    def _rule_frame(self, rows: list[tuple]) -> pd.DataFrame:
+        frame = pd.DataFrame(rows, columns=['rule_id', *_RULE_COLUMNS]).set_index('rule_id')
+        for side in ('antecedents', 'consequents'):
+            frame[side] = frame[side].map(lambda text: frozenset(json.loads(text)))
+        frame[_METRICS] = frame[_METRICS].astype(float)
+        frame['conviction'] = frame['conviction'].fillna(np.inf)
+        return frame
+
+    def itemset_support(self, items: list[str], run_id: int | None = None) -> float | None:
+        '''Stored support of exactly ``items``, or None if the run lacks it.'''
+        run_id = self._run(run_id)
+        stored = self._stored_ids(items)
+        ids = list(stored.values())
+        if not ids or len(stored) < len(set(items)):
+            return None
+        row = self.conn.execute(
+            f'''
+            SELECT s.support FROM itemsets s
+            WHERE s.run_id = ? AND s.size = ?
+              AND s.id IN (
+                  SELECT itemset_id FROM itemset_items WHERE item_id IN ({", ".join("?" * len(ids))})
+                  GROUP BY itemset_id HAVING COUNT(*) = ?
+              )
+            ''',
+            [run_id, len(ids), *ids, len(ids)],
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def recommend(
+        self,
+        basket_items: list[str],
+        top_n: int = 5,
+        run_id: int | None = None,
+        min_confidence: float = 0.0,
+        min_lift: float = 0.0,
+    ) -> pd.DataFrame:
+        '''``recommend_products`` answered from the store.
+
+        Rules whose antecedent lies inside the basket are those hit once per
+        antecedent item in ``rule_items``; only their consequents are read.
+        '''
+        run_id = self._run(run_id)
+        ids = list(self._stored_ids(basket_items).values())
+        if not ids:
+            return pd.DataFrame(columns=_RESULT_COLUMNS)
+
+        rows = self.conn.execute(
+            f'''
+            SELECT r.consequents, r.support, r.confidence, r.lift
+            FROM (
+                SELECT rule_id, COUNT(*) AS hits FROM rule_items
+                WHERE run_id = ? AND side = {_ANTECEDENT} AND item_id IN ({", ".join("?" * len(ids))})
+                GROUP BY rule_id
+            ) h JOIN rules r ON r.id = h.rule_id
+            WHERE h.hits = r.antecedent_size
+              AND r.confidence >= ? AND r.lift >= ?
+            ''',
+            [run_id, *ids, min_confidence, min_lift],
+        ).fetchall()
+        basket = set(basket_items)
+        exploded = pd.DataFrame(
+            [
+                (product, support, confidence, lift)
+                for consequents, support, confidence, lift in rows
+                for product in json.loads(consequents)
+                if product not in basket
+            ],
+            columns=['consequents', 'support', 'confidence', 'lift'],
+        )
+        return _rank(exploded, top_n)
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog='python -m src.rule_db',
+        description='Inspect and query a SQLite rule store.',
+    )
+    sub = parser.add_subparsers(dest='command', required=True)
+    runs_parser = sub.add_parser('runs', help='List stored mining runs.')
+    runs_parser.add_argument('db')
+    query_parser = sub.add_parser('query', help='Indexed rule query.')
+    query_parser.add_argument('db')
+    query_parser.add_argument('--run', type=int, help='Run id (default: latest).')
+    query_parser.add_argument('--antecedent', action='append', default=[], help='Item required in the antecedent.')
+    query_parser.add_argument('--consequent', action='append', default=[], help='Item required in the consequent.')
+    query_parser.add_argument('--min-support', type=float, default=0.0)
+    query_parser.add_argument('--min-confidence', type=float, default=0.0)
+    query_parser.add_argument('--min-lift', type=float, default=0.0)
+    query_parser.add_argument('--sort-by', choices=list(_SQL_METRICS), default='lift')
+    query_parser.add_argument('--limit', type=int, default=20)
+    recommend_parser = sub.add_parser('recommend', help='Recommend products for a basket.')
+    recommend_parser.add_argument('db')
+    recommend_parser.add_argument('items', nargs='+')
+    recommend_parser.add_argument('--run', type=int, help='Run id (default: latest).')
+    recommend_parser.add_argument('--top-n', type=int, default=5)
+    args = parser.parse_args(argv)
+
+    with RuleDB(args.db) as db:
+        if args.command == 'runs':
+            print(db.runs().to_string())
+        elif args.command == 'query':
+            rules = db.query_rules(
+                args.run,
+                antecedent=args.antecedent,
+                consequent=args.consequent,
+                min_support=args.min_support,
+                min_confidence=args.min_confidence,
+                min_lift=args.min_lift,
+                sort_by=args.sort_by,
+                limit=args.limit,
+            )
+            for side in ('antecedents', 'consequents'):
+                rules[side] = rules[side].map(lambda items: ', '.join(sorted(items)))
+            print(rules.to_string())
+        else:
+            print(db.recommend(args.items, top_n=args.top_n, run_id=args.run).to_string(index=False))
+    return 0
+
+
+if __name__ == '__main__':
+    raise SystemExit(main())
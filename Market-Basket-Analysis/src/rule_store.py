@@ -0,0 +1,242 @@
+import sys
+
+import numpy as np
+import pandas as pd
+
+
+METRIC_COLUMNS = [
+    'antecedent support',
+    'consequent support',
+    'support',
+    'confidence',
+    'lift',
+    'leverage',
+    'conviction',
+]
+
+# Present only for rules estimated from a sample.
+INTERVAL_COLUMNS = ['lift_low', 'lift_high']
+
+_DISPLAY_ORDER = METRIC_COLUMNS[2:] + INTERVAL_COLUMNS + METRIC_COLUMNS[:2]
+
+
+def _encode_sides(series: pd.Series, item_ids: dict, items: list) -> tuple[np.ndarray, np.ndarray]:
+    '''CSR encode a column of itemsets: (offsets, int32 item ids).'''
+    codes = []
+    offsets = np.zeros(len(series) + 1, dtype=np.int64)
+    for row, itemset in enumerate(series):
+        for item in sorted(itemset):
+            code = item_ids.get(item)
+            if code is None:
+                code = item_ids[item] = len(items)
+                items.append(item)
+            codes.append(code)
+        offsets[row + 1] = len(codes)
+    return offsets, np.asarray(codes, dtype=np.int32)
+
+
+def _gather(offsets: np.ndarray, values: np.ndarray, rows: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    '''Select CSR rows, returning new (offsets, values).'''
+    starts = offsets[rows]
+    lengths = offsets[rows + 1] - starts
+    new_offsets = np.zeros(len(rows) + 1, dtype=np.int64)
+    np.cumsum(lengths, out=new_offsets[1:])
+    positions = np.repeat(starts - new_offsets[:-1], lengths) + np.arange(new_offsets[-1])
+    return new_offsets, values[positions]
+
+
+class RuleTable:
+    '''Association rules in compact columnar form.
+
+    Antecedents and consequents are CSR int32 item arrays with offsets into
+    a shared ``items`` list, and metrics are numpy columns, instead of
+    frozensets in object columns. Metrics stay float64: float32 would move
+    rules sitting on a threshold across it (``float32(0.7) < 0.7``) and round
+    the values in downloads. Filtering and sorting are vectorised and return
+    row ids; display strings are only joined for rows that are actually
+    rendered, and memoised so later reruns reuse them.
+    '''
+
+    def __init__(
+        self,
+        items: list[str],
+        antecedent_offsets: np.ndarray,
+        antecedent_items: np.ndarray,
+        consequent_offsets: np.ndarray,
+        consequent_items: np.ndarray,
+        metrics: dict[str, np.ndarray],
+    ):
+        self.items = items
+        self.antecedent_offsets = antecedent_offsets
+        self.antecedent_items = antecedent_items
+        self.consequent_offsets = consequent_offsets
+        self.consequent_items = consequent_items
+        self.metrics = metrics
+        # Joined display strings per side, allocated on the first labels() call.
+        self._labels: dict[str, np.ndarray] = {}
+        self._item_index = None
+
+    @classmethod
+    def from_frame(cls, rules: pd.DataFrame) -> 'RuleTable':
+        '''Encode a ``mine_association_rules`` frame.'''
+        item_ids: dict[str, int] = {}
+        items: list[str] = []
+        antecedent_offsets, antecedent_items = _encode_sides(rules['antecedents'], item_ids, items)
+        consequent_offsets, consequent_items = _encode_sides(rules['consequents'], item_ids, items)
+        metrics = {
+            name: rules[name].to_numpy(dtype=np.float64)
+            for name in METRIC_COLUMNS + INTERVAL_COLUMNS
+            if name in rules.columns
+        }
+        return cls(
+            items,
+            antecedent_offsets,
+            antecedent_items,
+            consequent_offsets,
+            consequent_items,
+            metrics,
+        )
+
+    def __len__(self) -> int:
+        return len(self.antecedent_offsets) - 1
+
+    @property
+    def nbytes(self) -> int:
+        '''Bytes held by the arrays and the display strings built so far.
+
+        The shared ``items`` labels are not counted.
+        '''
+        arrays = [
+            self.antecedent_offsets,
+            self.antecedent_items,
+            self.consequent_offsets,
+            self.consequent_items,
+            *self.metrics.values(),
+            *self._labels.values(),
+        ]
+        strings = sum(
+            sys.getsizeof(label) for cache in self._labels.values() for label in cache if label is not None
+        )
+        return sum(a.nbytes for a in arrays) + strings
+
+    def filter(
+        self,
+        min_confidence: float = 0.3,
+        min_lift: float = 1.0,
+        sort_by: str = 'lift',
+    ) -> np.ndarray:
+        '''Row ids passing the thresholds, sorted descending by ``sort_by``.
+
+        Mirrors ``filter_rules`` without materialising any frame.
+        '''
+        mask = (self.metrics['confidence'] >= min_confidence) & (self.metrics['lift'] >= min_lift)
+        return self.sort(np.flatnonzero(mask), sort_by)
+
+    def sort(self, rows: np.ndarray, sort_by: str = 'lift') -> np.ndarray:
+        '''``rows`` ordered descending by the metric ``sort_by`` (stable).'''
+        rows = np.asarray(rows, dtype=np.int64)
+        if sort_by in self.metrics:
+            rows = rows[np.argsort(-self.metrics[sort_by][rows], kind='stable')]
+        return rows
+
+    def take(self, rows: np.ndarray) -> 'RuleTable':
+        '''A new table holding only ``rows``, in that order.'''
+        rows = np.asarray(rows, dtype=np.int64)
+        antecedent_offsets, antecedent_items = _gather(self.antecedent_offsets, self.antecedent_items, rows)
+        consequent_offsets, consequent_items = _gather(self.consequent_offsets, self.consequent_items, rows)
+        return RuleTable(
+            self.items,
+            antecedent_offsets,
+            antecedent_items,
+            consequent_offsets,
+            consequent_items,
+            {name: values[rows] for name, values in self.metrics.items()},
+        )
+
+    def _product_index(self) -> tuple[dict, np.ndarray, np.ndarray]:
+        '''(item id lookup, offsets, rule ids): CSR postings of rules per item.'''
+        if self._item_index is None:
+            rule_ids = np.concatenate(
+                [
+                    np.repeat(np.arange(len(self)), np.diff(self.antecedent_offsets)),
+                    np.repeat(np.arange(len(self)), np.diff(self.consequent_offsets)),
+                ]
+            )
+            item_codes = np.concatenate([self.antecedent_items, self.consequent_items])
+            order = np.lexsort((rule_ids, item_codes))
+            offsets = np.zeros(len(self.items) + 1, dtype=np.int64)
+            np.cumsum(np.bincount(item_codes, minlength=len(self.items)), out=offsets[1:])
+            self._item_index = (
+                {item: code for code, item in enumerate(self.items)},
+                offsets,
+                rule_ids[order],
+            )
+        return self._item_index
+
+    def rules_with_item(self, item: str, rows: np.ndarray | None = None) -> np.ndarray:
+        '''Ids of rules with ``item`` on either side, optionally limited to ``rows``.
+
+        Exact item match, read from a per-item index built on first use, so the
+        cost is proportional to the rules containing the item (plus sorting
+        ``rows`` when given), never to the whole table.
+        '''
+        item_ids, offsets, postings = self._product_index()
+        code = item_ids.get(item)
+        if code is None:
+            return np.empty(0, dtype=np.int64)
+        matches = postings[offsets[code]:offsets[code + 1]]
+        if rows is not None:
+            # Sorted intersection; no mask over the whole table.
+            matches = np.intersect1d(matches, np.asarray(rows, dtype=np.int64), assume_unique=True)
+        return matches
+
+    def items_in(self, rows: np.ndarray | None = None) -> list[str]:
+        '''Sorted labels of items appearing in ``rows`` (all rules by default).'''
+        if rows is None:
+            codes = np.concatenate([self.antecedent_items, self.consequent_items])
+        else:
+            rows = np.asarray(rows, dtype=np.int64)
+            codes = np.concatenate(
+                [
+                    _gather(self.antecedent_offsets, self.antecedent_items, rows)[1],
+                    _gather(self.consequent_offsets, self.consequent_items, rows)[1],
+                ]
+            )
+        return sorted(self.items[code] for code in np.unique(codes))
+
+    def consequent_counts(self, rows: np.ndarray) -> pd.Series:
+        '''Number of ``rows`` suggesting each consequent item, most frequent first.'''
+        _, codes = _gather(self.consequent_offsets, self.consequent_items, np.asarray(rows, dtype=np.int64))
+        counts = np.bincount(codes, minlength=len(self.items))
+        present = np.flatnonzero(counts)
+        present = present[np.argsort(-counts[present], kind='stable')]
+        return pd.Series(counts[present], index=[self.items[code] for code in present], name='rule_count')
+
+    def labels(self, column: str, rows: np.ndarray) -> np.ndarray:
+        '''Joined item strings for ``rows``, building only the missing ones.'''
+        cache = self._labels.get(column)
+        if cache is None:
+            cache = self._labels[column] = np.full(len(self), None, dtype=object)
+        if column == 'antecedents_str':
+            offsets, values = self.antecedent_offsets, self.antecedent_items
+        else:
+            offsets, values = self.consequent_offsets, self.consequent_items
+
+        for row in rows[pd.isna(cache[rows])].tolist():
+            cache[row] = ', '.join(self.items[i] for i in values[offsets[row]:offsets[row + 1]])
+        return cache[rows]
+
+    def to_frame(self, rows: np.ndarray | None = None) -> pd.DataFrame:
+        '''Display frame in ``filter_rules`` column order for the given rows.'''
+        rows = np.arange(len(self)) if rows is None else np.asarray(rows, dtype=np.int64)
+        frame = pd.DataFrame(
+            {
+                'antecedents_str': self.labels('antecedents_str', rows),
+                'consequents_str': self.labels('consequents_str', rows),
+            },
+            index=rows,
+        )
+        for name in _DISPLAY_ORDER:
+            if name in self.metrics:
+                frame[name] = self.metrics[name][rows]
+        return frame
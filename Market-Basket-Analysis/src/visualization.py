@@ -1,84 +1,275 @@
+import hashlib
+from collections import OrderedDict
+
+import numpy as np
 import pandas as pd
 import networkx as nx
 import plotly.graph_objects as go
 
+from src.instrumentation import instrument
+
+
+# Graphs above this many nodes take the cheaper layout path.
+LARGE_GRAPH_NODES = 400
+# Graphs above this many nodes are drawn without permanent labels.
+LABELLED_NODES_MAX = 150
+
+
+class LayoutCache:
+    '''Recent layouts by graph signature and the last positions drawn.
+
+    Keep one per viewer (the app holds it in ``st.session_state``) so
+    sessions neither warm-start from nor evict each other's layouts.
+    '''
+
+    def __init__(self, max_size: int = 32):
+        self.max_size = max_size
+        self.layouts: OrderedDict[str, dict] = OrderedDict()
+        self.last_positions: dict = {}
+
+    def get(self, signature: str) -> dict | None:
+        pos = self.layouts.get(signature)
+        if pos is not None:
+            self.layouts.move_to_end(signature)
+            self.last_positions = pos
+        return pos
+
+    def put(self, signature: str, pos: dict) -> None:
+        self.layouts[signature] = pos
+        if len(self.layouts) > self.max_size:
+            self.layouts.popitem(last=False)
+        self.last_positions = pos
+
 
-def top_n_products(df: pd.DataFrame, n: int = 10) -> pd.Series:
-    '''Count most frequently purchased products.'''
+def top_n_products(df, n: int = 10) -> pd.Series:
+    '''Count most frequently purchased products.
+
+    ``df`` is a transactions frame or a ``DatasetProfile``, whose precomputed
+    counts avoid a scan of the rows.
+    '''
+    if hasattr(df, 'top_products'):
+        return df.top_products(n)
     return df['product'].value_counts().head(n)
 
 
+@instrument()
 def build_rules_network(rules: pd.DataFrame, top_k: int = 30) -> nx.DiGraph:
-    '''Build a directed graph from top association rules.'''
+    '''Build a directed graph from top association rules.
+
+    Each antecedent -> consequent item pair becomes an edge carrying the
+    rule's ``lift`` (also as the layout ``weight``) and ``confidence``; when
+    several rules share an edge the later rule wins.
+    '''
     G = nx.DiGraph()
 
     if rules.empty:
         return G
 
     subset = rules.head(top_k)
+    edges = pd.DataFrame(
+        {
+            'source': subset['antecedents'].map(list).to_numpy(),
+            'target': subset['consequents'].map(list).to_numpy(),
+            'lift': subset['lift'].to_numpy() if 'lift' in subset else 1.0,
+            'confidence': subset['confidence'].to_numpy() if 'confidence' in subset else 0.0,
+        }
+    )
+    edges = (
+        edges.explode('source')
+        .explode('target')
+        .drop_duplicates(['source', 'target'], keep='last')
+    )
 
-    for _, row in subset.iterrows():
-        antecedents = list(row['antecedents'])
-        consequents = list(row['consequents'])
-        lift = row.get('lift', 1.0)
-        confidence = row.get('confidence', 0.0)
-
-        for a in antecedents:
-            for c in consequents:
-                G.add_edge(
-                    a,
-                    c,
-                    lift=lift,
-                    confidence=confidence,
-                )
+    G.add_edges_from(
+        (a, c, {'lift': lift, 'confidence': confidence, 'weight': lift})
+        for a, c, lift, confidence in zip(
+            edges['source'], edges['target'], edges['lift'], edges['confidence']
+        )
+    )
     return G
 
 
-def graph_to_plotly_figure(G: nx.DiGraph) -> go.Figure:
-    '''Convert a NetworkX DiGraph into an interactive Plotly network figure.'''
+def graph_signature(G: nx.DiGraph) -> str:
+    '''Stable hash of a graph's nodes and weighted edges.'''
+    digest = hashlib.sha1()
+    for node in sorted(map(str, G.nodes)):
+        digest.update(node.encode())
+        digest.update(b'\0')
+    edges = sorted(
+        (str(a), str(c), round(float(w), 6)) for a, c, w in G.edges(data='weight', default=1.0)
+    )
+    for a, c, weight in edges:
+        digest.update(f'{a}\x01{c}\x01{weight}\0'.encode())
+    return digest.hexdigest()
+
+
+@instrument()
+def compute_layout(G: nx.DiGraph, seed: int = 42, cache: LayoutCache | None = None) -> dict:
+    '''Node positions, cached by graph signature and warm-started from the last layout.
+
+    With a ``cache``, unchanged graphs reuse their layout, so the picture no
+    longer jumps between reruns. When edges change, nodes seen before start
+    from their previous positions and only a few refinement iterations run.
+    Large graphs start from a spectral layout and get a short vectorised
+    force-directed refinement instead of a full 50-iteration simulation.
+    '''
+    signature = graph_signature(G) if cache is not None else None
+    if cache is not None:
+        pos = cache.get(signature)
+        if pos is not None:
+            return pos
+
+    n_nodes = G.number_of_nodes()
+    previous = cache.last_positions if cache is not None else {}
+    known = {node: previous[node] for node in G.nodes if node in previous}
+    large = n_nodes > LARGE_GRAPH_NODES
+
+    if len(known) >= n_nodes / 2:
+        # Incremental: keep existing nodes where they were, place new ones
+        # next to an already positioned neighbour.
+        rng = np.random.default_rng(seed)
+        initial = dict(known)
+        for node in G.nodes:
+            if node in initial:
+                continue
+            anchors = [initial[n] for n in nx.all_neighbors(G, node) if n in initial]
+            centre = np.mean(anchors, axis=0) if anchors else np.zeros(2)
+            initial[node] = centre + rng.normal(scale=0.05, size=2)
+        iterations = 10 if large else 20
+    elif large:
+        initial = nx.spectral_layout(G.to_undirected(), weight='weight')
+        iterations = 10
+    else:
+        initial = None
+        iterations = 50
+
+    if large:
+        pos = _refine_layout(G, initial, iterations)
+    else:
+        pos = nx.spring_layout(
+            G, pos=initial, k=0.6, iterations=iterations, weight='weight', seed=seed
+        )
+
+    if cache is not None:
+        cache.put(signature, pos)
+    return pos
+
+
+def _refine_layout(G: nx.DiGraph, initial: dict, iterations: int, chunk: int = 512) -> dict:
+    '''A few Fruchterman-Reingold steps over all nodes at once.
+
+    ``nx.spring_layout`` loops over nodes in Python for big graphs; here the
+    repulsion is computed in row blocks of ``chunk`` nodes with numpy and
+    attraction from the sparse weighted adjacency, so memory stays at
+    ``chunk * n`` and each step is a handful of array operations.
+    '''
+    nodes = list(G.nodes)
+    n = len(nodes)
+    pos = np.array([initial[node] for node in nodes], dtype=np.float32)
+    pos -= pos.mean(axis=0)
+    pos /= max(np.abs(pos).max(), 1e-9)
+
+    adjacency = nx.to_scipy_sparse_array(G.to_undirected(), nodelist=nodes, weight='weight', format='coo')
+    rows, cols, weights = adjacency.row, adjacency.col, adjacency.data
+    k = np.sqrt(1.0 / n)
+    temperature = 0.1
+
+    for _ in range(iterations):
+        displacement = np.zeros_like(pos)
+        x, y = pos[:, 0], pos[:, 1]
+        for start in range(0, n, chunk):
+            dx = x[start:start + chunk, None] - x[None, :]
+            dy = y[start:start + chunk, None] - y[None, :]
+            force = k * k / np.maximum(dx * dx + dy * dy, 1e-4)
+            displacement[start:start + chunk, 0] = (dx * force).sum(axis=1)
+            displacement[start:start + chunk, 1] = (dy * force).sum(axis=1)
+
+        delta = pos[rows] - pos[cols]
+        distance = np.maximum(np.linalg.norm(delta, axis=-1), 0.01)
+        pull = delta * (weights * distance / k)[:, None]
+        np.subtract.at(displacement, rows, pull.astype(np.float32))
+
+        length = np.maximum(np.linalg.norm(displacement, axis=-1), 0.01)
+        pos += displacement * (np.minimum(length, temperature) / length)[:, None]
+        temperature *= 0.85
+
+    pos -= pos.mean(axis=0)
+    pos /= max(np.abs(pos).max(), 1e-9)
+    return dict(zip(nodes, pos))
+
+
+@instrument()
+def graph_to_plotly_figure(
+    G: nx.DiGraph, edge_buckets: int = 4, layout_cache: LayoutCache | None = None
+) -> go.Figure:
+    '''Convert a NetworkX DiGraph into an interactive Plotly network figure.
+
+    Rendered with WebGL (``Scattergl``) so thousands of nodes stay
+    responsive. Edges are grouped into ``edge_buckets`` lift bands, each
+    drawn as one trace whose line width grows with lift. ``layout_cache``
+    is passed to ``compute_layout``.
+    '''
     if len(G.nodes) == 0:
         return go.Figure()
 
-    pos = nx.spring_layout(G, k=0.6, iterations=50)
-
-    # Edges
-    edge_x = []
-    edge_y = []
-    for edge in G.edges():
-        x0, y0 = pos[edge[0]]
-        x1, y1 = pos[edge[1]]
-        edge_x += [x0, x1, None]
-        edge_y += [y0, y1, None]
-
-    edge_trace = go.Scatter(
-        x=edge_x,
-        y=edge_y,
-        line=dict(width=0.5),
-        hoverinfo='none',
-        mode='lines',
-    )
+    pos = compute_layout(G, cache=layout_cache)
+
+    # Edges, bucketed by lift so each band is a single trace
+    edge_list = list(G.edges(data='lift', default=1.0))
+    lifts = np.array([lift for _, _, lift in edge_list], dtype=float)
+    if len(edge_list):
+        cutoffs = np.quantile(lifts, np.linspace(0, 1, edge_buckets + 1)[1:-1])
+        bands = np.searchsorted(cutoffs, lifts, side='right')
+    else:
+        bands = np.empty(0, dtype=int)
+
+    traces = []
+    for band in range(edge_buckets):
+        members = np.flatnonzero(bands == band)
+        if len(members) == 0:
+            continue
+        edge_x = []
+        edge_y = []
+        for i in members:
+            a, c, _ = edge_list[i]
+            x0, y0 = pos[a]
+            x1, y1 = pos[c]
+            edge_x += [x0, x1, None]
+            edge_y += [y0, y1, None]
+        band_lift = lifts[members]
+        traces.append(
+            go.Scattergl(
+                x=edge_x,
+                y=edge_y,
+                line=dict(width=0.5 + 1.5 * band, color=f'rgba(125,211,252,{0.25 + 0.15 * band:.2f})'),
+                hoverinfo='none',
+                mode='lines',
+                name=f'lift {band_lift.min():.2f}–{band_lift.max():.2f}',
+            )
+        )
 
     # Nodes
-    node_x = []
-    node_y = []
-    node_text = []
-    for node in G.nodes():
-        x, y = pos[node]
-        node_x.append(x)
-        node_y.append(y)
-        node_text.append(node)
-
-    node_trace = go.Scatter(
-        x=node_x,
-        y=node_y,
-        mode='markers+text',
+    nodes = list(G.nodes())
+    coords = np.array([pos[node] for node in nodes])
+    degree = np.array([G.degree(node) for node in nodes], dtype=float)
+    labelled = len(nodes) <= LABELLED_NODES_MAX
+
+    node_trace = go.Scattergl(
+        x=coords[:, 0],
+        y=coords[:, 1],
+        mode='markers+text' if labelled else 'markers',
         hoverinfo='text',
-        text=node_text,
+        text=[str(node) for node in nodes],
         textposition='top center',
-        marker=dict(size=14),
+        marker=dict(
+            size=np.clip(8 + 2 * np.sqrt(degree), 8, 28) if not labelled else 14,
+            color=degree,
+            colorscale='Turbo',
+        ),
+        name='products',
     )
 
-    fig = go.Figure(data=[edge_trace, node_trace])
+    fig = go.Figure(data=traces + [node_trace])
     fig.update_layout(
         showlegend=False,
         hovermode='closest',
@@ -0,0 +1,60 @@
+import errno
+import os
+
+import numpy as np
+import pytest
+
+from src import cache
+
+
+CSV = 'invoice_id,product\n1,Bread\n1,Milk\n2,Milk\n'
+
+
+@pytest.fixture
+def source(tmp_path):
+    path = tmp_path / 'transactions.csv'
+    path.write_text(CSV)
+    return str(path)
+
+
+def test_repeat_load_hits_cache(source, tmp_path):
+    directory = str(tmp_path / 'cache')
+    key, _, basket = cache.load_dataset(source, directory)
+    assert [e['key'] for e in cache.list_entries(directory)] == [key]
+    again_key, _, again = cache.load_dataset(source, directory)
+    assert again_key == key
+    assert (again.sparse.to_dense().to_numpy() == basket.sparse.to_dense().to_numpy()).all()
+
+
+def test_unwritable_directory_returns_uncached_result(source, tmp_path):
+    # A regular file where the cache directory should be.
+    directory = tmp_path / 'not-a-dir'
+    directory.write_text('')
+    _, coded, basket = cache.load_dataset(source, str(directory))
+    assert len(coded) == 3
+    assert basket.shape == (2, 2)
+
+
+def test_full_disk_returns_uncached_result(source, tmp_path, monkeypatch):
+    def no_space(*args, **kwargs):
+        raise OSError(errno.ENOSPC, 'No space left on device')
+
+    monkeypatch.setattr(np, 'save', no_space)
+    directory = str(tmp_path / 'cache')
+    _, coded, _ = cache.load_dataset(source, directory)
+    assert len(coded) == 3
+    # The partial entry is cleaned up.
+    assert os.listdir(directory) == []
+
+
+def test_known_key_skips_hashing(source, tmp_path, monkeypatch):
+    directory = str(tmp_path / 'cache')
+    key, _, basket = cache.load_dataset(source, directory)
+
+    def rehash(*args, **kwargs):
+        raise AssertionError('source hashed again')
+
+    monkeypatch.setattr(cache, 'dataset_key', rehash)
+    again_key, _, again = cache.load_dataset(source, directory, key=key)
+    assert again_key == key
+    assert (again.sparse.to_dense().to_numpy() == basket.sparse.to_dense().to_numpy()).all()
@@ -0,0 +1,59 @@
+import time
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.association_rules import mine_association_rules, mine_frequent_itemsets
+
+
+def _random_basket(seed: int, n_rows: int = 200, n_items: int = 10) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    density = rng.uniform(0.2, 0.8, n_items)
+    return pd.DataFrame(rng.random((n_rows, n_items)) < density, columns=[f'i{j}' for j in range(n_items)])
+
+
+def _min_max_basis(basket, min_support):
+    '''The basis by definition, from every frequent itemset's support.'''
+    frequent = mine_frequent_itemsets(basket, min_support=min_support, engine='eclat')
+    supports = dict(zip(frequent['itemsets'], frequent['support']))
+    closed = mine_frequent_itemsets(basket, min_support=min_support, kind='closed')
+    rules = {}
+    for itemset, support in zip(closed['itemsets'], closed['support']):
+        for size in range(1, len(itemset)):
+            for antecedent in map(frozenset, combinations(sorted(itemset), size)):
+                if size > 1 and any(supports[antecedent - {i}] == supports[antecedent] for i in antecedent):
+                    continue
+                rules[antecedent, itemset - antecedent] = support / supports[antecedent]
+    return closed, rules
+
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('min_support', [0.02, 0.1])
+def test_matches_definition(seed, min_support):
+    basket = _random_basket(seed)
+    if seed % 2:
+        basket['i1'] = basket['i0']
+        basket['i9'] = True
+    closed, expected = _min_max_basis(basket, min_support)
+    rules = mine_association_rules(closed, metric='confidence', min_threshold=0.0)
+    got = dict(zip(zip(rules['antecedents'], rules['consequents']), rules['confidence']))
+    assert got.keys() == expected.keys()
+    for key, confidence in expected.items():
+        assert got[key] == pytest.approx(confidence)
+
+
+def test_dense_basket_is_not_exponential():
+    # Half the baskets hold all 40 items: a closed itemset with 2^40 subsets.
+    rng = np.random.default_rng(0)
+    basket = pd.DataFrame(rng.random((60, 40)) < 0.3, columns=[f'i{j}' for j in range(40)])
+    basket.iloc[:30] = True
+    closed = mine_frequent_itemsets(basket, min_support=0.45, kind='closed')
+    assert closed['itemsets'].map(len).max() == 40
+
+    started = time.perf_counter()
+    rules = mine_association_rules(closed, metric='confidence', min_threshold=0.0)
+    assert time.perf_counter() - started < 10
+    assert not rules.empty
+    assert (rules['confidence'] <= 1 + 1e-12).all()
@@ -0,0 +1,207 @@
+import io
+from itertools import combinations
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.association_rules import mine_generalized_itemsets
+from src.data_loader import (
+    CodedTransactions,
+    DatasetProfile,
+    ProductHierarchy,
+    get_unique_stats,
+    load_hierarchy,
+    load_transactions,
+    load_transactions_coded,
+)
+
+
+CSV = '''invoice_id,product,invoice_date
+1,Bread,13/01/2024 09:00
+1,,13/01/2024 09:00
+2,Milk,02/03/2024 10:30
+2,Bread,02/03/2024 10:30
+3,Milk,
+'''
+
+
+def _load(**kwargs):
+    return load_transactions_coded(io.StringIO(CSV), **kwargs)
+
+
+def test_missing_product_dropped_like_load_transactions():
+    coded = _load()
+    frame = load_transactions(io.StringIO(CSV))
+    labels = [coded.product_labels[c] for c in coded.product_codes]
+    assert labels == frame['product'].tolist() == ['Bread', 'Milk', 'Bread', 'Milk']
+    assert 'nan' not in coded.product_labels
+
+
+def test_timestamps_are_optional():
+    assert _load().invoice_times is None
+    assert _load(timestamps=True).invoice_times is not None
+
+
+def test_format_guessed_once_for_all_chunks():
+    # The first value fixes day-first parsing; later chunks must not re-guess month-first.
+    coded = _load(timestamps=True, chunksize=2)
+    times = dict(zip(coded.invoice_labels, coded.invoice_times))
+    assert times['1'] == np.datetime64('2024-01-13T09:00:00')
+    assert times['2'] == np.datetime64('2024-03-02T10:30:00')
+    assert np.isnat(times['3'])
+
+
+def test_explicit_format():
+    coded = _load(timestamps=True, time_format='%m/%d/%Y %H:%M')
+    times = dict(zip(coded.invoice_labels, coded.invoice_times))
+    assert np.isnat(times['1'])
+    assert times['2'] == np.datetime64('2024-02-03T10:30:00')
+
+
+HIERARCHY = '''product,category,department
+p0,c0,d0
+p1,c0,d0
+p2,c1,d0
+p3,c1,d0
+p4,c2,d1
+p5,c2,d1
+p7,,d1
+'''
+
+
+def _random_coded(seed: int, n_invoices: int = 120) -> CodedTransactions:
+    rng = np.random.default_rng(seed)
+    rows = [
+        f'{invoice},p{product}\n'
+        for invoice in range(n_invoices)
+        for product in rng.choice(8, size=rng.integers(1, 5), replace=False)
+    ]
+    return load_transactions_coded(io.StringIO('invoice_id,product\n' + ''.join(rows)))
+
+
+def _baskets(coded: CodedTransactions) -> dict[str, set]:
+    baskets = {}
+    for invoice, product in zip(coded.invoice_codes, coded.product_codes):
+        baskets.setdefault(coded.invoice_labels[invoice], set()).add(coded.product_labels[product])
+    return baskets
+
+
+def _ancestors(hierarchy: ProductHierarchy, product: str) -> list[str]:
+    if product not in hierarchy.table.index:
+        return []
+    row = hierarchy.table.loc[product]
+    return [f'{level}:{row[level]}' for level in hierarchy.levels[1:] if not pd.isna(row[level])]
+
+
+def test_roll_up_maps_and_falls_back():
+    hierarchy = load_hierarchy(io.StringIO(HIERARCHY))
+    coded = _random_coded(0)
+    products = _baskets(coded)
+    # p6 is not in the file and stays itself; p7 has no category and keeps its label there.
+    expected_category = {'p0': 'c0', 'p1': 'c0', 'p2': 'c1', 'p3': 'c1', 'p4': 'c2', 'p5': 'c2', 'p6': 'p6', 'p7': 'p7'}
+    expected_department = dict(expected_category, p0='d0', p1='d0', p2='d0', p3='d0', p4='d1', p5='d1', p7='d1')
+    for level, mapping in (('category', expected_category), ('department', expected_department)):
+        rolled = hierarchy.roll_up(coded, level)
+        assert rolled.invoice_codes is coded.invoice_codes
+        assert _baskets(rolled) == {invoice: {mapping[p] for p in items} for invoice, items in products.items()}
+    assert hierarchy.roll_up(coded, 'product') is coded
+    with pytest.raises(ValueError, match='Unknown level'):
+        hierarchy.roll_up(coded, 'brand')
+
+
+def test_generalize_adds_ancestors_and_paths():
+    hierarchy = load_hierarchy(io.StringIO(HIERARCHY))
+    coded = _random_coded(1)
+    extended, related = hierarchy.generalize(coded)
+    expected = {
+        invoice: items | {a for p in items for a in _ancestors(hierarchy, p)}
+        for invoice, items in _baskets(coded).items()
+    }
+    assert _baskets(extended) == expected
+
+    code = {label: c for c, label in enumerate(extended.product_labels)}
+    related = {
+        extended.product_labels[c]: {extended.product_labels[r] for r in codes} for c, codes in enumerate(related)
+    }
+    assert related['p0'] == {'category:c0', 'department:d0'}
+    assert related['p6'] == set()
+    assert related['p7'] == {'department:d1'}
+    assert related['category:c0'] == {'p0', 'p1', 'department:d0'}
+    assert related['department:d1'] == {'p4', 'p5', 'p7', 'category:c2'}
+    assert 'category:nan' not in code
+
+
+def _cumulate_brute_force(coded, hierarchy, min_support, max_len) -> dict:
+    extended = [
+        items | {a for p in items for a in _ancestors(hierarchy, p)} for items in _baskets(coded).values()
+    ]
+    paths = [{p, *_ancestors(hierarchy, p)} for p in coded.product_labels]
+    labels = sorted(set().union(*extended))
+    found = {}
+    for size in range(1, max_len + 1):
+        for itemset in combinations(labels, size):
+            # An item never appears with its own ancestor.
+            if any(len(path.intersection(itemset)) > 1 for path in paths):
+                continue
+            support = sum(set(itemset) <= items for items in extended) / len(extended)
+            if support >= min_support:
+                found[frozenset(itemset)] = support
+    return found
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('min_support, max_len', [(0.05, 3), (0.15, 4)])
+def test_generalized_itemsets_match_brute_force_cumulate(seed, min_support, max_len):
+    hierarchy = load_hierarchy(io.StringIO(HIERARCHY))
+    coded = _random_coded(seed)
+    frequent = mine_generalized_itemsets(coded, hierarchy, min_support=min_support, max_len=max_len)
+    got = dict(zip(frequent['itemsets'], frequent['support']))
+    expected = _cumulate_brute_force(coded, hierarchy, min_support, max_len)
+    assert got.keys() == expected.keys()
+    assert got == pytest.approx(expected)
+    assert not any({'p0', 'category:c0'} <= itemset or {'category:c2', 'department:d1'} <= itemset for itemset in got)
+    assert any('category:c0' in itemset and len(itemset) > 1 for itemset in got)
+
+
+PROFILE_CSV = '''invoice_id,product
+1,Bread
+1,Milk
+1,Bread
+2,Milk
+3,Eggs
+3,Milk
+3,Butter
+3,Bread
+4,Milk
+'''
+
+
+def test_profile_matches_groupby():
+    coded = load_transactions_coded(io.StringIO(PROFILE_CSV))
+    df = coded.to_frame()
+    profile = DatasetProfile.from_coded(coded)
+
+    assert profile.stats() == get_unique_stats(df)
+    counts = df.groupby('product').size()
+    top = profile.top_products(2)
+    assert top.to_dict() == counts.nlargest(2).to_dict() == {'Milk': 4, 'Bread': 3}
+    assert top.is_monotonic_decreasing
+    assert profile.top_products(10).to_dict() == counts.to_dict()
+
+    sizes = df.groupby('invoice_id').size()
+    assert profile.basket_size_distribution().to_dict() == sizes.value_counts().to_dict()
+    assert profile.invoice_stats() == {
+        'mean': pytest.approx(sizes.mean()),
+        'median': sizes.median(),
+        'max': sizes.max(),
+    }
+
+
+def test_profile_of_empty_dataset():
+    coded = load_transactions_coded(io.StringIO('invoice_id,product\n'))
+    profile = DatasetProfile.from_coded(coded)
+    assert profile.stats() == {'n_invoices': 0, 'n_products': 0, 'n_rows': 0}
+    assert profile.top_products().empty
+    assert profile.basket_size_distribution().empty
+    assert profile.invoice_stats() == {'mean': 0.0, 'median': 0.0, 'max': 0}
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.association_rules import ENGINES, mine_frequent_itemsets
+
+
+def _random_basket(seed: int, n_rows: int, n_items: int, density: float) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(rng.random((n_rows, n_items)) < density, columns=[f'i{j}' for j in range(n_items)])
+
+
+def _as_dict(frequent: pd.DataFrame) -> dict:
+    return dict(zip(frequent['itemsets'], frequent['support']))
+
+
+def _assert_engines_agree(basket, min_support, max_len=None):
+    results = {
+        engine: _as_dict(mine_frequent_itemsets(basket, min_support=min_support, max_len=max_len, engine=engine))
+        for engine in ENGINES
+    }
+    reference = results['apriori']
+    for engine, result in results.items():
+        assert result.keys() == reference.keys(), engine
+        for itemset, support in reference.items():
+            assert result[itemset] == pytest.approx(support), (engine, itemset)
+    return reference
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_dense_basket(seed):
+    basket = _random_basket(seed, n_rows=120, n_items=8, density=0.6)
+    assert len(_assert_engines_agree(basket, min_support=0.2)) > 50
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_sparse_basket(seed):
+    basket = _random_basket(seed, n_rows=400, n_items=40, density=0.05)
+    assert _assert_engines_agree(basket, min_support=0.01)
+
+
+def test_sparse_frame_input():
+    basket = _random_basket(0, n_rows=200, n_items=15, density=0.2)
+    dense = _as_dict(mine_frequent_itemsets(basket, min_support=0.03, engine='apriori'))
+    sparse = basket.astype(pd.SparseDtype(bool, False))
+    for engine in ENGINES:
+        assert _as_dict(mine_frequent_itemsets(sparse, min_support=0.03, engine=engine)).keys() == dense.keys()
+
+
+@pytest.mark.parametrize('max_len', [1, 2, 3])
+def test_max_len(max_len):
+    basket = _random_basket(1, n_rows=150, n_items=10, density=0.5)
+    reference = _assert_engines_agree(basket, min_support=0.1, max_len=max_len)
+    assert max(len(itemset) for itemset in reference) == max_len
+
+
+@pytest.mark.filterwarnings('error')
+def test_empty_basket():
+    basket = pd.DataFrame(np.zeros((0, 4), dtype=bool), columns=list('abcd'))
+    for engine in ENGINES:
+        frequent = mine_frequent_itemsets(basket, min_support=0.1, engine=engine)
+        assert frequent.empty
+        assert list(frequent.columns) == ['support', 'itemsets']
+
+
+@pytest.mark.parametrize('n_rows, hits', [(10, 2), (10, 3), (7, 1), (30, 9)])
+def test_support_exactly_at_threshold(n_rows, hits):
+    # 'a' and {'a', 'b'} sit exactly on min_support; 'c' is one basket short.
+    basket = pd.DataFrame(False, index=range(n_rows), columns=['a', 'b', 'c'])
+    basket.loc[: hits - 1, ['a', 'b']] = True
+    basket.loc[hits:, 'b'] = True
+    basket.loc[: hits - 2, 'c'] = True
+    reference = _assert_engines_agree(basket, min_support=hits / n_rows)
+    assert frozenset('ab') in reference
+    assert frozenset('c') not in reference
@@ -0,0 +1,78 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.association_rules import mine_frequent_itemsets
+from src.incremental import IncrementalMiner
+
+
+def _batch(rng, n_rows: int, density: dict[str, float]) -> pd.DataFrame:
+    return pd.DataFrame({item: rng.random(n_rows) < p for item, p in density.items()})
+
+
+def _drifting_batches(seed: int) -> list[pd.DataFrame]:
+    ''''rising' starts rare and becomes common, 'fading' the opposite; 'late' appears later.'''
+    rng = np.random.default_rng(seed)
+    base = {f'i{j}': p for j, p in enumerate(rng.uniform(0.05, 0.5, 6))}
+    batches = []
+    for step in range(6):
+        density = dict(base, rising=0.02 + 0.2 * step, fading=max(0.8 - 0.3 * step, 0.0))
+        if step >= 3:
+            density['late'] = 0.6
+        batches.append(_batch(rng, int(rng.integers(40, 120)), density))
+    return batches
+
+
+def _as_dict(frequent: pd.DataFrame) -> dict:
+    return dict(zip(frequent['itemsets'], frequent['support']))
+
+
+def _assert_matches_full_mine(miner, batches, min_support, max_len):
+    history = pd.concat(batches, ignore_index=True).fillna(False).astype(bool)
+    expected = _as_dict(mine_frequent_itemsets(history, min_support=min_support, max_len=max_len, engine='eclat'))
+    got = _as_dict(miner.frequent_itemsets())
+    assert got.keys() == expected.keys()
+    for itemset, support in expected.items():
+        assert got[itemset] == pytest.approx(support)
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('min_support, max_len', [(0.1, None), (0.05, 3), (0.2, 2)])
+def test_matches_full_remine_after_each_batch(seed, min_support, max_len):
+    batches = _drifting_batches(seed)
+    miner = IncrementalMiner(min_support=min_support, max_len=max_len)
+    for n in range(len(batches)):
+        miner.update(batches[n])
+        _assert_matches_full_mine(miner, batches[: n + 1], min_support, max_len)
+
+
+def test_items_cross_the_threshold_both_ways():
+    batches = _drifting_batches(0)
+    miner = IncrementalMiner(min_support=0.35)
+    miner.update(batches[0])
+    frequent_items = lambda: {next(iter(s)) for s in miner.frequent_itemsets()['itemsets'] if len(s) == 1}
+    assert 'fading' in frequent_items() and 'rising' not in frequent_items()
+    for batch in batches[1:]:
+        miner.update(batch)
+    assert 'rising' in frequent_items() and 'fading' not in frequent_items()
+    _assert_matches_full_mine(miner, batches, 0.35, None)
+    frequent = set(miner.frequent) | {(item,) for item in frequent_items()}
+    for itemset in miner.negative_border:
+        assert all(itemset[:j] + itemset[j + 1:] in frequent for j in range(len(itemset)))
+
+
+def test_compaction_keeps_counts(monkeypatch):
+    monkeypatch.setattr(IncrementalMiner, 'max_segments', 2)
+    batches = _drifting_batches(1)
+    miner = IncrementalMiner(min_support=0.1, max_len=3)
+    for batch in batches:
+        miner.update(batch)
+    _assert_matches_full_mine(miner, batches, 0.1, 3)
+
+
+def test_labels_are_strings():
+    miner = IncrementalMiner(min_support=0.5)
+    miner.update(pd.DataFrame({1: [True, True], '1': [True, False]}))
+    itemsets = miner.frequent_itemsets()
+    assert itemsets['itemsets'].tolist() == [frozenset({'1'})]
+    assert itemsets['support'].tolist() == [1.0]
@@ -0,0 +1,79 @@
+import threading
+import time
+
+import pytest
+
+from src.jobs import JobCancelled, JobRunner, LatestJob, checkpoint
+
+
+@pytest.fixture
+def runner():
+    runner = JobRunner(max_workers=2)
+    yield runner
+    runner.shutdown()
+
+
+def _loop_until_cancelled(started: threading.Event, reached: list):
+    started.set()
+    step = 0
+    while True:
+        step += 1
+        reached.append(step)
+        checkpoint(progress=min(step / 1000, 1.0), message='searching')
+        time.sleep(0.001)
+
+
+def test_superseded_job_is_cancelled_at_checkpoint(runner):
+    latest = LatestJob()
+    started, reached = threading.Event(), []
+    first = latest.switch(runner, 'a', _loop_until_cancelled, started, reached)
+    assert started.wait(5)
+    assert latest.poll() is None
+
+    second = latest.switch(runner, 'b', lambda: 'second')
+    assert first.cancel_requested
+    assert first.wait(5) and second.wait(5)
+    assert isinstance(first.error(), JobCancelled)
+    with pytest.raises(JobCancelled):
+        first.result()
+    assert first.state == 'cancelled'
+    assert first.progress is not None and first.message == 'searching'
+
+    assert latest.poll() == ('b', 'second')
+    assert latest.published is second
+    steps = len(reached)
+    time.sleep(0.05)
+    assert len(reached) == steps
+
+
+def test_same_key_keeps_the_running_job(runner):
+    latest = LatestJob()
+    release = threading.Event()
+    job = latest.switch(runner, 'a', release.wait, 5)
+    assert latest.switch(runner, 'a', release.wait, 5) is job
+    release.set()
+    assert latest.poll(5) == ('a', True)
+
+
+def test_last_good_result_survives_cancelled_and_failed_jobs(runner):
+    latest = LatestJob()
+    latest.switch(runner, 'a', lambda: 'first')
+    assert latest.poll(5) == ('a', 'first')
+
+    started, reached = threading.Event(), []
+    running = latest.switch(runner, 'b', _loop_until_cancelled, started, reached)
+    assert started.wait(5)
+    assert latest.poll() == ('a', 'first')
+
+    def fail():
+        raise ValueError('bad settings')
+
+    failed = latest.switch(runner, 'c', fail)
+    assert running.wait(5) and failed.wait(5)
+    assert running.state == 'cancelled' and failed.state == 'failed'
+    assert latest.poll() == ('a', 'first')
+    assert latest.published.key == 'a'
+
+
+def test_checkpoint_outside_a_job_is_a_no_op():
+    checkpoint(progress=0.5, message='ignored')
@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+from src.association_rules import mine_association_rules, mine_frequent_itemsets
+from src.lattice import RuleLattice
+
+
+def _basket() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    density = rng.uniform(0.1, 0.5, 10)
+    return pd.DataFrame(rng.random((300, 10)) < density, columns=[f'i{j}' for j in range(10)])
+
+
+def test_tighter_query_matches_direct_mining():
+    basket = _basket()
+    lattice = RuleLattice(basket, engine='eclat')
+    lattice.query(min_support=0.02, min_lift=1.0, max_len=3)
+    itemsets, rules = lattice.query(min_support=0.05, min_lift=1.2, max_len=2)
+
+    direct = mine_frequent_itemsets(basket, min_support=0.05, max_len=2, engine='eclat')
+    direct_rules = mine_association_rules(direct, metric='lift', min_threshold=1.2)
+    assert set(itemsets['itemsets']) == set(direct['itemsets'])
+    assert set(zip(rules['antecedents'], rules['consequents'])) == set(
+        zip(direct_rules['antecedents'], direct_rules['consequents'])
+    )
+
+
+def test_nothing_frequent():
+    itemsets, rules = RuleLattice(_basket(), engine='eclat').query(min_support=0.99, min_lift=1.0, max_len=3)
+    assert itemsets.empty and rules.empty
+    assert 'antecedents' in rules.columns
@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from src import pipeline
+from src.pipeline import EXIT_ERROR, EXIT_INPUT, EXIT_OK, main
+
+
+CSV = 'invoice_id,product\n' + ''.join(f'{i},Bread\n{i},Milk\n' for i in range(10)) + '10,Eggs\n'
+
+
+@pytest.fixture
+def source(tmp_path, monkeypatch):
+    monkeypatch.setenv('MBA_CACHE_DIR', str(tmp_path / 'cache'))
+    path = tmp_path / 'transactions.csv'
+    path.write_text(CSV)
+    return str(path)
+
+
+def test_success(source, tmp_path):
+    output = tmp_path / 'rules.jsonl'
+    assert main([source, '-o', str(output), '--min-support', '0.5', '--min-lift', '0', '-q']) == EXIT_OK
+    lines = [json.loads(line) for line in output.read_text().splitlines()]
+    assert lines[-1]['summary']['rules'] == 2
+
+
+def test_missing_file_is_input_error(tmp_path):
+    assert main([str(tmp_path / 'missing.csv'), '-o', str(tmp_path / 'out.jsonl'), '-q']) == EXIT_INPUT
+
+
+def test_malformed_csv_is_input_error(tmp_path):
+    path = tmp_path / 'bad.csv'
+    path.write_text('a,b\n1,2\n')
+    assert main([str(path), '-o', str(tmp_path / 'out.jsonl'), '--no-cache', '-q']) == EXIT_INPUT
+
+
+def test_level_without_hierarchy_is_input_error(source, tmp_path):
+    assert main([source, '-o', str(tmp_path / 'out.jsonl'), '--level', 'category', '-q']) == EXIT_INPUT
+
+
+def test_value_error_after_loading_is_unexpected(source, tmp_path, monkeypatch):
+    def broken(*args, **kwargs):
+        raise ValueError('bug in mining')
+
+    monkeypatch.setattr(pipeline, 'mine_frequent_itemsets', broken)
+    assert main([source, '-o', str(tmp_path / 'out.jsonl'), '-q']) == EXIT_ERROR
+
+
+def test_unwritable_output_is_unexpected(source, tmp_path):
+    assert main([source, '-o', str(tmp_path / 'no-such-dir' / 'out.jsonl'), '-q']) == EXIT_ERROR
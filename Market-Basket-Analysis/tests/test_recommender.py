@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.association_rules import mine_association_rules, mine_frequent_itemsets
+from src.recommender import (
+    RecommenderModel,
+    compile_rules,
+    iter_batch_recommendations,
+    recommend_products,
+    write_batch_recommendations,
+)
+
+
+_COLUMNS = ['product', 'score', 'support', 'confidence', 'lift']
+
+
+def _random_basket(seed: int, n_rows: int, n_items: int, density: float) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(rng.random((n_rows, n_items)) < density, columns=[f'i{j}' for j in range(n_items)])
+
+
+def _rules(seed: int) -> pd.DataFrame:
+    basket = _random_basket(seed, n_rows=300, n_items=12, density=0.3)
+    frequent = mine_frequent_itemsets(basket, min_support=0.03, max_len=3, engine='eclat')
+    return mine_association_rules(frequent, metric='lift', min_threshold=0.5)
+
+
+def _baskets(seed: int, n_baskets: int = 40) -> list[list[str]]:
+    rng = np.random.default_rng(seed + 100)
+    return [
+        [f'i{j}' for j in rng.choice(13, size=rng.integers(0, 5), replace=False)]  # i12 is unknown
+        for _ in range(n_baskets)
+    ]
+
+
+def _scores(frame: pd.DataFrame) -> dict:
+    return dict(zip(frame['product'], frame['score']))
+
+
+def _assert_same_recommendations(expected: pd.DataFrame, got: pd.DataFrame) -> None:
+    assert _scores(got) == pytest.approx(_scores(expected))
+    for name in ('support', 'confidence', 'lift'):
+        assert dict(zip(got['product'], got[name])) == pytest.approx(dict(zip(expected['product'], expected[name])))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_model_matches_recommend_products(seed):
+    rules = _rules(seed)
+    model = compile_rules(rules)
+    for basket in _baskets(seed):
+        expected = recommend_products(rules, basket, top_n=len(rules))
+        _assert_same_recommendations(expected, model.recommend(basket, top_n=len(rules)))
+        records = model.recommend_records(basket, top_n=len(rules))
+        _assert_same_recommendations(expected, pd.DataFrame(records, columns=_COLUMNS))
+
+
+@pytest.mark.parametrize('top_n', [1, 3])
+def test_top_n_scores(top_n):
+    rules = _rules(0)
+    model = compile_rules(rules)
+    for basket in _baskets(0):
+        expected = recommend_products(rules, basket, top_n=top_n)['score'].tolist()
+        assert model.recommend(basket, top_n=top_n)['score'].tolist() == pytest.approx(expected)
+        assert [r['score'] for r in model.recommend_records(basket, top_n=top_n)] == pytest.approx(expected)
+
+
+def test_save_and_load(tmp_path):
+    rules = _rules(1)
+    model = compile_rules(rules)
+    model.save(tmp_path / 'rules.npz')
+    loaded = RecommenderModel.load(tmp_path / 'rules.npz')
+    for basket in _baskets(1):
+        assert loaded.recommend_records(basket, top_n=10) == model.recommend_records(basket, top_n=10)
+
+
+def test_no_rules():
+    rules = _rules(0).iloc[:0]
+    model = compile_rules(rules)
+    assert model.recommend(['i0']).empty
+    assert model.recommend_records(['i0']) == []
+
+
+def _basket_frame(baskets: list[list[str]]) -> pd.DataFrame:
+    items = [f'i{j}' for j in range(13)]
+    return pd.DataFrame(
+        [[item in basket for item in items] for basket in baskets],
+        index=[f'inv{n}' for n in range(len(baskets))],
+        columns=items,
+    )
+
+
+@pytest.mark.parametrize('seed', range(3))
+@pytest.mark.parametrize('sparse_input', [False, True])
+def test_batch_matches_recommend_products(seed, sparse_input):
+    rules = _rules(seed)
+    baskets = _baskets(seed)
+    frame = _basket_frame(baskets)
+    if sparse_input:
+        frame = frame.astype(pd.SparseDtype(bool, False))
+    model = compile_rules(rules)
+    result = pd.concat(iter_batch_recommendations(model, frame, top_n=len(rules), chunk_size=7))
+
+    for label, basket in zip(frame.index, baskets):
+        expected = recommend_products(rules, basket, top_n=len(rules))
+        got = result[result['basket'] == label]
+        assert _scores(got) == pytest.approx(_scores(expected))
+        assert got['score'].is_monotonic_decreasing
+
+
+@pytest.mark.parametrize('top_n', [1, 3])
+def test_batch_top_n(top_n):
+    rules = _rules(0)
+    baskets = _baskets(0)
+    frame = _basket_frame(baskets)
+    result = pd.concat(iter_batch_recommendations(compile_rules(rules), frame, top_n=top_n))
+    for label, basket in zip(frame.index, baskets):
+        expected = recommend_products(rules, basket, top_n=top_n)['score'].tolist()
+        assert result.loc[result['basket'] == label, 'score'].tolist() == pytest.approx(expected)
+
+
+@pytest.mark.parametrize('name', ['recommendations.csv', 'recommendations.csv.gz'])
+def test_writer_matches_batches(tmp_path, name):
+    rules = _rules(2)
+    frame = _basket_frame(_baskets(2, n_baskets=60))
+    model = compile_rules(rules)
+    expected = pd.concat(iter_batch_recommendations(model, frame, top_n=4), ignore_index=True)
+
+    path = tmp_path / name
+    written = write_batch_recommendations(model, frame, str(path), top_n=4, chunk_size=9)
+    got = pd.read_csv(path)
+    assert written == len(expected) == len(got)
+    assert got.columns.tolist() == ['basket', 'product', 'score']
+    assert got[['basket', 'product']].values.tolist() == expected[['basket', 'product']].values.tolist()
+    assert got['score'].tolist() == pytest.approx(expected['score'].tolist())
@@ -0,0 +1,134 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.association_rules import _RULE_COLUMNS, filter_rules, mine_association_rules, mine_frequent_itemsets
+from src.recommender import recommend_products
+from src.rule_db import RuleDB
+
+
+def _random_basket(seed: int, n_rows: int, n_items: int, density: float) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame(rng.random((n_rows, n_items)) < density, columns=[f'i{j}' for j in range(n_items)])
+
+
+def _mined(seed: int):
+    basket = _random_basket(seed, n_rows=300, n_items=12, density=0.3)
+    itemsets = mine_frequent_itemsets(basket, min_support=0.05, max_len=3, engine='eclat')
+    rules = mine_association_rules(itemsets, metric='lift', min_threshold=0.8)
+    return itemsets, rules
+
+
+_METRICS = _RULE_COLUMNS[2:]
+
+
+def _rule_dict(rules: pd.DataFrame) -> dict:
+    return {
+        (antecedent, consequent): values
+        for antecedent, consequent, *values in zip(
+            rules['antecedents'], rules['consequents'], *(rules[name] for name in _METRICS)
+        )
+    }
+
+
+def _assert_same_rules(got: pd.DataFrame, expected: pd.DataFrame) -> None:
+    got, expected = _rule_dict(got), _rule_dict(expected)
+    assert got.keys() == expected.keys()
+    for key, values in expected.items():
+        assert got[key] == pytest.approx(values), key
+
+
+@pytest.fixture
+def db(tmp_path):
+    with RuleDB(str(tmp_path / 'rules.sqlite')) as db:
+        yield db
+
+
+@pytest.mark.parametrize('seed', range(2))
+def test_round_trip(db, seed):
+    itemsets, rules = _mined(seed)
+    assert len(rules) > 20
+    run_id = db.write_run(itemsets, rules, {'seed': seed})
+    _assert_same_rules(db.query_rules(run_id), rules)
+    assert db.runs().loc[run_id, ['itemsets', 'rules']].tolist() == [len(itemsets), len(rules)]
+
+
+def test_conviction_infinity_round_trips(db):
+    values = [0.5, 0.5, 0.5, 1.0, 2.0, 0.25, np.inf]
+    rules = pd.DataFrame([[frozenset({'a'}), frozenset({'b'}), *values]], columns=_RULE_COLUMNS)
+    db.write_run(None, rules)
+    assert db.query_rules()['conviction'].tolist() == [np.inf]
+
+
+@pytest.mark.parametrize(
+    'antecedent, consequent, min_confidence, min_lift',
+    [((), (), 0.4, 1.1), (('i0',), (), 0.0, 0.0), ((), ('i3',), 0.3, 1.0), (('i1', 'i2'), (), 0.2, 0.0), (('i4',), ('i5',), 0.0, 0.0)],
+)
+def test_query_rules_matches_filter_rules(db, antecedent, consequent, min_confidence, min_lift):
+    itemsets, rules = _mined(0)
+    run_id = db.write_run(itemsets, rules)
+    # A second run with other rules must not leak into the first one's answers.
+    db.write_run(*_mined(1))
+
+    expected = filter_rules(rules, min_confidence=min_confidence, min_lift=min_lift)
+    expected = expected[
+        expected['antecedents'].map(set(antecedent).issubset) & expected['consequents'].map(set(consequent).issubset)
+    ]
+    got = db.query_rules(
+        run_id, antecedent=list(antecedent), consequent=list(consequent),
+        min_confidence=min_confidence, min_lift=min_lift,
+    )
+    _assert_same_rules(got, expected)
+    assert got['lift'].is_monotonic_decreasing
+
+
+def test_query_rules_limit_and_unknown_item(db):
+    itemsets, rules = _mined(0)
+    db.write_run(itemsets, rules)
+    top = db.query_rules(sort_by='confidence', limit=5)
+    assert top['confidence'].tolist() == pytest.approx(rules['confidence'].nlargest(5).tolist())
+    assert db.query_rules(antecedent=['zz']).empty
+
+
+def test_itemset_support(db):
+    itemsets, rules = _mined(0)
+    run_id = db.write_run(itemsets, rules)
+    db.write_run(*_mined(1))
+    for itemset, support in zip(itemsets['itemsets'], itemsets['support']):
+        assert db.itemset_support(sorted(itemset), run_id) == pytest.approx(support)
+    assert db.itemset_support(['i0', 'zz'], run_id) is None
+
+
+@pytest.mark.parametrize('basket', [['i0'], ['i1', 'i2'], ['i3', 'i4', 'i5'], ['zz'], ['i0', 'zz']])
+def test_recommend_matches_recommend_products(db, basket):
+    itemsets, rules = _mined(0)
+    run_id = db.write_run(itemsets, rules)
+    db.write_run(*_mined(1))
+    expected = recommend_products(rules, basket, top_n=len(rules))
+    got = db.recommend(basket, top_n=len(rules), run_id=run_id)
+    assert dict(zip(got['product'], got['score'])) == pytest.approx(dict(zip(expected['product'], expected['score'])))
+
+
+def test_rolled_back_write_keeps_items_resolvable(db):
+    _, rules = _mined(0)
+
+    def failing():
+        for antecedent, consequent, *values in zip(rules['antecedents'], rules['consequents'], *(rules[m] for m in _METRICS)):
+            yield antecedent, consequent, dict(zip(_METRICS, values))
+        raise RuntimeError('interrupted')
+
+    with pytest.raises(RuntimeError):
+        db.write_run(None, failing())
+    assert db.runs().empty
+
+    run_id = db.write_run(None, rules)
+    _assert_same_rules(db.query_rules(run_id, antecedent=['i0']), rules[rules['antecedents'].map(lambda a: 'i0' in a)])
+    assert not db.recommend(['i0']).empty
+
+
+def test_rejects_other_schema_versions(tmp_path):
+    path = str(tmp_path / 'old.sqlite')
+    with RuleDB(path) as db:
+        db.conn.execute('PRAGMA user_version = 1')
+    with pytest.raises(ValueError, match='schema 1'):
+        RuleDB(path)
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.association_rules import filter_rules, mine_association_rules, mine_frequent_itemsets
+from src.rule_store import RuleTable
+
+
+@pytest.fixture(scope='module')
+def rules() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    density = rng.uniform(0.1, 0.5, 12)
+    basket = pd.DataFrame(rng.random((400, 12)) < density, columns=[f'i{j}' for j in range(12)])
+    frequent = mine_frequent_itemsets(basket, min_support=0.03, engine='eclat')
+    rules = mine_association_rules(frequent, metric='confidence', min_threshold=0.1)
+    return rules.reset_index(drop=True)
+
+
+def test_filter_matches_frame(rules):
+    table = RuleTable.from_frame(rules)
+    rows = table.filter(min_confidence=0.4, min_lift=1.1)
+    expected = filter_rules(rules, min_confidence=0.4, min_lift=1.1)
+    assert sorted(rows.tolist()) == sorted(expected.index.tolist())
+    lifts = table.metrics['lift'][rows]
+    assert (np.diff(lifts) <= 0).all()
+
+
+@pytest.mark.parametrize('threshold', [0.1, 0.3, 0.7, 2 / 3])
+def test_rule_on_the_threshold(threshold):
+    # 0.7 and 2/3 round down in float32; 0.1 and 0.3 round up.
+    rules = pd.DataFrame(
+        {
+            'antecedents': [frozenset({'a'}), frozenset({'b'}), frozenset({'c'})],
+            'consequents': [frozenset({'b'}), frozenset({'c'}), frozenset({'a'})],
+            'antecedent support': 0.5,
+            'consequent support': 0.5,
+            'support': 0.25,
+            'confidence': [threshold, np.nextafter(threshold, 0), np.nextafter(threshold, 1)],
+            'lift': [threshold, threshold, threshold],
+            'leverage': 0.0,
+            'conviction': 1.0,
+        }
+    )
+    table = RuleTable.from_frame(rules)
+    expected = filter_rules(rules, min_confidence=threshold, min_lift=threshold)
+    assert sorted(table.filter(min_confidence=threshold, min_lift=threshold).tolist()) == sorted(expected.index) == [0, 2]
+    frame = table.to_frame()
+    assert frame['confidence'].tolist() == rules['confidence'].tolist()
+    assert frame['confidence'].dtype == np.float64
+
+
+def test_labels_are_lazy_and_counted(rules):
+    table = RuleTable.from_frame(rules)
+    before = table.nbytes
+    assert not table._labels
+
+    frame = table.to_frame(np.arange(5))
+    assert table.nbytes > before
+    for row, label in zip(range(5), frame['antecedents_str']):
+        assert label == ', '.join(sorted(rules['antecedents'].iloc[row]))
+
+    # Only the requested rows are built.
+    assert table._labels['antecedents_str'][5:].tolist() == [None] * (len(table) - 5)
+
+
+def test_rules_with_item_limited_to_rows(rules):
+    table = RuleTable.from_frame(rules)
+    rows = table.filter(min_confidence=0.4, min_lift=1.0)
+    for item in table.items:
+        expected = [
+            row for row in rows.tolist()
+            if item in rules['antecedents'].iloc[row] or item in rules['consequents'].iloc[row]
+        ]
+        assert table.rules_with_item(item, rows).tolist() == sorted(expected)
+    assert table.rules_with_item('i0', np.empty(0, dtype=np.int64)).size == 0
+    assert table.rules_with_item('missing', rows).size == 0
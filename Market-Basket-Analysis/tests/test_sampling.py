@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.association_rules import mine_frequent_itemsets
+
+
+def _random_basket(seed: int, n_rows: int = 2000, n_items: int = 12) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    density = rng.uniform(0.05, 0.4, n_items)
+    return pd.DataFrame(rng.random((n_rows, n_items)) < density, columns=[f'i{j}' for j in range(n_items)])
+
+
+def _as_dict(frequent: pd.DataFrame) -> dict:
+    return dict(zip(frequent['itemsets'], frequent['support']))
+
+
+@pytest.mark.parametrize('seed', range(3))
+def test_verified_sample_is_exact(seed):
+    basket = _random_basket(seed)
+    exact = _as_dict(mine_frequent_itemsets(basket, min_support=0.05, engine='eclat'))
+    sampled = mine_frequent_itemsets(
+        basket, min_support=0.05, sample_fraction=0.1, verify=True, random_state=seed
+    )
+    assert _as_dict(sampled).keys() == exact.keys()
+    for itemset, support in exact.items():
+        assert _as_dict(sampled)[itemset] == pytest.approx(support)
+    assert sampled.attrs['passes'] >= 1
+
+
+def test_unverified_sample_has_intervals():
+    sampled = mine_frequent_itemsets(_random_basket(0), min_support=0.05, sample_fraction=0.2, random_state=0)
+    assert not sampled.empty
+    assert (sampled['support_low'] <= sampled['support']).all()
+    assert (sampled['support'] <= sampled['support_high']).all()
+
+
+@pytest.mark.parametrize('verify', [False, True])
+@pytest.mark.parametrize('shape', [(0, 4), (10, 0), (0, 0)])
+def test_empty_basket(shape, verify):
+    basket = pd.DataFrame(np.zeros(shape, dtype=bool), columns=[f'i{j}' for j in range(shape[1])])
+    frame = mine_frequent_itemsets(basket, min_support=0.1, sample_fraction=0.5, verify=verify)
+    assert frame.empty
+    assert frame.attrs['n_rows'] == shape[0]
+    assert frame.attrs['verified'] is verify
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import time
+
+import pandas as pd
+import pytest
+
+from server import RecommendationServer
+from src.association_rules import mine_association_rules, mine_frequent_itemsets
+from src.recommender import compile_rules
+
+
+@pytest.fixture(scope='module')
+def server() -> RecommendationServer:
+    baskets = [['Bread', 'Milk'], ['Bread', 'Milk, 2%'], ['Bread', 'Milk', 'Eggs'], ['Milk, 2%', 'Eggs']] * 5
+    items = sorted({i for b in baskets for i in b})
+    basket = pd.DataFrame([[i in b for i in items] for b in baskets], columns=items)
+    frequent = mine_frequent_itemsets(basket, min_support=0.1, engine='eclat')
+    rules = mine_association_rules(frequent, metric='lift', min_threshold=0.0)
+    return RecommendationServer(compile_rules(rules))
+
+
+def test_get_repeated_item_params_keep_commas(server):
+    status, payload = server.route('GET', '/recommend?item=Milk%2C+2%25&item=Eggs&top_n=3', b'')
+    assert status == 200
+    assert payload['items'] == ['Milk, 2%', 'Eggs']
+    assert payload['recommendations']
+
+
+def test_get_comma_separated_items(server):
+    status, payload = server.route('GET', '/recommend?items=Bread,Milk', b'')
+    assert status == 200
+    assert payload['items'] == ['Bread', 'Milk']
+
+
+def test_post(server):
+    status, payload = server.route('POST', '/recommend', json.dumps({'items': ['Bread'], 'top_n': 2}).encode())
+    assert status == 200
+    assert len(payload['recommendations']) <= 2
+
+
+class _Writer:
+    def __init__(self):
+        self.written = []
+
+    def write(self, data):
+        self.written.append(data)
+
+    async def drain(self):
+        pass
+
+    def close(self):
+        pass
+
+
+async def _roundtrip(server, method, target, body=b''):
+    reader = asyncio.StreamReader()
+    reader.feed_data(
+        f'{method} {target} HTTP/1.1\r\nContent-Length: {len(body)}\r\nConnection: close\r\n\r\n'.encode()
+        + body
+    )
+    reader.feed_eof()
+    writer = _Writer()
+    await server.handle(reader, writer)
+    return b''.join(writer.written)
+
+
+@pytest.mark.parametrize(
+    'method, target, body',
+    [
+        ('POST', '/recommend', b'["Bread"]'),
+        ('POST', '/recommend', b'{"items": "Bread"}'),
+        ('POST', '/recommend', b'{"items": ["Bread"], "top_n": 0}'),
+        ('POST', '/recommend', b'{"items": ["Bread"], "top_n": null}'),
+        ('POST', '/recommend', b'{"items": ["Bread"], "top_n": 2.5}'),
+        ('POST', '/recommend', b'{"items": ["Bread"], "top_n": true}'),
+        ('POST', '/recommend', b'{"items": ["Bread"], "top_n": "3"}'),
+        ('GET', '/recommend?items=Bread&top_n=-1', b''),
+        ('GET', '/recommend?items=Bread&top_n=x', b''),
+        ('GET', '/recommend?items=Bread&top_n=2.5', b''),
+        ('GET', '/recommend?items=Bread&top_n=+3+', b''),
+    ],
+)
+def test_bad_requests_get_400(server, method, target, body):
+    response = asyncio.run(_roundtrip(server, method, target, body))
+    assert response.startswith(b'HTTP/1.1 400 ')
+    assert b'"error"' in response
+
+
+def test_get_top_n_digits(server):
+    status, payload = server.route('GET', '/recommend?items=Bread&top_n=1', b'')
+    assert status == 200
+    assert len(payload['recommendations']) == 1
+
+
+def test_slow_recommendation_does_not_block_other_requests(server):
+    slow = RecommendationServer(server.model)
+    finished = []
+
+    def recommend(items, top_n):
+        time.sleep(0.3)
+        return {'items': items, 'recommendations': []}
+
+    slow.recommend = recommend
+
+    async def request(name, target):
+        await _roundtrip(slow, 'GET', target)
+        finished.append(name)
+
+    async def both():
+        await asyncio.gather(request('recommend', '/recommend?items=Bread'), request('health', '/health'))
+
+    asyncio.run(both())
+    assert finished == ['health', 'recommend']
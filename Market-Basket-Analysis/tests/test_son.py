@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.association_rules import mine_frequent_itemsets
+
+
+def _random_basket(seed: int, n_rows: int, n_items: int = 10) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    density = rng.uniform(0.1, 0.5, n_items)
+    return pd.DataFrame(rng.random((n_rows, n_items)) < density, columns=[f'i{j}' for j in range(n_items)])
+
+
+def _as_dict(frequent: pd.DataFrame) -> dict:
+    return dict(zip(frequent['itemsets'], frequent['support']))
+
+
+def _assert_matches_single_process(basket, min_support, n_jobs, max_len=None):
+    expected = _as_dict(mine_frequent_itemsets(basket, min_support=min_support, max_len=max_len, engine='eclat'))
+    got = _as_dict(mine_frequent_itemsets(basket, min_support=min_support, max_len=max_len, n_jobs=n_jobs))
+    assert got.keys() == expected.keys()
+    for itemset, support in expected.items():
+        assert got[itemset] == pytest.approx(support)
+
+
+@pytest.mark.parametrize('n_jobs', [2, 3, -1])
+@pytest.mark.parametrize('n_rows', [300, 301, 302])
+def test_matches_single_process(n_jobs, n_rows):
+    # 301 and 302 rows leave partitions of unequal size.
+    _assert_matches_single_process(_random_basket(n_rows, n_rows), min_support=0.05, n_jobs=n_jobs)
+
+
+def test_skewed_partitions():
+    # An itemset frequent in only one partition must still be counted everywhere.
+    basket = _random_basket(0, 300)
+    basket.loc[:99, ['i0', 'i1', 'i2']] = True
+    basket.loc[100:, ['i0', 'i1', 'i2']] = False
+    _assert_matches_single_process(basket, min_support=0.2, n_jobs=3)
+
+
+@pytest.mark.parametrize('n_rows', [1, 2])
+def test_fewer_rows_than_jobs(n_rows):
+    _assert_matches_single_process(_random_basket(1, n_rows), min_support=0.5, n_jobs=3)
+
+
+def test_max_len():
+    _assert_matches_single_process(_random_basket(2, 200), min_support=0.05, n_jobs=2, max_len=2)
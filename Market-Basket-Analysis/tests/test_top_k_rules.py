@@ -0,0 +1,43 @@
+import numpy as np
+import pandas as pd
+import pytest
+from mlxtend.frequent_patterns import apriori, association_rules
+
+from src.association_rules import TOP_K_MEASURES, mine_top_k_rules
+
+
+def _random_basket(seed: int, n_rows: int = 300, n_items: int = 12) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    density = rng.uniform(0.1, 0.5, n_items)
+    return pd.DataFrame(rng.random((n_rows, n_items)) < density, columns=[f'i{j}' for j in range(n_items)])
+
+
+def _exhaustive_top_k(basket, k, sort_by, min_confidence, max_len, min_support):
+    frequent = apriori(basket, min_support=max(min_support, 1 / len(basket)), use_colnames=True, max_len=max_len)
+    rules = association_rules(frequent, metric='confidence', min_threshold=min_confidence)
+    others = [m for m in TOP_K_MEASURES if m != sort_by]
+    return rules.sort_values([sort_by, *others], ascending=False).head(k)
+
+
+@pytest.mark.parametrize('seed', range(4))
+@pytest.mark.parametrize('sort_by', TOP_K_MEASURES)
+@pytest.mark.parametrize('min_support', [0.0, 0.02])
+def test_matches_exhaustive_ranking(seed, sort_by, min_support):
+    basket = _random_basket(seed)
+    got = mine_top_k_rules(
+        basket, k=5, min_confidence=0.5, max_len=4, sort_by=sort_by, min_support=min_support
+    )
+    expected = _exhaustive_top_k(basket, 5, sort_by, 0.5, 4, min_support)
+    np.testing.assert_allclose(got[sort_by].to_numpy(), expected[sort_by].to_numpy())
+
+
+def test_lift_ranking_beats_support_ranking():
+    basket = _random_basket(0)
+    by_lift = mine_top_k_rules(basket, k=5, min_confidence=0.5, max_len=3, sort_by='lift', min_support=0.02)
+    by_support = mine_top_k_rules(basket, k=5, min_confidence=0.5, max_len=3, sort_by='support')
+    assert by_lift['lift'].min() >= by_support['lift'].max()
+
+
+def test_empty_basket():
+    rules = mine_top_k_rules(pd.DataFrame(np.zeros((0, 3), dtype=bool), columns=list('abc')), k=5)
+    assert rules.empty
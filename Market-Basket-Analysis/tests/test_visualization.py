@@ -0,0 +1,28 @@
+import networkx as nx
+
+from src.visualization import LayoutCache, compute_layout
+
+
+def _graph(edges) -> nx.DiGraph:
+    G = nx.DiGraph()
+    G.add_edges_from((a, c, {'weight': 1.0}) for a, c in edges)
+    return G
+
+
+def test_cache_reuses_layout():
+    cache = LayoutCache()
+    G = _graph([('a', 'b'), ('b', 'c')])
+    assert compute_layout(G, cache=cache) is compute_layout(G, cache=cache)
+
+
+def test_caches_are_independent():
+    first, second = LayoutCache(), LayoutCache()
+    compute_layout(_graph([('a', 'b'), ('b', 'c')]), cache=first)
+    assert not second.layouts and not second.last_positions
+
+
+def test_cache_evicts_oldest():
+    cache = LayoutCache(max_size=2)
+    for n in range(3):
+        compute_layout(_graph([(f'x{n}', 'y')]), cache=cache)
+    assert len(cache.layouts) == 2